@@ -0,0 +1,105 @@
+import hashlib
+from typing import Callable, Coroutine
+
+from fastapi import Request, Response
+from fastapi.routing import APIRoute
+from starlette.responses import StreamingResponse
+
+from app.api.deps import PRIMARY_COOKIE
+from app.core.config import settings
+from app.core.response_cache import response_cache
+
+CACHE_HEADER = "X-Cache"
+
+
+def cache_key(request: Request, route_path: str) -> str:
+    """
+    Ключ кэша: шаблон маршрута, путь, отсортированные query-параметры,
+    Accept и хэш токена (ответ на чужой токен из кэша не отдаётся).
+    """
+    query = "&".join(
+        f"{name}={value}" for name, value in sorted(request.query_params.multi_items())
+    )
+    token = request.headers.get("X-API-Token", "")
+    return "|".join(
+        (
+            route_path,
+            request.url.path,
+            query,
+            request.headers.get("Accept", ""),
+            hashlib.sha256(token.encode()).hexdigest(),
+        )
+    )
+
+
+def cacheable(
+    request: Request, response: Response, tags: frozenset[str], generation: int
+) -> bool:
+    """
+    Можно ли положить ответ в кэш. Потоковые ответы и ошибки не кэшируются.
+    Не кэшируются и ответы, во время подготовки которых кэш сбрасывался:
+    они могли прочитать данные до записи. Ответ с реплики в течение
+    READ_YOUR_WRITES_SECONDS после сброса его тегов тоже мог не застать
+    запись из-за отставания реплики.
+    """
+    if response.status_code != 200 or isinstance(response, StreamingResponse):
+        return False
+    if response_cache.generation != generation:
+        return False
+    return not (
+        getattr(request.state, "db_replica", False)
+        and response_cache.invalidated_within(
+            tags, settings.database.READ_YOUR_WRITES_SECONDS
+        )
+    )
+
+
+def cached_route(*tags: str) -> type[APIRoute]:
+    """
+    Класс маршрута, кэширующий успешные ответы GET-эндпоинтов роутера.
+    `tags` - сущности, от которых зависят ответы: запись любой из них
+    сбрасывает закэшированные ответы через `response_cache.invalidate`.
+    """
+    entry_tags = frozenset(tags)
+
+    class CachedRoute(APIRoute):
+        def get_route_handler(self) -> Callable[[Request], Coroutine[None, None, Response]]:
+            handler = super().get_route_handler()
+
+            async def cached_handler(request: Request) -> Response:
+                if request.method != "GET" or not settings.cache.ENABLED:
+                    return await handler(request)
+                # В окне read-your-writes клиент читает с основной базы,
+                # а общий кэш мог быть заполнен с отстающей реплики
+                if PRIMARY_COOKIE in request.cookies:
+                    return await handler(request)
+
+                key = cache_key(request, self.path)
+                entry = response_cache.get(key)
+                if entry is not None:
+                    return Response(
+                        content=entry.body,
+                        status_code=entry.status_code,
+                        headers={**entry.headers, CACHE_HEADER: "HIT"},
+                    )
+
+                generation = response_cache.generation
+                response = await handler(request)
+                if cacheable(request, response, entry_tags, generation):
+                    response_cache.set(
+                        key,
+                        body=response.body,
+                        status_code=response.status_code,
+                        headers={
+                            name: value
+                            for name, value in response.headers.items()
+                            if name != "content-length"
+                        },
+                        tags=entry_tags,
+                    )
+                response.headers[CACHE_HEADER] = "MISS"
+                return response
+
+            return cached_handler
+
+    return CachedRoute
@@ -1,22 +1,117 @@
-from typing import Annotated, AsyncGenerator
+import itertools
+import json
+import uuid
+from typing import Annotated, AsyncGenerator, Any, Callable, Mapping, Sequence
 
 from fastapi.security.api_key import APIKeyHeader
-from fastapi import Depends, HTTPException, Security, status
+from fastapi import (
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    Security,
+    status,
+)
 
-from app.core.db import AsyncSessionLocal
-from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.db import AsyncSessionLocal, ReplicaSessionLocals
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
 from app.core.config import settings
+from app.utils import FieldSelection, decode_cursor, encode_cursor
 
 
-async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
-    async with AsyncSessionLocal() as session:
+SessionFactory = async_sessionmaker[AsyncSession]
+
+# Методы, которые только читают данные и могут уйти на реплику
+SAFE_METHODS = frozenset({"GET", "HEAD"})
+
+# Cookie окна read-your-writes: пока она жива, клиент читает с основной базы
+PRIMARY_COOKIE = "db_primary"
+
+_replica_counter = itertools.count()
+
+
+# Фабрика сессий основной базы
+def get_primary_session_factory() -> SessionFactory:
+    return AsyncSessionLocal
+
+
+# Фабрики сессий реплик для чтения
+def get_replica_session_factories() -> list[SessionFactory]:
+    return ReplicaSessionLocals
+
+
+# Фабрика сессий для чтения: реплика по кругу, а в окне read-your-writes
+# или без реплик - основная база
+def get_read_session_factory(
+    request: Request,
+    primary: Annotated[SessionFactory, Depends(get_primary_session_factory)],
+    replicas: Annotated[list[SessionFactory], Depends(get_replica_session_factories)],
+) -> SessionFactory:
+    if not replicas or PRIMARY_COOKIE in request.cookies:
+        return primary
+    # Ответ с реплики может отставать от записи - это учитывает кэш ответов
+    request.state.db_replica = True
+    return replicas[next(_replica_counter) % len(replicas)]
+
+
+ReadSessionFactoryDep = Annotated[SessionFactory, Depends(get_read_session_factory)]
+
+
+# Фабрика сессий для запроса: чтение - на реплики по кругу, запись - на основную базу.
+# Потоковые ответы открывают по ней собственную сессию,
+# так как сессия из зависимости закрывается до отправки тела ответа
+def get_session_factory(
+    request: Request,
+    response: Response,
+    primary: Annotated[SessionFactory, Depends(get_primary_session_factory)],
+    read_factory: ReadSessionFactoryDep,
+) -> SessionFactory:
+    if request.method in SAFE_METHODS:
+        return read_factory
+    window = settings.database.READ_YOUR_WRITES_SECONDS
+    if window > 0:
+        response.set_cookie(PRIMARY_COOKIE, "1", max_age=window, httponly=True)
+    return primary
+
+
+SessionFactoryDep = Annotated[SessionFactory, Depends(get_session_factory)]
+
+
+async def get_async_db(
+    session_factory: SessionFactoryDep,
+) -> AsyncGenerator[AsyncSession, None]:
+    async with session_factory() as session:
         yield session
 
 
 AsyncSessionDep = Annotated[AsyncSession, Depends(get_async_db)]
 
 
+# Сессия для POST-эндпоинтов, которые только читают (например, /lookup)
+async def get_read_async_db(
+    session_factory: ReadSessionFactoryDep,
+) -> AsyncGenerator[AsyncSession, None]:
+    async with session_factory() as session:
+        yield session
+
+
+ReadSessionDep = Annotated[AsyncSession, Depends(get_read_async_db)]
+
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+# Клиент запросил потоковую выдачу в формате NDJSON
+def get_ndjson_requested(accept: str | None = Header(None)) -> bool:
+    return accept is not None and NDJSON_MEDIA_TYPE in accept
+
+
+NdjsonRequestedDep = Annotated[bool, Depends(get_ndjson_requested)]
+
+
 # API токен в Header
 api_key_header = APIKeyHeader(name="X-API-Token", auto_error=False)
 
@@ -27,4 +122,163 @@ async def get_api_token(api_key: str = Security(api_key_header)):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token"
         )
-    return api_key
\ No newline at end of file
+    return api_key
+
+
+# Параметры keyset-пагинации
+class Pagination:
+    def __init__(self, limit: int, after: str | None):
+        self.limit = limit
+        self.after = after
+
+    @property
+    def fetch_limit(self) -> int:
+        # Запрашиваем на одну запись больше, чтобы понять, есть ли следующая страница
+        return self.limit + 1
+
+    def key(self, *types: type) -> tuple | None:
+        """
+        Возвращает ключ сортировки, с которого начинается страница.
+        """
+        if self.after is None:
+            return None
+        try:
+            return decode_cursor(self.after, types)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+            )
+
+    def after_id(self) -> uuid.UUID | None:
+        """
+        Ключ страницы для выборок, отсортированных только по id.
+        """
+        key = self.key(uuid.UUID)
+        return key[0] if key else None
+
+    def json_page(
+        self,
+        rows: Sequence[Any],
+        key: Callable[[Any], tuple] = lambda row: (row.id,),
+    ) -> Response:
+        """
+        Формирует страницу из строк (id, ..., data), где data - готовый JSON записи.
+        Тело ответа склеивается из строк без промежуточных объектов.
+        """
+        rows = list(rows)
+        next_cursor = None
+        if len(rows) > self.limit:
+            rows = rows[: self.limit]
+            next_cursor = encode_cursor(*key(rows[-1]))
+        body = (
+            '{"items":['
+            + ",".join(row.data for row in rows)
+            + '],"next_cursor":'
+            + json.dumps(next_cursor)
+            + "}"
+        )
+        return Response(content=body, media_type="application/json")
+
+
+async def get_pagination(
+    limit: int = Query(
+        settings.service.PAGE_SIZE_DEFAULT,
+        ge=1,
+        le=settings.service.PAGE_SIZE_MAX,
+        description="Количество записей на странице",
+    ),
+    after: str | None = Query(
+        None, description="Курсор `next_cursor` из предыдущей страницы"
+    ),
+) -> Pagination:
+    return Pagination(limit=limit, after=after)
+
+
+PaginationDep = Annotated[Pagination, Depends(get_pagination)]
+
+
+# Проверка списка id мульти-запроса
+def check_lookup_ids(ids: list[uuid.UUID]) -> list[uuid.UUID]:
+    if len(ids) > settings.service.LOOKUP_MAX_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Too many ids, max {settings.service.LOOKUP_MAX_IDS}",
+        )
+    return ids
+
+
+# id мульти-запроса из query: ?ids=a,b&ids=c. None - параметр не передан
+async def get_lookup_ids(
+    ids: list[str] | None = Query(
+        None, description="id записей через запятую, результат в том же порядке"
+    ),
+) -> list[uuid.UUID] | None:
+    if ids is None:
+        return None
+    try:
+        parsed = [uuid.UUID(v) for raw in ids for v in raw.split(",") if v]
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid id"
+        )
+    if not parsed:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No ids")
+    return check_lookup_ids(parsed)
+
+
+LookupIdsDep = Annotated[list[uuid.UUID] | None, Depends(get_lookup_ids)]
+
+
+def json_lookup(ids: list[uuid.UUID], found: dict[uuid.UUID, str]) -> Response:
+    """
+    Ответ мульти-запроса из готовых JSON записей (см. Lookup):
+    записи в порядке `ids`, null и id в `missing` для ненайденных.
+    """
+    missing = [str(i) for i in dict.fromkeys(i for i in ids if i not in found)]
+    body = (
+        '{"items":['
+        + ",".join(found.get(i, "null") for i in ids)
+        + '],"missing":'
+        + json.dumps(missing, separators=(",", ":"))
+        + "}"
+    )
+    return Response(content=body, media_type="application/json")
+
+
+# Зависимость выбора полей ответа (fields=, include=) для ресурса
+# с полями `fields` и связями `relations` (имя связи -> её поля)
+def field_selection(
+    fields: Sequence[str], relations: Mapping[str, Sequence[str]] | None = None
+) -> Callable[..., Any]:
+    relations = relations or {}
+    names = [*fields, *(f"{r}.{f}" for r, rf in relations.items() for f in rf)]
+    fields_description = "Поля ответа через запятую: " + ", ".join(names)
+
+    def select_fields(requested: str | None, include: str | None) -> FieldSelection:
+        try:
+            return FieldSelection(fields, relations, requested, include)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    if not relations:
+
+        async def get_fields(
+            requested: str | None = Query(
+                None, alias="fields", description=fields_description
+            ),
+        ) -> FieldSelection:
+            return select_fields(requested, None)
+
+        return get_fields
+
+    async def get_fields_and_include(
+        requested: str | None = Query(
+            None, alias="fields", description=fields_description
+        ),
+        include: str | None = Query(
+            None, description="Связи в ответе через запятую: " + ", ".join(relations)
+        ),
+    ) -> FieldSelection:
+        return select_fields(requested, include)
+
+    return get_fields_and_include
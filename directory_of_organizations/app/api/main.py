@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends
 
-from app.api.routes import organizations, activities, buildings
+from app.api.routes import organizations, activities, buildings, internal
 from .deps import get_api_token
 
 # Главный API роутер
@@ -16,4 +16,5 @@ api_router.include_router(
     organizations.router, prefix="/organizations", tags=["organizations"]
 )
 api_router.include_router(activities.router, prefix="/activities", tags=["activities"])
-api_router.include_router(buildings.router, prefix="/buildings", tags=["buildings"])
\ No newline at end of file
+api_router.include_router(buildings.router, prefix="/buildings", tags=["buildings"])
+api_router.include_router(internal.router, prefix="/internal", tags=["internal"])
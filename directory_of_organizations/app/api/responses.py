@@ -0,0 +1,33 @@
+import re
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+
+# Числа, которые orjson пишет иначе, чем json.dumps: 1e-5 <= |x| < 1e-4
+# позиционно (0.00001 вместо 1e-05), меньшие - с однозначной экспонентой
+# (1e-9 вместо 1e-09). Остальные float и UUID совпадают побайтно. За
+# однозначной экспонентой не идёт буква или цифра, поэтому шаблон не
+# срабатывает на шестнадцатеричные UUID вида "...7e-4a62-..."
+_SHORT_EXPONENT = re.compile(rb"e-\d(?!\w)")
+_POSITIONAL_SMALL = b"0.0000"
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse, кодирующий ответ через orjson. Если в результате есть
+    число, которое json.dumps записал бы иначе, или orjson не справился
+    (ключи не строки, целые больше 64 бит), ответ кодируется стандартным
+    json: тело то же, что у JSONResponse. Ложные срабатывания проверки
+    (та же подстрока внутри строки) стоят только скорости. Отличие одно:
+    NaN и бесконечность orjson пишет как null, а json.dumps - ошибка.
+    """
+
+    def render(self, content: Any) -> bytes:
+        try:
+            body = orjson.dumps(content)
+        except orjson.JSONEncodeError:
+            return super().render(content)
+        if _POSITIONAL_SMALL in body or _SHORT_EXPONENT.search(body):
+            return super().render(content)
+        return body
@@ -1,14 +1,43 @@
 import uuid
-from fastapi import APIRouter, HTTPException, status
+from typing import Annotated
 
-from app.schemas.activity import ActivityRead, ActivityCreate
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+
+from app.core.activity_tree import activity_tree
+from app.schemas.activity import (
+    ActivityCreate,
+    ActivityMove,
+    ActivityRead,
+    ActivityTreeNode,
+)
+from app.schemas.lookup import Lookup, LookupRequest
+from app.schemas.pagination import Page
 from app.crud import activity as activity_crud
-from app.api.deps import AsyncSessionDep
+from app.api.deps import (
+    AsyncSessionDep,
+    LookupIdsDep,
+    PaginationDep,
+    ReadSessionDep,
+    check_lookup_ids,
+    field_selection,
+    json_lookup,
+)
+from app.api.cache import cached_route
+from app.core.metrics import query_budget
+from app.core.response_cache import response_cache
+from app.utils import FieldSelection
+
+# Ответы зависят от перечисленных сущностей и сбрасываются при их записи
+router = APIRouter(route_class=cached_route("activity"))
 
-router = APIRouter()
+# Выбор полей ответа: fields=name
+ActivityFieldsDep = Annotated[
+    FieldSelection, Depends(field_selection(list(activity_crud.ACTIVITY_COLUMNS)))
+]
 
 
 @router.post("/", response_model=ActivityRead, status_code=status.HTTP_201_CREATED)
+@query_budget(4)
 async def create_activity(
     session: AsyncSessionDep,
     activity_in: ActivityCreate,
@@ -18,23 +47,80 @@ async def create_activity(
         name=activity_in.name,
         parent_id=activity_in.parent_id,
     )
+    response_cache.invalidate("activity")
     return activity
 
 
+@router.post("/lookup", response_model=Lookup[ActivityRead])
+@query_budget(1)
+async def lookup_activities(
+    session: ReadSessionDep,
+    selection: ActivityFieldsDep,
+    lookup_in: LookupRequest,
+):
+    # Деятельности в порядке запрошенных id, null на месте ненайденных
+    ids = check_lookup_ids(lookup_in.ids)
+    found = await activity_crud.get_activities_json_by_ids(session, ids, selection)
+    return json_lookup(ids, found)
+
+
+@router.get("/tree", response_model=list[ActivityTreeNode])
+@query_budget(2)
+async def read_activity_tree(
+    session: AsyncSessionDep,
+):
+    # Дерево отдаётся из кэша воркера уже сериализованным
+    body = await activity_tree.get(session)
+    return Response(content=body, media_type="application/json")
+
+
 @router.get("/{activity_id}", response_model=ActivityRead)
+@query_budget(1)
 async def read_activity(
     session: AsyncSessionDep,
+    selection: ActivityFieldsDep,
     activity_id: uuid.UUID,
+):
+    data = await activity_crud.get_activity_json(session, activity_id, selection)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Activity not found")
+    return Response(content=data, media_type="application/json")
+
+
+@router.patch("/{activity_id}", response_model=ActivityRead)
+# Перенос поддерева в замыкании и пересчёт счётчиков организаций у предков
+@query_budget(12)
+async def move_activity(
+    session: AsyncSessionDep,
+    activity_id: uuid.UUID,
+    activity_in: ActivityMove,
 ):
     activity = await activity_crud.get_activity(session, activity_id)
     if not activity:
         raise HTTPException(status_code=404, detail="Activity not found")
+    activity = await activity_crud.move_activity(
+        session, activity, parent_id=activity_in.parent_id
+    )
+    response_cache.invalidate("activity")
     return activity
 
 
-@router.get("/", response_model=list[ActivityRead])
+@router.get("/", response_model=Page[ActivityRead] | Lookup[ActivityRead])
+@query_budget(1)
 async def list_activities(
     session: AsyncSessionDep,
+    pagination: PaginationDep,
+    selection: ActivityFieldsDep,
+    ids: LookupIdsDep,
 ):
-    activities = await activity_crud.get_activities(session)
-    return activities
\ No newline at end of file
+    if ids is not None:
+        found = await activity_crud.get_activities_json_by_ids(session, ids, selection)
+        return json_lookup(ids, found)
+
+    rows = await activity_crud.get_activities_json(
+        session,
+        limit=pagination.fetch_limit,
+        selection=selection,
+        after=pagination.after_id(),
+    )
+    return pagination.json_page(rows)
\ No newline at end of file
@@ -1,15 +1,41 @@
-from typing import List
 import uuid
-from fastapi import APIRouter, HTTPException, status
+from typing import Annotated
 
-from app.schemas.building import BuildingRead, BuildingCreate
+from fastapi import APIRouter, Body, Depends, HTTPException, Response, status
+
+from app.schemas.building import BuildingBulkResult, BuildingRead, BuildingCreate
+from app.schemas.lookup import Lookup, LookupRequest
+from app.schemas.pagination import Page
 from app.crud import building as building_crud
-from app.api.deps import AsyncSessionDep
+from app.api.deps import (
+    AsyncSessionDep,
+    LookupIdsDep,
+    NdjsonRequestedDep,
+    PaginationDep,
+    ReadSessionDep,
+    SessionFactoryDep,
+    check_lookup_ids,
+    field_selection,
+    json_lookup,
+)
+from app.api.cache import cached_route
+from app.api.streaming import NDJSON_RESPONSE, ndjson_response
+from app.core.config import settings
+from app.core.metrics import query_budget
+from app.core.response_cache import response_cache
+from app.utils import FieldSelection
+
+# Ответы зависят от перечисленных сущностей и сбрасываются при их записи
+router = APIRouter(route_class=cached_route("building"))
 
-router = APIRouter()
+# Выбор полей ответа: fields=latitude,longitude
+BuildingFieldsDep = Annotated[
+    FieldSelection, Depends(field_selection(list(building_crud.BUILDING_COLUMNS)))
+]
 
 
 @router.post("/", response_model=BuildingRead, status_code=status.HTTP_201_CREATED)
+@query_budget(2)
 async def create_building(
     session: AsyncSessionDep,
     building_in: BuildingCreate,
@@ -20,23 +46,83 @@ async def create_building(
         latitude=building_in.latitude,
         longitude=building_in.longitude,
     )
+    response_cache.invalidate("building")
     return building
 
 
+@router.post(
+    "/bulk", response_model=BuildingBulkResult, status_code=status.HTTP_201_CREATED
+)
+@query_budget(1)
+async def upsert_buildings(
+    session: AsyncSessionDep,
+    buildings_in: Annotated[
+        list[BuildingCreate],
+        Body(min_length=1, max_length=settings.service.BULK_MAX_ITEMS),
+    ],
+):
+    # Здания с уже известным адресом обновляются, остальные создаются
+    ids = await building_crud.upsert_buildings(session, buildings_in)
+    response_cache.invalidate("building")
+    return BuildingBulkResult(ids=ids)
+
+
+@router.post("/lookup", response_model=Lookup[BuildingRead])
+@query_budget(1)
+async def lookup_buildings(
+    session: ReadSessionDep,
+    selection: BuildingFieldsDep,
+    lookup_in: LookupRequest,
+):
+    # Здания в порядке запрошенных id, null на месте ненайденных
+    ids = check_lookup_ids(lookup_in.ids)
+    found = await building_crud.get_buildings_json_by_ids(session, ids, selection)
+    return json_lookup(ids, found)
+
+
 @router.get("/{building_id}", response_model=BuildingRead)
+@query_budget(1)
 async def read_building(
     session: AsyncSessionDep,
+    selection: BuildingFieldsDep,
     building_id: uuid.UUID,
 ):
-    building = await building_crud.get_building(session, building_id)
-    if not building:
+    data = await building_crud.get_building_json(session, building_id, selection)
+    if data is None:
         raise HTTPException(status_code=404, detail="Building not found")
-    return building
+    return Response(content=data, media_type="application/json")
 
 
-@router.get("/", response_model=List[BuildingRead])
+@router.get(
+    "/",
+    response_model=Page[BuildingRead] | Lookup[BuildingRead],
+    responses=NDJSON_RESPONSE,
+)
+@query_budget(1)
 async def list_buildings(
     session: AsyncSessionDep,
+    session_factory: SessionFactoryDep,
+    pagination: PaginationDep,
+    ndjson_requested: NdjsonRequestedDep,
+    selection: BuildingFieldsDep,
+    ids: LookupIdsDep,
 ):
-    buildings = await building_crud.get_buildings(session)
-    return buildings
\ No newline at end of file
+    if ids is not None:
+        found = await building_crud.get_buildings_json_by_ids(session, ids, selection)
+        return json_lookup(ids, found)
+
+    after = pagination.after_id()
+    if ndjson_requested:
+        return ndjson_response(
+            session_factory,
+            lambda s: building_crud.stream_buildings_json(
+                s,
+                batch_size=settings.service.STREAM_BATCH_SIZE,
+                selection=selection,
+                after=after,
+            ),
+        )
+    rows = await building_crud.get_buildings_json(
+        session, limit=pagination.fetch_limit, selection=selection, after=after
+    )
+    return pagination.json_page(rows)
\ No newline at end of file
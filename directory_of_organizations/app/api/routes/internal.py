@@ -0,0 +1,26 @@
+from fastapi import APIRouter
+
+from app.core.db import engine, replica_engines
+from app.core.metrics import query_budget
+from app.core.response_cache import response_cache
+from app.schemas.internal import CacheStats, PoolStats
+
+router = APIRouter()
+
+
+@router.get("/cache", response_model=CacheStats)
+@query_budget(0)
+async def read_cache_stats():
+    return response_cache.stats()
+
+
+@router.get(
+    "/pool",
+    response_model=dict[str, PoolStats],
+    description="Статистика пулов соединений по имени пула: primary и реплики "
+    "(replica0, replica1, ...). Пулы у каждого воркера свои, и числа относятся "
+    "только к воркеру, который обработал запрос.",
+)
+@query_budget(0)
+async def read_pool_stats():
+    return {e.pool.logging_name: e.pool.stats() for e in (engine, *replica_engines)}
@@ -0,0 +1,12 @@
+from fastapi import APIRouter, Response
+
+from app.core.metrics import render_metrics
+
+# Без проверки токена: эндпоинт опрашивает Prometheus
+router = APIRouter()
+
+
+@router.get("/metrics", include_in_schema=False)
+async def read_metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
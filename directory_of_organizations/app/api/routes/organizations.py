@@ -1,12 +1,52 @@
 import uuid
-from fastapi import APIRouter, HTTPException, Query, status
+from typing import Annotated
 
-from app.crud import organization as org_crud, building as buildings_crud
-from app.api.deps import AsyncSessionDep
-from app.schemas.organization import OrganizationRead, OrganizationCreate
-from app.utils import get_bounding_box_area
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Response, status
 
-router = APIRouter()
+from app.crud import activity as activity_crud
+from app.crud import organization as org_crud
+from app.api.deps import (
+    AsyncSessionDep,
+    LookupIdsDep,
+    NdjsonRequestedDep,
+    PaginationDep,
+    ReadSessionDep,
+    SessionFactoryDep,
+    check_lookup_ids,
+    field_selection,
+    json_lookup,
+)
+from app.api.cache import cached_route
+from app.api.streaming import NDJSON_RESPONSE, ndjson_response
+from app.core.config import settings
+from app.core.metrics import query_budget
+from app.core.response_cache import response_cache
+from app.schemas.organization import (
+    ActivityFacet,
+    OrganizationBulkResult,
+    OrganizationCluster,
+    OrganizationClusters,
+    OrganizationCreate,
+    OrganizationDistanceRead,
+    OrganizationRead,
+)
+from app.schemas.lookup import Lookup, LookupRequest
+from app.schemas.pagination import Page
+from app.schemas.utils import BoundingBox
+from app.utils import CELL_KEY_ZOOM, FieldSelection, quadkey, tile_xy
+
+# Ответы зависят от перечисленных сущностей и сбрасываются при их записи
+router = APIRouter(route_class=cached_route("organization", "building", "activity"))
+
+# Выбор полей и связей ответа: fields=name,building.latitude&include=phones
+OrganizationFieldsDep = Annotated[
+    FieldSelection,
+    Depends(
+        field_selection(
+            list(org_crud.ORGANIZATION_COLUMNS), org_crud.ORGANIZATION_RELATIONS
+        )
+    ),
+]
 
 
 @router.post(
@@ -15,6 +55,9 @@ router = APIRouter()
     status_code=status.HTTP_201_CREATED,
     description="Создать новую организацию с указанными данными.",
 )
+# Деятельности, вставки организации, телефонов и связей, счётчики
+# деятельностей, перечитывание с графом
+@query_budget(9)
 async def create_organization(
     session: AsyncSessionDep,
     organization_in: OrganizationCreate,
@@ -29,34 +72,93 @@ async def create_organization(
         phone_numbers=[p.phone for p in organization_in.phone_numbers],
         activity_ids=organization_in.activity_ids,
     )
+    response_cache.invalidate("organization")
     return org
 
 
+@router.post(
+    "/bulk",
+    response_model=OrganizationBulkResult,
+    status_code=status.HTTP_201_CREATED,
+    description="Создать список организаций одним запросом.",
+)
+@query_budget(6)
+async def create_organizations_bulk(
+    session: AsyncSessionDep,
+    organizations_in: Annotated[
+        list[OrganizationCreate],
+        Body(min_length=1, max_length=settings.service.BULK_MAX_ITEMS),
+    ],
+):
+    """
+    Создает организации одной транзакцией. Ошибки (несуществующее здание
+    или деятельность) возвращаются по каждой позиции, остальные позиции создаются.
+    """
+    results = await org_crud.create_organizations_bulk(session, organizations_in)
+    created = sum(1 for r in results if r.id is not None)
+    if created:
+        response_cache.invalidate("organization")
+    return OrganizationBulkResult(created=created, items=results)
+
+
+@router.post(
+    "/lookup",
+    response_model=Lookup[OrganizationRead],
+    description="Получить организации по списку id одним запросом.",
+)
+@query_budget(1)
+async def lookup_organizations(
+    session: ReadSessionDep,
+    selection: OrganizationFieldsDep,
+    lookup_in: LookupRequest,
+):
+    """
+    Возвращает организации в порядке запрошенных id; на месте ненайденных - null,
+    сами ненайденные id перечислены в `missing`.
+    """
+    ids = check_lookup_ids(lookup_in.ids)
+    found = await org_crud.get_organizations_json_by_ids(session, ids, selection)
+    return json_lookup(ids, found)
+
+
 @router.get(
     "/by-building/{building_id}",
-    response_model=list[OrganizationRead],
+    response_model=Page[OrganizationRead],
     description="Получить список организаций, находящихся в указанном здании по его ID.",
 )
+@query_budget(1)
 async def get_organizations_by_building(
     session: AsyncSessionDep,
+    pagination: PaginationDep,
+    selection: OrganizationFieldsDep,
     building_id: uuid.UUID,
 ):
     """
     Получает список организаций, находящихся в указанном здании по его ID.
     """
-    organizations = await org_crud.get_organizations_by_building(session, building_id)
-    if not organizations:
+    after = pagination.after_id()
+    rows = await org_crud.get_organizations_by_building_json(
+        session,
+        building_id,
+        limit=pagination.fetch_limit,
+        selection=selection,
+        after=after,
+    )
+    if not rows:
         raise HTTPException(status_code=404, detail="Organizations not found")
-    return organizations
+    return pagination.json_page(rows)
 
 
 @router.get(
     "/by-activity/{activity_id}",
-    response_model=list[OrganizationRead],
+    response_model=Page[OrganizationRead],
     description="Получить список организаций по виду деятельности, с возможностью включения дочерних видов.",
 )
+@query_budget(1)
 async def get_organizations_by_activity(
     session: AsyncSessionDep,
+    pagination: PaginationDep,
+    selection: OrganizationFieldsDep,
     activity_id: uuid.UUID,
     with_children: bool = Query(
         False, description="Включить дочерние виды деятельности"
@@ -66,49 +168,264 @@ async def get_organizations_by_activity(
     Получает список организаций по виду деятельности.
     Если `with_children` равно True, то также включаются организации с дочерними видами деятельности.
     """
+    after = pagination.after_id()
     if with_children:
-        organizations = await org_crud.get_organizations_by_activity_with_children(
+        rows = await org_crud.get_organizations_by_activity_with_children_json(
             session,
             root_activity_id=activity_id,
+            limit=pagination.fetch_limit,
+            selection=selection,
+            after=after,
         )
     else:
-        organizations = await org_crud.get_organizations_by_activity(
-            session, activity_id
+        rows = await org_crud.get_organizations_by_activity_json(
+            session,
+            activity_id,
+            limit=pagination.fetch_limit,
+            selection=selection,
+            after=after,
         )
-    if not organizations:
+    if not rows:
         raise HTTPException(status_code=404, detail="Organizations not found")
-    return organizations
+    return pagination.json_page(rows)
 
 
 @router.get(
     "/by-radius/",
-    response_model=list[OrganizationRead],
-    description="Получить список организаций в заданном радиусе (км) от указанной точки (широта и долгота).",
+    response_model=Page[OrganizationDistanceRead],
+    description="Получить список организаций в заданном радиусе (км) от указанной точки (широта и долгота), "
+    "отсортированный по расстоянию.",
 )
+# Обновление пространственного индекса и выборка
+@query_budget(2)
 async def get_organizations_by_radius(
     session: AsyncSessionDep,
+    pagination: PaginationDep,
+    selection: OrganizationFieldsDep,
     latitude: float = Query(..., ge=-90.0, le=90.0),
     longitude: float = Query(..., ge=-180.0, le=180.0),
     radius_km: float = Query(..., gt=0),
 ):
     """
-    Получает список организаций в заданном радиусе от указанной точки (широта и долгота).
+    Получает список организаций в заданном радиусе от указанной точки (широта и долгота)
+    вместе с расстоянием до каждой из них.
     """
-    box = get_bounding_box_area(latitude, longitude, radius_km)
+    rows = await org_crud.get_organizations_by_radius_json(
+        session,
+        latitude=latitude,
+        longitude=longitude,
+        radius_km=radius_km,
+        limit=pagination.fetch_limit,
+        selection=selection,
+        after=pagination.key(float, uuid.UUID),
+    )
+    if not rows:
+        raise HTTPException(status_code=404, detail="No organizations found in radius")
+    return pagination.json_page(rows, key=lambda row: (row.distance_km, row.id))
 
-    # Находим здания в bounding box
-    buildings_in_box = await buildings_crud.get_buildings_by_coordinates(session, box)
 
-    if not buildings_in_box:
-        raise HTTPException(status_code=404, detail="No buildings found in radius")
+@router.get(
+    "/by-rectangle/",
+    response_model=Page[OrganizationRead],
+    description="Получить список организаций в зданиях внутри прямоугольной области на карте.",
+)
+# Обновление пространственного индекса и выборка
+@query_budget(2)
+async def get_organizations_by_rectangle(
+    session: AsyncSessionDep,
+    pagination: PaginationDep,
+    selection: OrganizationFieldsDep,
+    min_lat: float = Query(..., ge=-90.0, le=90.0),
+    max_lat: float = Query(..., ge=-90.0, le=90.0),
+    min_lon: float = Query(..., ge=-180.0, le=180.0),
+    max_lon: float = Query(..., ge=-180.0, le=180.0),
+):
+    """
+    Получает список организаций в зданиях внутри прямоугольной области.
+    """
+    if min_lat > max_lat or min_lon > max_lon:
+        raise HTTPException(status_code=400, detail="Invalid rectangle bounds")
+    box = BoundingBox(min_lat=min_lat, max_lat=max_lat, min_lon=min_lon, max_lon=max_lon)
+    rows = await org_crud.get_organizations_by_rectangle_json(
+        session,
+        box,
+        limit=pagination.fetch_limit,
+        selection=selection,
+        after=pagination.after_id(),
+    )
+    if not rows:
+        raise HTTPException(
+            status_code=404, detail="No organizations found in rectangle"
+        )
+    return pagination.json_page(rows)
 
-    building_ids = [b.id for b in buildings_in_box]
 
-    # Далее выбираем организации в этих зданиях
-    organizations = await org_crud.get_organizations_by_buildings(session, building_ids)
-    if not organizations:
-        raise HTTPException(status_code=404, detail="No organizations found in radius")
-    return organizations
+@router.get(
+    "/clusters",
+    response_model=OrganizationClusters,
+    description="Получить кластеры организаций (число и центр) в прямоугольной "
+    "области карты для уровня приближения.",
+)
+@query_budget(1)
+async def get_organization_clusters(
+    session: AsyncSessionDep,
+    min_lat: float = Query(..., ge=-90.0, le=90.0),
+    max_lat: float = Query(..., ge=-90.0, le=90.0),
+    min_lon: float = Query(..., ge=-180.0, le=180.0),
+    max_lon: float = Query(..., ge=-180.0, le=180.0),
+    zoom: int = Query(
+        ..., ge=0, le=CELL_KEY_ZOOM, description="Уровень приближения карты"
+    ),
+    activity_id: uuid.UUID | None = Query(
+        None, description="Только организации с этим видом деятельности или дочерним"
+    ),
+):
+    """
+    Группирует здания прямоугольника по ячейкам сетки тайлов на
+    CLUSTER_GRID_LEVELS уровней мельче `zoom` и возвращает для каждой
+    ячейки с организациями их число, число зданий и центр.
+    Пустая область - пустой список, а не 404: карта просто без точек.
+    """
+    if min_lat > max_lat or min_lon > max_lon:
+        raise HTTPException(status_code=400, detail="Invalid rectangle bounds")
+    level = min(zoom + settings.service.CLUSTER_GRID_LEVELS, CELL_KEY_ZOOM)
+    # Ось y тайлов направлена на юг
+    min_x, min_y = tile_xy(max_lat, min_lon, level)
+    max_x, max_y = tile_xy(min_lat, max_lon, level)
+    if (max_x - min_x + 1) * (max_y - min_y + 1) > settings.service.CLUSTER_MAX_CELLS:
+        raise HTTPException(
+            status_code=400, detail="Rectangle is too large for this zoom level"
+        )
+    box = BoundingBox(min_lat=min_lat, max_lat=max_lat, min_lon=min_lon, max_lon=max_lon)
+    rows = await org_crud.get_organization_clusters(session, box, level, activity_id)
+    return OrganizationClusters(
+        zoom=level,
+        clusters=[
+            OrganizationCluster(
+                cell=quadkey(row.cell, level),
+                organizations=row.organizations,
+                buildings=row.buildings,
+                latitude=row.latitude,
+                longitude=row.longitude,
+            )
+            for row in rows
+        ],
+    )
+
+
+@router.get(
+    "/activity-facets",
+    response_model=list[ActivityFacet],
+    description="Получить число организаций по каждому виду деятельности с учётом "
+    "дочерних: всего, в здании или в прямоугольной области карты.",
+)
+# Одна выборка из счётчиков
+@query_budget(1)
+async def get_activity_facets(
+    session: AsyncSessionDep,
+    building_id: uuid.UUID | None = Query(None, description="Только в этом здании"),
+    min_lat: float | None = Query(None, ge=-90.0, le=90.0),
+    max_lat: float | None = Query(None, ge=-90.0, le=90.0),
+    min_lon: float | None = Query(None, ge=-180.0, le=180.0),
+    max_lon: float | None = Query(None, ge=-180.0, le=180.0),
+):
+    """
+    Счётчики читаются из материализованных таблиц: без области - готовые
+    общие значения, для здания - сумма по зданию, для прямоугольника -
+    сумма по ячейкам сетки внутри него и зданиям у его границы.
+    Деятельности без организаций в ответ не попадают.
+    """
+    bounds = (min_lat, max_lat, min_lon, max_lon)
+    if any(b is not None for b in bounds) and any(b is None for b in bounds):
+        raise HTTPException(status_code=400, detail="Incomplete rectangle bounds")
+    building_ids = box = None
+    if building_id is not None:
+        if min_lat is not None:
+            raise HTTPException(
+                status_code=400, detail="Use either building_id or rectangle"
+            )
+        building_ids = [building_id]
+    elif min_lat is not None:
+        if min_lat > max_lat or min_lon > max_lon:
+            raise HTTPException(status_code=400, detail="Invalid rectangle bounds")
+        box = BoundingBox(
+            min_lat=min_lat, max_lat=max_lat, min_lon=min_lon, max_lon=max_lon
+        )
+    rows = await activity_crud.get_activity_facets(session, building_ids, box)
+    return [
+        ActivityFacet(activity_id=row.activity_id, organizations=row.organizations)
+        for row in rows
+    ]
+
+
+@router.get(
+    "/search",
+    response_model=Page[OrganizationRead] | Page[OrganizationDistanceRead],
+    description="Поиск организаций по сочетанию условий одним запросом: подстрока "
+    "названия, вид деятельности с дочерними, здание, радиус (км) от точки или "
+    "прямоугольная область. С радиусом результаты отсортированы по расстоянию.",
+)
+# Обновление пространственного индекса (для радиуса и прямоугольника) и выборка
+@query_budget(2)
+async def search_organizations(
+    session: AsyncSessionDep,
+    pagination: PaginationDep,
+    selection: OrganizationFieldsDep,
+    name: str | None = Query(None, description="Подстрока названия"),
+    activity_id: uuid.UUID | None = Query(
+        None, description="Вид деятельности или дочерний к нему"
+    ),
+    building_id: uuid.UUID | None = None,
+    latitude: float | None = Query(None, ge=-90.0, le=90.0),
+    longitude: float | None = Query(None, ge=-180.0, le=180.0),
+    radius_km: float | None = Query(None, gt=0),
+    min_lat: float | None = Query(None, ge=-90.0, le=90.0),
+    max_lat: float | None = Query(None, ge=-90.0, le=90.0),
+    min_lon: float | None = Query(None, ge=-180.0, le=180.0),
+    max_lon: float | None = Query(None, ge=-180.0, le=180.0),
+):
+    """
+    Объединяет условия поиска по названию, деятельности, зданию и области
+    в один запрос к БД вместо пересечения выдачи нескольких эндпоинтов.
+    Ничего не найдено - пустая страница.
+    """
+    point = (latitude, longitude, radius_km)
+    bounds = (min_lat, max_lat, min_lon, max_lon)
+    if any(p is not None for p in point) and any(p is None for p in point):
+        raise HTTPException(status_code=400, detail="Incomplete radius parameters")
+    if any(b is not None for b in bounds) and any(b is None for b in bounds):
+        raise HTTPException(status_code=400, detail="Incomplete rectangle bounds")
+    if radius_km is not None and min_lat is not None:
+        raise HTTPException(status_code=400, detail="Use either radius or rectangle")
+    if not (name or activity_id or building_id or radius_km or min_lat is not None):
+        raise HTTPException(status_code=400, detail="No search conditions")
+    box = None
+    if min_lat is not None:
+        if min_lat > max_lat or min_lon > max_lon:
+            raise HTTPException(status_code=400, detail="Invalid rectangle bounds")
+        box = BoundingBox(
+            min_lat=min_lat, max_lat=max_lat, min_lon=min_lon, max_lon=max_lon
+        )
+    rows = await org_crud.search_organizations_json(
+        session,
+        limit=pagination.fetch_limit,
+        selection=selection,
+        name=name,
+        activity_id=activity_id,
+        building_id=building_id,
+        box=box,
+        latitude=latitude,
+        longitude=longitude,
+        radius_km=radius_km,
+        after=(
+            pagination.key(float, uuid.UUID)
+            if radius_km is not None
+            else pagination.after_id()
+        ),
+    )
+    if radius_km is not None:
+        return pagination.json_page(rows, key=lambda row: (row.distance_km, row.id))
+    return pagination.json_page(rows)
 
 
 @router.get(
@@ -116,34 +433,80 @@ async def get_organizations_by_radius(
     response_model=OrganizationRead,
     description="Получить подробную информацию об организации по её ID.",
 )
+@query_budget(1)
 async def read_organization(
     session: AsyncSessionDep,
+    selection: OrganizationFieldsDep,
     organization_id: uuid.UUID,
 ):
     """
     Получает подробную информацию об организации по её ID.
     """
-    org = await org_crud.get_organization(session, organization_id)
-    if not org:
+    data = await org_crud.get_organization_json(session, organization_id, selection)
+    if data is None:
         raise HTTPException(status_code=404, detail="Organization not found")
-    return org
+    return Response(content=data, media_type="application/json")
 
 
 @router.get(
     "/",
-    response_model=list[OrganizationRead],
-    description="Получить список всех организаций или выполнить поиск по названию, если передан параметр `name`.",
+    response_model=Page[OrganizationRead] | Lookup[OrganizationRead],
+    responses=NDJSON_RESPONSE,
+    description="Получить список всех организаций или выполнить поиск по названию, если передан параметр `name`. "
+    "С `fuzzy=true` поиск устойчив к опечаткам, результаты отсортированы по похожести. "
+    "С заголовком `Accept: application/x-ndjson` отдаёт всю выборку потоком NDJSON. "
+    "С `ids=` возвращает организации по списку id (как `POST /lookup`). "
+    "`fields=` и `include=` ограничивают поля и связи ответа (и запроса к БД).",
 )
+# Нечёткий поиск: порог похожести и выборка
+@query_budget(2)
 async def list_organizations(
     session: AsyncSessionDep,
+    session_factory: SessionFactoryDep,
+    pagination: PaginationDep,
+    ndjson_requested: NdjsonRequestedDep,
+    selection: OrganizationFieldsDep,
+    ids: LookupIdsDep,
     name: str | None = None,
+    fuzzy: bool = Query(
+        False, description="Нечёткий поиск по названию с ранжированием"
+    ),
 ):
     """
     Получает список всех организаций
     Если передан параметр `name` - выполняет поиск организаций по названию.
     """
-    if name:
-        orgs = await org_crud.search_organizations_by_name(session, name)
-    else:
-        orgs = await org_crud.get_organizations(session)
-    return orgs
\ No newline at end of file
+    if ids is not None:
+        found = await org_crud.get_organizations_json_by_ids(session, ids, selection)
+        return json_lookup(ids, found)
+
+    if name and fuzzy:
+        rows = await org_crud.search_organizations_by_name_fuzzy_json(
+            session,
+            name,
+            limit=pagination.fetch_limit,
+            selection=selection,
+            after=pagination.key(float, uuid.UUID),
+        )
+        return pagination.json_page(rows, key=lambda row: (row.distance, row.id))
+
+    after = pagination.after_id()
+    if ndjson_requested:
+        return ndjson_response(
+            session_factory,
+            lambda s: org_crud.stream_organizations_json(
+                s,
+                batch_size=settings.service.STREAM_BATCH_SIZE,
+                selection=selection,
+                name_substring=name,
+                after=after,
+            ),
+        )
+    rows = await org_crud.get_organizations_json(
+        session,
+        limit=pagination.fetch_limit,
+        selection=selection,
+        after=after,
+        name_substring=name,
+    )
+    return pagination.json_page(rows)
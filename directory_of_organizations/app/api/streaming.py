@@ -0,0 +1,27 @@
+from typing import AsyncIterator, Callable, Sequence
+
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.api.deps import NDJSON_MEDIA_TYPE
+
+# Описание потокового ответа для OpenAPI
+NDJSON_RESPONSE = {200: {"content": {NDJSON_MEDIA_TYPE: {}}}}
+
+
+def ndjson_response(
+    session_factory: async_sessionmaker[AsyncSession],
+    batches: Callable[[AsyncSession], AsyncIterator[Sequence[str]]],
+) -> StreamingResponse:
+    """
+    Отдаёт записи построчно в формате NDJSON по мере чтения пачек из БД.
+    Записи приходят из БД готовым JSON, каждая пачка отправляется сразу,
+    поэтому память воркера не зависит от размера выборки.
+    """
+
+    async def body() -> AsyncIterator[bytes]:
+        async with session_factory() as session:
+            async for batch in batches(session):
+                yield "".join(data + "\n" for data in batch).encode()
+
+    return StreamingResponse(body(), media_type=NDJSON_MEDIA_TYPE)
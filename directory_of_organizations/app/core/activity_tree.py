@@ -0,0 +1,68 @@
+import asyncio
+import uuid
+
+from pydantic import TypeAdapter
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.activity import Activity
+from app.schemas.activity import ActivityTreeNode
+
+ActivityTreeAdapter = TypeAdapter(list[ActivityTreeNode])
+
+
+class ActivityTreeCache:
+    """
+    Дерево деятельностей в памяти воркера, хранится уже сериализованным в JSON.
+    Версия дерева - (число деятельностей, последний modified_at): её проверка
+    одним агрегатом по маленькой таблице замечает изменения из других воркеров.
+    """
+
+    def __init__(self):
+        self._lock = asyncio.Lock()
+        self.invalidate()
+
+    def invalidate(self) -> None:
+        self._version: tuple | None = None
+        self._body: bytes | None = None
+
+    async def get(self, session: AsyncSession) -> bytes:
+        """
+        Возвращает JSON дерева, перестраивая его, если версия изменилась.
+        """
+        result = await session.execute(
+            select(func.count(), func.max(Activity.modified_at))
+        )
+        version = tuple(result.one())
+        if self._body is not None and version == self._version:
+            return self._body
+
+        async with self._lock:
+            if self._body is None or version != self._version:
+                self._body = await self._build(session)
+                self._version = version
+            return self._body
+
+    async def _build(self, session: AsyncSession) -> bytes:
+        # Одна выборка без загрузки связей, дерево собирается в памяти
+        result = await session.execute(
+            select(Activity.id, Activity.name, Activity.parent_id).order_by(
+                Activity.name
+            )
+        )
+        rows = result.all()
+        nodes: dict[uuid.UUID, ActivityTreeNode] = {
+            activity_id: ActivityTreeNode(id=activity_id, name=name)
+            for activity_id, name, _ in rows
+        }
+        roots = []
+        for activity_id, _, parent_id in rows:
+            parent = nodes.get(parent_id) if parent_id is not None else None
+            if parent is None:
+                roots.append(nodes[activity_id])
+            else:
+                parent.children.append(nodes[activity_id])
+        return ActivityTreeAdapter.dump_json(roots)
+
+
+activity_tree = ActivityTreeCache()
@@ -30,6 +30,26 @@ class DatabaseSettings(BaseModel):
     USER: str | None = None
     PASSWORD: str | None = None
     DB: str = ""
+    # Пул соединений одного воркера: всего до (POOL_SIZE + MAX_OVERFLOW)
+    # соединений на воркер, с учётом числа воркеров gunicorn это должно
+    # укладываться в max_connections Postgres
+    POOL_SIZE: int = 5
+    MAX_OVERFLOW: int = 10
+    # Сколько секунд ждать свободного соединения до ошибки
+    POOL_TIMEOUT: float = 30.0
+    # Пересоздавать соединения старше N секунд (-1 - не пересоздавать)
+    POOL_RECYCLE: int = 1800
+    # Проверять соединение перед выдачей из пула
+    POOL_PRE_PING: bool = False
+    # Кэш подготовленных выражений asyncpg на соединение (0 - для pgbouncer
+    # в режиме transaction)
+    STATEMENT_CACHE_SIZE: int = 100
+    # Реплики для чтения (postgresql+asyncpg://...): GET-запросы идут на них
+    # по кругу, остальные - на основную базу
+    REPLICAS: list[PostgresDsn] = []
+    # Сколько секунд после записи клиент читает с основной базы, чтобы
+    # видеть свои изменения несмотря на отставание реплик (0 - выключено)
+    READ_YOUR_WRITES_SECONDS: int = 0
 
 
 class SecuritySettings(BaseModel):
@@ -38,6 +58,43 @@ class SecuritySettings(BaseModel):
 
 class ServiceSettings(BaseModel):
     API_PREFIX: str = "/api/"
+    # Размер страницы для списковых эндпоинтов
+    PAGE_SIZE_DEFAULT: int = 50
+    PAGE_SIZE_MAX: int = 500
+    # Размер пачки строк при потоковой выдаче (NDJSON)
+    STREAM_BATCH_SIZE: int = 500
+    # Пространственный индекс зданий в памяти воркера
+    SPATIAL_INDEX_ENABLED: bool = True
+    SPATIAL_INDEX_CELL_DEG: float = 0.01
+    SPATIAL_INDEX_REFRESH_SECONDS: float = 5.0
+    # Кластеры организаций на карте: сетка мельче тайлов уровня приближения
+    # на столько уровней (2 - ячейки 4x4 на тайл) и предел числа ячеек
+    # в прямоугольнике запроса
+    CLUSTER_GRID_LEVELS: int = 2
+    CLUSTER_MAX_CELLS: int = 4096
+    # Максимальная глубина дерева деятельностей
+    ACTIVITY_MAX_DEPTH: int = 3
+    # Порог похожести для нечёткого поиска по названию (pg_trgm)
+    SEARCH_SIMILARITY_THRESHOLD: float = 0.4
+    # Максимальное число организаций в одном запросе массового создания
+    BULK_MAX_ITEMS: int = 10000
+    # Максимальное число id в одном мульти-запросе (?ids= и /lookup)
+    LOOKUP_MAX_IDS: int = 100
+    # Один и тот же SQL, выполненный за запрос столько раз и больше, -
+    # признак N+1, пишется в лог
+    QUERY_REPEAT_WARNING: int = 5
+    # Превышение бюджета запросов маршрута (query_budget) - ошибка вместо
+    # записи в лог. Включается в тестах
+    QUERY_BUDGET_STRICT: bool = False
+
+
+class CacheSettings(BaseModel):
+    # Кэш ответов GET-эндпоинтов в памяти воркера. Запись в любом воркере
+    # сбрасывает его во всех по уведомлению из БД; TTL ограничивает
+    # устаревание, пока слушатель уведомлений переподключается
+    ENABLED: bool = True
+    TTL_SECONDS: float = 30.0
+    MAX_BYTES: int = 64 * 1024 * 1024
 
 
 class Settings(BaseSettings):
@@ -50,6 +107,7 @@ class Settings(BaseSettings):
     service: ServiceSettings
     database: DatabaseSettings
     security: SecuritySettings
+    cache: CacheSettings = CacheSettings()
 
     DEBUG: bool = False
 
@@ -65,6 +123,11 @@ class Settings(BaseSettings):
         )
         return PostgresDsn(multi_host_url)
 
+    @property
+    def NOTIFY_DATABASE_DSN(self) -> str:
+        # Слушатель LISTEN подключается к основной базе напрямую через asyncpg
+        return str(self.MAIN_DATABASE_URI).replace("postgresql+asyncpg", "postgresql", 1)
+
     @classmethod
     def settings_customise_sources(
         cls,
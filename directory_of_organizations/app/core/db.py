@@ -1,20 +1,97 @@
+import time
+
 from sqlalchemy.ext.asyncio import (
     AsyncEngine,
     AsyncSession,
     create_async_engine,
     async_sessionmaker,
 )
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from app.core.config import settings
+from app.core.metrics import POOL_WAIT, instrument_engine
 
-engine: AsyncEngine = create_async_engine(
-    str(settings.MAIN_DATABASE_URI),
-    future=True,
-)
 
-AsyncSessionLocal = async_sessionmaker(
-    bind=engine,
-    class_=AsyncSession,
-    expire_on_commit=False,
-    autoflush=False,
-)
\ No newline at end of file
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Пул соединений, который считает время получения соединения:
+    ожидание свободного соединения плюс, при необходимости, подключение.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.waiting = 0
+        self.checkouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        self.waiting += 1
+        try:
+            return super()._do_get()
+        finally:
+            waited = time.perf_counter() - started
+            self.waiting -= 1
+            self.checkouts += 1
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+            POOL_WAIT.labels(self.logging_name).observe(waited)
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size(),
+            "checked_out": self.checkedout(),
+            "idle": self.checkedin(),
+            # Отрицательное значение - пул ещё не открыл все POOL_SIZE соединений
+            "overflow": self.overflow(),
+            "max_overflow": self._max_overflow,
+            "waiting": self.waiting,
+            "checkouts": self.checkouts,
+            "wait_seconds_total": self.wait_seconds_total,
+            "wait_seconds_max": self.wait_seconds_max,
+        }
+
+
+def make_engine(url: str, name: str) -> AsyncEngine:
+    engine = create_async_engine(
+        url,
+        future=True,
+        poolclass=TimedQueuePool,
+        # Имя пула - метка его метрик
+        pool_logging_name=name,
+        pool_size=settings.database.POOL_SIZE,
+        max_overflow=settings.database.MAX_OVERFLOW,
+        pool_timeout=settings.database.POOL_TIMEOUT,
+        pool_recycle=settings.database.POOL_RECYCLE,
+        pool_pre_ping=settings.database.POOL_PRE_PING,
+        connect_args={
+            # Кэш asyncpg и кэш подготовленных выражений диалекта SQLAlchemy
+            "statement_cache_size": settings.database.STATEMENT_CACHE_SIZE,
+            "prepared_statement_cache_size": settings.database.STATEMENT_CACHE_SIZE,
+        },
+    )
+    instrument_engine(engine)
+    return engine
+
+
+def make_sessionmaker(bind: AsyncEngine) -> async_sessionmaker[AsyncSession]:
+    return async_sessionmaker(
+        bind=bind,
+        class_=AsyncSession,
+        expire_on_commit=False,
+        autoflush=False,
+    )
+
+
+engine: AsyncEngine = make_engine(str(settings.MAIN_DATABASE_URI), "primary")
+
+AsyncSessionLocal = make_sessionmaker(engine)
+
+# Реплики только для чтения, у каждой свой пул
+replica_engines: list[AsyncEngine] = [
+    make_engine(str(url), f"replica{i}")
+    for i, url in enumerate(settings.database.REPLICAS)
+]
+
+ReplicaSessionLocals = [make_sessionmaker(e) for e in replica_engines]
@@ -0,0 +1,224 @@
+import logging
+import os
+import time
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Callable, TypeVar
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+Endpoint = TypeVar("Endpoint", bound=Callable)
+
+# Метка запросов, не попавших ни в один маршрут (404 и т.п.), - чтобы
+# произвольные пути не раздували число временных рядов
+UNMATCHED_ROUTE = "unmatched"
+# Метка запросов к БД вне HTTP-запроса (старт приложения, фоновые обновления)
+NO_ROUTE = "none"
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Время обработки HTTP-запроса, включая отправку тела ответа",
+    ["method", "route", "status"],
+)
+RESPONSE_SIZE = Histogram(
+    "http_response_size_bytes",
+    "Размер тела HTTP-ответа",
+    ["method", "route"],
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, float("inf")),
+)
+REQUEST_DB_DURATION = Histogram(
+    "http_request_db_seconds",
+    "Суммарное время запросов к БД за один HTTP-запрос",
+    ["method", "route"],
+)
+REQUEST_DB_QUERIES = Histogram(
+    "http_request_db_queries",
+    "Число запросов к БД за один HTTP-запрос",
+    ["method", "route"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, float("inf")),
+)
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds",
+    "Время выполнения одного запроса к БД",
+    ["route"],
+)
+POOL_WAIT = Histogram(
+    "db_pool_wait_seconds",
+    "Время получения соединения из пула",
+    ["pool"],
+)
+
+
+@dataclass
+class RequestStats:
+    """
+    Запросы к БД, выполненные в рамках одного HTTP-запроса.
+    """
+
+    queries: int = 0
+    query_seconds: list[float] = field(default_factory=list)
+    # Число выполнений каждого текста SQL (параметры в текст не входят)
+    statements: Counter[str] = field(default_factory=Counter)
+
+
+# Статистика текущего HTTP-запроса. Хранится изменяемый объект: задачи,
+# порождённые обработчиком, получают копию контекста с той же ссылкой
+request_stats: ContextVar[RequestStats | None] = ContextVar(
+    "request_stats", default=None
+)
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """
+    Подключает к движку обработчики событий, которые засекают время
+    каждого запроса к БД и относят его к текущему HTTP-запросу.
+    """
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        stats = request_stats.get()
+        if stats is None:
+            DB_QUERY_DURATION.labels(NO_ROUTE).observe(elapsed)
+            return
+        stats.queries += 1
+        stats.query_seconds.append(elapsed)
+        stats.statements[statement] += 1
+
+
+class QueryBudgetExceeded(RuntimeError):
+    """
+    Маршрут выполнил больше запросов к БД, чем объявлено в query_budget.
+    """
+
+
+def query_budget(limit: int) -> Callable[[Endpoint], Endpoint]:
+    """
+    Объявляет для эндпоинта максимум запросов к БД за один вызов.
+    Превышение пишется в лог, а при QUERY_BUDGET_STRICT (тесты) - ошибка.
+    Ставится под декоратором маршрута:
+
+        @router.get("/{id}")
+        @query_budget(1)
+        async def read(...): ...
+    """
+
+    def decorate(endpoint: Endpoint) -> Endpoint:
+        endpoint.query_budget = limit
+        return endpoint
+
+    return decorate
+
+
+def check_queries(method: str, route: str, scope: dict, stats: RequestStats) -> None:
+    """
+    Пишет в лог повторяющиеся запросы (признак N+1) и проверяет бюджет маршрута.
+    """
+    for statement, count in stats.statements.items():
+        if count >= settings.service.QUERY_REPEAT_WARNING:
+            logger.warning(
+                "%s %s: statement repeated %d times (possible N+1): %s",
+                method,
+                route,
+                count,
+                statement,
+            )
+    endpoint = getattr(scope.get("route"), "endpoint", None)
+    budget = getattr(endpoint, "query_budget", None)
+    if budget is None or stats.queries <= budget:
+        return
+    message = f"{method} {route}: {stats.queries} queries, budget {budget}"
+    if settings.service.QUERY_BUDGET_STRICT:
+        raise QueryBudgetExceeded(message)
+    logger.warning("Query budget exceeded: %s", message)
+
+
+def route_label(scope: dict) -> str:
+    """
+    Шаблон пути маршрута (`/api/organizations/{organization_id}`),
+    а не сам путь запроса.
+    """
+    route = scope.get("route")
+    return getattr(route, "path_format", None) or UNMATCHED_ROUTE
+
+
+class MetricsMiddleware:
+    """
+    ASGI-middleware метрик HTTP-запросов: длительность до отправки последнего
+    байта тела (в том числе потоковых ответов), код ответа, размер тела
+    и время, проведённое в БД. В режиме DEBUG добавляет к ответу заголовок
+    X-Query-Count - число запросов к БД до начала ответа.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        size = 0
+
+        async def send_with_metrics(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if settings.DEBUG:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"x-query-count", str(stats.queries).encode()))
+                    message = {**message, "headers": headers}
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        stats = RequestStats()
+        token = request_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            elapsed = time.perf_counter() - started
+            request_stats.reset(token)
+            method, route = scope["method"], route_label(scope)
+            REQUEST_DURATION.labels(method, route, str(status)).observe(elapsed)
+            RESPONSE_SIZE.labels(method, route).observe(size)
+            REQUEST_DB_QUERIES.labels(method, route).observe(stats.queries)
+            REQUEST_DB_DURATION.labels(method, route).observe(sum(stats.query_seconds))
+            query_duration = DB_QUERY_DURATION.labels(route)
+            for seconds in stats.query_seconds:
+                query_duration.observe(seconds)
+        check_queries(method, route, scope, stats)
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """
+    Метрики в текстовом формате Prometheus. Под gunicorn каждый воркер пишет
+    значения в файлы каталога PROMETHEUS_MULTIPROC_DIR, здесь они
+    суммируются по всем воркерам.
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
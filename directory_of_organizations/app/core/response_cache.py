@@ -0,0 +1,176 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import asyncpg
+
+from app.core.config import settings
+from app.models.base import CACHE_CHANNEL
+
+logger = logging.getLogger(__name__)
+
+# Пауза перед повторным подключением слушателя уведомлений
+LISTEN_RETRY_SECONDS = 1.0
+
+
+@dataclass
+class CacheEntry:
+    body: bytes
+    status_code: int
+    headers: dict[str, str]
+    tags: frozenset[str]
+    expires_at: float
+    size: int
+
+
+class ResponseCache:
+    """
+    LRU-кэш HTTP-ответов в памяти воркера с TTL и ограничением по объёму.
+    Записи помечаются тегами сущностей и сбрасываются по тегу при записи:
+    сразу в воркере, выполнившем запись, и по уведомлению из БД во всех
+    остальных (см. listen_invalidations).
+    """
+
+    def __init__(self, ttl_seconds: float, max_bytes: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.clear()
+
+    def clear(self) -> None:
+        self._entries: OrderedDict[str, CacheEntry] = OrderedDict()
+        self._keys_by_tag: dict[str, set[str]] = {}
+        # Время последнего сброса каждого тега (time.monotonic)
+        self._invalidated_at: dict[str, float] = {}
+        # Растёт при каждом сбросе: ответ, начатый до сброса, не кэшируется
+        self.generation = getattr(self, "generation", 0) + 1
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: str) -> CacheEntry | None:
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at <= time.monotonic():
+            self._remove(key)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def set(
+        self,
+        key: str,
+        body: bytes,
+        status_code: int,
+        headers: dict[str, str],
+        tags: frozenset[str],
+    ) -> None:
+        size = len(key) + len(body)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = CacheEntry(
+            body=body,
+            status_code=status_code,
+            headers=headers,
+            tags=tags,
+            expires_at=time.monotonic() + self.ttl_seconds,
+            size=size,
+        )
+        self.size += size
+        for tag in tags:
+            self._keys_by_tag.setdefault(tag, set()).add(key)
+        # Вытесняем давно не использованные записи
+        while self.size > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def invalidate(self, *tags: str) -> None:
+        """
+        Сбрасывает все ответы, помеченные любым из тегов.
+        """
+        self.generation += 1
+        now = time.monotonic()
+        for tag in tags:
+            self._invalidated_at[tag] = now
+            for key in self._keys_by_tag.pop(tag, set()):
+                if key in self._entries:
+                    self._remove(key)
+                    self.invalidations += 1
+
+    def invalidated_within(self, tags: frozenset[str], seconds: float) -> bool:
+        """
+        Сбрасывался ли любой из тегов за последние `seconds` секунд.
+        """
+        now = time.monotonic()
+        return any(
+            now - self._invalidated_at.get(tag, float("-inf")) < seconds for tag in tags
+        )
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self.size -= entry.size
+        for tag in entry.tags:
+            keys = self._keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_tag[tag]
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "size_bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+response_cache = ResponseCache(
+    ttl_seconds=settings.cache.TTL_SECONDS,
+    max_bytes=settings.cache.MAX_BYTES,
+)
+
+
+async def listen_invalidations(
+    dsn: str, cache: ResponseCache, connected: asyncio.Event | None = None
+) -> None:
+    """
+    Слушает канал уведомлений, в который триггеры таблиц пишут теги при
+    записи (в том числе из других воркеров и вне приложения), и сбрасывает
+    ответы с этими тегами. Работает до отмены задачи. При (пере)подключении
+    кэш очищается целиком: уведомления, пришедшие без слушателя, потеряны.
+    """
+
+    def on_notify(connection, pid, channel, tag):
+        cache.invalidate(tag)
+
+    while True:
+        try:
+            connection = await asyncpg.connect(dsn)
+        except (OSError, asyncpg.PostgresError) as error:
+            logger.warning("Response cache listener cannot connect: %s", error)
+            await asyncio.sleep(LISTEN_RETRY_SECONDS)
+            continue
+        lost = asyncio.Event()
+        connection.add_termination_listener(lambda _: lost.set())
+        try:
+            await connection.add_listener(CACHE_CHANNEL, on_notify)
+            cache.clear()
+            if connected is not None:
+                connected.set()
+            await lost.wait()
+            logger.warning("Response cache listener lost its connection")
+        finally:
+            await connection.close()
+        await asyncio.sleep(LISTEN_RETRY_SECONDS)
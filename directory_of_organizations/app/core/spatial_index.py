@@ -0,0 +1,200 @@
+import asyncio
+import logging
+import time
+import uuid
+from math import asin, cos, floor, isfinite, radians, sin, sqrt
+
+from sqlalchemy import BigInteger, Text, cast, func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.config import settings
+from app.core.db import AsyncSessionLocal
+from app.models.building import Building
+from app.schemas.utils import BoundingBox
+from app.utils import EARTH_RADIUS_KM, get_bounding_box_area, split_antimeridian
+
+# Наименьший id транзакции, ещё выполнявшейся на момент снимка запроса:
+# все транзакции с меньшими id к этому моменту завершены
+SNAPSHOT_XMIN = cast(
+    cast(func.pg_snapshot_xmin(func.pg_current_snapshot()), Text), BigInteger
+)
+
+CellKey = tuple[int, int]
+
+logger = logging.getLogger(__name__)
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """
+    Расстояние по большому кругу между двумя точками, км.
+    """
+    a = (
+        sin(radians(lat2 - lat1) / 2) ** 2
+        + cos(radians(lat1)) * cos(radians(lat2)) * sin(radians(lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * asin(sqrt(min(a, 1.0)))
+
+
+class BuildingGridIndex:
+    """
+    Пространственный индекс зданий в памяти воркера: равномерная сетка
+    по (широта, долгота) с ячейками `cell_deg` градусов.
+    Загружается целиком при первом обращении и далее обновляется
+    инкрементально по `change_xid` - id транзакции, записавшей здание.
+    Читает всегда основную базу через `session_factory`.
+    """
+
+    def __init__(
+        self,
+        cell_deg: float,
+        refresh_seconds: float,
+        session_factory: async_sessionmaker[AsyncSession] = AsyncSessionLocal,
+    ):
+        self.cell_deg = cell_deg
+        self.refresh_seconds = refresh_seconds
+        self.session_factory = session_factory
+        self._lock = asyncio.Lock()
+        self.clear()
+
+    def clear(self) -> None:
+        self._cells: dict[CellKey, dict[uuid.UUID, tuple[float, float]]] = {}
+        self._positions: dict[uuid.UUID, CellKey] = {}
+        self._watermark: int | None = None
+        self._loaded = False
+        self._refreshed_at = 0.0
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def _cell(self, latitude: float, longitude: float) -> CellKey:
+        return floor(latitude / self.cell_deg), floor(longitude / self.cell_deg)
+
+    def add(self, building_id: uuid.UUID, latitude: float, longitude: float) -> None:
+        """
+        Добавляет здание в индекс или переносит его в новые координаты.
+        Здание с нечисловыми координатами (NaN, бесконечность) пропускается:
+        одна испорченная строка не должна ломать весь индекс.
+        """
+        old_key = self._positions.pop(building_id, None)
+        if old_key is not None:
+            old_cell = self._cells[old_key]
+            del old_cell[building_id]
+            if not old_cell:
+                del self._cells[old_key]
+        if not (isfinite(latitude) and isfinite(longitude)):
+            logger.warning(
+                "Building %s skipped by spatial index: coordinates (%s, %s)",
+                building_id,
+                latitude,
+                longitude,
+            )
+            return
+        key = self._cell(latitude, longitude)
+        self._cells.setdefault(key, {})[building_id] = (latitude, longitude)
+        self._positions[building_id] = key
+
+    def search_box(self, box: BoundingBox) -> list[uuid.UUID]:
+        """
+        Возвращает id зданий внутри прямоугольника.
+        """
+        return [bid for bid, _, _ in self._points_in_box(box)]
+
+    def search_radius(
+        self, latitude: float, longitude: float, radius_km: float
+    ) -> list[tuple[uuid.UUID, float]]:
+        """
+        Возвращает пары (id здания, расстояние в км) в радиусе от точки,
+        отсортированные по расстоянию.
+        """
+        box = get_bounding_box_area(latitude, longitude, radius_km)
+        found = []
+        for bid, lat, lon in self._points_in_box(box):
+            distance = haversine_km(latitude, longitude, lat, lon)
+            if distance <= radius_km:
+                found.append((bid, distance))
+        found.sort(key=lambda item: item[1])
+        return found
+
+    def _points_in_box(self, box: BoundingBox):
+        for part in split_antimeridian(box):
+            yield from self._points_in_part(part)
+
+    def _points_in_part(self, box: BoundingBox):
+        min_i, min_j = self._cell(box.min_lat, box.min_lon)
+        max_i, max_j = self._cell(box.max_lat, box.max_lon)
+
+        # Для крупных прямоугольников дешевле перебрать занятые ячейки
+        if (max_i - min_i + 1) * (max_j - min_j + 1) > len(self._cells):
+            cells = [
+                cell
+                for (i, j), cell in self._cells.items()
+                if min_i <= i <= max_i and min_j <= j <= max_j
+            ]
+        else:
+            cells = [
+                self._cells[(i, j)]
+                for i in range(min_i, max_i + 1)
+                for j in range(min_j, max_j + 1)
+                if (i, j) in self._cells
+            ]
+
+        for cell in cells:
+            for bid, (lat, lon) in cell.items():
+                if (
+                    box.min_lat <= lat <= box.max_lat
+                    and box.min_lon <= lon <= box.max_lon
+                ):
+                    yield bid, lat, lon
+
+    async def refresh(self) -> None:
+        """
+        Подтягивает из БД здания, изменённые с момента прошлого обновления
+        (при первом вызове - все здания).
+        """
+        async with self._lock:
+            await self._refresh()
+
+    async def ensure_fresh(self) -> None:
+        """
+        Обновляет индекс, если с прошлого обновления прошло `refresh_seconds`.
+        Запросы, дождавшиеся блокировки, пока индекс обновлял другой,
+        повторно его не обновляют.
+        """
+        if self._fresh():
+            return
+        async with self._lock:
+            if not self._fresh():
+                await self._refresh()
+
+    def _fresh(self) -> bool:
+        return (
+            self._loaded
+            and time.monotonic() - self._refreshed_at < self.refresh_seconds
+        )
+
+    async def _refresh(self) -> None:
+        # Снимок запроса видит все транзакции с id меньше его xmin, поэтому
+        # следующее обновление читает здания начиная с этого id: запись
+        # из транзакции, закоммиченной позже снимка, не теряется, какой бы
+        # долгой ни была транзакция и что бы ни показывали часы приложения
+        query = select(
+            Building.id, Building.latitude, Building.longitude, SNAPSHOT_XMIN
+        )
+        if self._watermark is not None:
+            query = query.where(Building.change_xid >= self._watermark)
+        async with self.session_factory() as session:
+            result = await session.stream(
+                query.execution_options(yield_per=settings.service.STREAM_BATCH_SIZE)
+            )
+            async for partition in result.partitions():
+                for building_id, latitude, longitude, snapshot_xmin in partition:
+                    self.add(building_id, latitude, longitude)
+                    self._watermark = snapshot_xmin
+        self._loaded = True
+        self._refreshed_at = time.monotonic()
+
+
+building_index = BuildingGridIndex(
+    cell_deg=settings.service.SPATIAL_INDEX_CELL_DEG,
+    refresh_seconds=settings.service.SPATIAL_INDEX_REFRESH_SECONDS,
+)
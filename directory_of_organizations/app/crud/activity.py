@@ -1,27 +1,85 @@
 import uuid
 from fastapi import HTTPException, status
-from sqlalchemy import select
+from sqlalchemy import (
+    ARRAY,
+    UUID,
+    BigInteger,
+    ColumnElement,
+    Integer,
+    Select,
+    SmallInteger,
+    Text,
+    any_,
+    cast,
+    column,
+    delete,
+    distinct,
+    func,
+    literal,
+    select,
+    union_all,
+)
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.activity_tree import activity_tree
+from app.core.config import settings
+from app.crud import building as buildings_crud
 from app.models.activity import Activity
+from app.models.association_tables import (
+    activity_building_counts,
+    activity_cell_counts,
+    activity_closure,
+    activity_counts,
+    organization_activities,
+)
+from app.models.building import Building
+from app.models.organization import Organization
+from app.schemas.utils import BoundingBox
+from app.utils import COUNT_CELL_ZOOM, FieldSelection, cover_box, json_object
 
+# Предел числа диапазонов cell_key на границе прямоугольника фасетов:
+# здания в них проверяются по координатам, остальное - готовые суммы ячеек
+FACET_MAX_RANGES = 256
 
-# Получить глубину вложенности деятельности
+# Поля ответа ActivityRead в порядке схемы - они же допустимы в fields=
+ACTIVITY_COLUMNS = {"name": Activity.name, "id": Activity.id}
+
+
+# Получить уровень вложенности деятельности (1 - корневая, 0 - не найдена).
+# Равен числу предков, включая саму деятельность, - один запрос по индексу
 async def get_activity_depth(session: AsyncSession, activity_id: uuid.UUID) -> int:
-    depth = 1
-    current_id = activity_id
+    result = await session.execute(
+        select(func.count()).where(activity_closure.c.descendant_id == activity_id)
+    )
+    return result.scalar_one()
 
-    while True:
-        result = await session.execute(
-            select(Activity.parent_id).where(Activity.id == current_id)
+
+# Получить высоту поддерева деятельности (0 - нет потомков)
+async def get_subtree_height(session: AsyncSession, activity_id: uuid.UUID) -> int:
+    result = await session.execute(
+        select(func.coalesce(func.max(activity_closure.c.depth), 0)).where(
+            activity_closure.c.ancestor_id == activity_id
+        )
+    )
+    return result.scalar_one()
+
+
+# Проверить, что под родителем поместится поддерево высотой `subtree_height`
+async def check_activity_depth(
+    session: AsyncSession, parent_id: uuid.UUID, subtree_height: int = 0
+) -> None:
+    depth = await get_activity_depth(session, parent_id)
+    if depth == 0:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Parent activity not found",
+        )
+    max_depth = settings.service.ACTIVITY_MAX_DEPTH
+    if depth + subtree_height >= max_depth:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Максимальная глубина вложенности деятельностей — {max_depth} уровня",
         )
-        parent_id = result.scalar()
-        if parent_id is None:
-            break
-        depth += 1
-        current_id = parent_id
-        if depth > 3:
-            break
-    return depth
 
 
 # Создать деятельность
@@ -32,17 +90,56 @@ async def create_activity(
 ) -> Activity:
     # Проверяем глубину вложенности
     if parent_id is not None:
-        depth = await get_activity_depth(session, parent_id)
-        if depth >= 3:
+        await check_activity_depth(session, parent_id)
+
+    activity = Activity(name=name, parent_id=parent_id)
+    session.add(activity)
+    await session.commit()
+    await session.refresh(activity)
+    activity_tree.invalidate()
+    return activity
+
+
+# Перенести деятельность (вместе с поддеревом) к другому родителю
+async def move_activity(
+    session: AsyncSession,
+    activity: Activity,
+    parent_id: uuid.UUID | None,
+) -> Activity:
+    if parent_id is not None:
+        # Нельзя перенести деятельность внутрь собственного поддерева
+        result = await session.execute(
+            select(activity_closure.c.depth).where(
+                (activity_closure.c.ancestor_id == activity.id)
+                & (activity_closure.c.descendant_id == parent_id)
+            )
+        )
+        if result.first() is not None:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Максимальная глубина вложенности деятельностей — 3 уровня",
+                detail="Нельзя перенести деятельность в собственное поддерево",
             )
+        height = await get_subtree_height(session, activity.id)
+        await check_activity_depth(session, parent_id, subtree_height=height)
 
-    activity = Activity(name=name, parent_id=parent_id)
-    session.add(activity)
+    # Счётчики меняются только у старых предков деятельности и у нового
+    # родителя с его предками: у узлов поддерева состав потомков прежний
+    nodes = [activity.id] if parent_id is None else [activity.id, parent_id]
+    result = await session.execute(
+        select(activity_closure.c.ancestor_id).where(
+            activity_closure.c.descendant_id.in_(nodes)
+            & (activity_closure.c.ancestor_id != activity.id)
+        )
+    )
+    affected = list(set(result.scalars()))
+
+    activity.parent_id = parent_id
+    await session.flush()
+    if affected:
+        await refresh_activity_counts(session, affected)
     await session.commit()
     await session.refresh(activity)
+    activity_tree.invalidate()
     return activity
 
 
@@ -62,7 +159,226 @@ async def get_activity_with_children(
     return result.scalar_one_or_none()
 
 
-# Получить все деятельности
-async def get_activities(session: AsyncSession) -> list[Activity]:
-    result = await session.execute(select(Activity))
-    return list(result.scalars().all())
\ No newline at end of file
+# JSON деятельности только из перечисленных полей
+def activity_json(fields: list[str]) -> ColumnElement:
+    return json_object(**{name: ACTIVITY_COLUMNS[name] for name in fields})
+
+
+# Выборка (id, data): в запрос попадают только выбранные колонки
+def activities_json_query(selection: FieldSelection) -> Select:
+    return select(
+        Activity.id, cast(activity_json(selection.fields()), Text).label("data")
+    )
+
+
+# Получить JSON деятельности по id
+async def get_activity_json(
+    session: AsyncSession, activity_id: uuid.UUID, selection: FieldSelection
+) -> str | None:
+    result = await session.execute(
+        activities_json_query(selection).where(Activity.id == activity_id)
+    )
+    row = result.first()
+    return row.data if row else None
+
+
+# Получить JSON деятельностей по списку id одним запросом по первичному ключу: {id: data}
+async def get_activities_json_by_ids(
+    session: AsyncSession, activity_ids: list[uuid.UUID], selection: FieldSelection
+) -> dict[uuid.UUID, str]:
+    result = await session.execute(
+        activities_json_query(selection).where(
+            Activity.id == any_(literal(activity_ids, ARRAY(UUID)))
+        )
+    )
+    return {row.id: row.data for row in result}
+
+
+# Получить страницу деятельностей в виде строк (id, data)
+async def get_activities_json(
+    session: AsyncSession,
+    limit: int,
+    selection: FieldSelection,
+    after: uuid.UUID | None = None,
+) -> list:
+    query = activities_json_query(selection)
+    if after is not None:
+        query = query.where(Activity.id > after)
+    result = await session.execute(query.order_by(Activity.id).limit(limit))
+    return list(result.all())
+
+
+# Строки (activity_id, building_id, organizations): число различных
+# организаций здания с деятельностью из поддерева activity_id.
+# Только по организациям `organization_ids` и для деятельностей
+# `activity_ids`, если они заданы
+def activity_rollup(
+    organization_ids: list[uuid.UUID] | None = None,
+    activity_ids: list[uuid.UUID] | None = None,
+) -> Select:
+    links = organization_activities.c
+    query = (
+        select(
+            activity_closure.c.ancestor_id.label("activity_id"),
+            Organization.building_id,
+            func.count(distinct(links.organization_id)).label("organizations"),
+        )
+        .join(
+            organization_activities,
+            links.activity_id == activity_closure.c.descendant_id,
+        )
+        .join(Organization, Organization.id == links.organization_id)
+        .group_by(activity_closure.c.ancestor_id, Organization.building_id)
+    )
+    if organization_ids is not None:
+        query = query.where(
+            links.organization_id == any_(literal(organization_ids, ARRAY(UUID)))
+        )
+    if activity_ids is not None:
+        query = query.where(
+            activity_closure.c.ancestor_id == any_(literal(activity_ids, ARRAY(UUID)))
+        )
+    return query
+
+
+# Прибавить строки rollup к счётчикам по зданиям, ячейкам и общим - один
+# запрос: вставки по зданиям и ячейкам идут в CTE, общие счётчики - суммы
+# по зданиям (организация находится ровно в одном здании)
+async def add_activity_counts(session: AsyncSession, rollup: Select) -> None:
+    rollup = rollup.cte("rollup")
+    by_cell = buildings_crud.add_cell_counts(
+        select(rollup.c.activity_id, Building.cell_key, rollup.c.organizations)
+        .join(Building, Building.id == rollup.c.building_id)
+        .subquery("by_building_cell")
+    )
+    by_building = insert(activity_building_counts).from_select(
+        ["activity_id", "building_id", "organizations"], select(rollup)
+    )
+    by_building = by_building.on_conflict_do_update(
+        index_elements=["building_id", "activity_id"],
+        set_={
+            "organizations": activity_building_counts.c.organizations
+            + by_building.excluded.organizations
+        },
+    )
+    total = insert(activity_counts).from_select(
+        ["activity_id", "organizations"],
+        select(
+            rollup.c.activity_id, cast(func.sum(rollup.c.organizations), Integer)
+        ).group_by(rollup.c.activity_id),
+    )
+    total = total.on_conflict_do_update(
+        index_elements=["activity_id"],
+        set_={
+            "organizations": activity_counts.c.organizations
+            + total.excluded.organizations
+        },
+    ).add_cte(by_building.cte("by_building"), by_cell.cte("by_cell"))
+    await session.execute(total)
+
+
+# Учесть в счётчиках только что вставленные организации (до коммита)
+async def count_new_organizations(
+    session: AsyncSession, organization_ids: list[uuid.UUID]
+) -> None:
+    await add_activity_counts(session, activity_rollup(organization_ids))
+
+
+# Пересчитать счётчики деятельностей `activity_ids` (без них - все).
+# Параллельное создание организаций счётчики не портит: прибавление
+# к удаляемой строке ждёт коммита пересчёта, а пересчёт, начатый после
+# коммита организации, уже видит её связи. Старые строки всех таблиц
+# удаляются одним запросом
+async def refresh_activity_counts(
+    session: AsyncSession, activity_ids: list[uuid.UUID] | None = None
+) -> None:
+    deletes = []
+    for table in (activity_building_counts, activity_cell_counts, activity_counts):
+        query = delete(table)
+        if activity_ids is not None:
+            query = query.where(
+                table.c.activity_id == any_(literal(activity_ids, ARRAY(UUID)))
+            )
+        deletes.append(query)
+    query, *others = deletes
+    await session.execute(
+        query.add_cte(*(other.cte(f"delete_{other.table.name}") for other in others))
+    )
+    await add_activity_counts(session, activity_rollup(activity_ids=activity_ids))
+
+
+# Фасеты дерева деятельностей: строки (activity_id, organizations) с числом
+# организаций с учётом потомков - всего, в зданиях `building_ids` или
+# в прямоугольнике `box`. Общие счётчики читаются готовыми, по зданиям -
+# суммируются. Прямоугольник покрывается ячейками сетки тайлов (cover_box):
+# внутренние ячейки берутся из счётчиков ячеек, и по зданиям считается
+# только полоса вдоль его границы
+async def get_activity_facets(
+    session: AsyncSession,
+    building_ids: list[uuid.UUID] | None = None,
+    box: BoundingBox | None = None,
+) -> list:
+    if box is not None:
+        parts = []
+        inside, ranges = cover_box(box, COUNT_CELL_ZOOM, FACET_MAX_RANGES)
+        if inside:
+            zooms, cells = zip(*inside)
+            cover = (
+                func.unnest(
+                    literal(list(zooms), ARRAY(SmallInteger)),
+                    literal(list(cells), ARRAY(BigInteger)),
+                )
+                .table_valued(column("zoom", SmallInteger), column("cell", BigInteger))
+                .render_derived(name="cover")
+            )
+            counts = activity_cell_counts.c
+            parts.append(
+                select(counts.activity_id, counts.organizations).join(
+                    cover, (counts.zoom == cover.c.zoom) & (counts.cell == cover.c.cell)
+                )
+            )
+        if ranges:
+            lows, highs = zip(*ranges)
+            edge = (
+                func.unnest(
+                    literal(list(lows), ARRAY(BigInteger)),
+                    literal(list(highs), ARRAY(BigInteger)),
+                )
+                .table_valued(column("low", BigInteger), column("high", BigInteger))
+                .render_derived(name="edge")
+            )
+            counts = activity_building_counts.c
+            parts.append(
+                select(counts.activity_id, counts.organizations)
+                .join(Building, Building.id == counts.building_id)
+                .join(
+                    edge,
+                    (Building.cell_key >= edge.c.low)
+                    & (Building.cell_key < edge.c.high),
+                )
+                .where(buildings_crud.in_bounding_box(box))
+            )
+        if not parts:
+            return []
+        rows = union_all(*parts).subquery("rows")
+    elif building_ids is not None:
+        counts = activity_building_counts.c
+        rows = (
+            select(counts.activity_id, counts.organizations)
+            .where(counts.building_id == any_(literal(building_ids, ARRAY(UUID))))
+            .subquery("rows")
+        )
+    else:
+        query = select(activity_counts.c.activity_id, activity_counts.c.organizations)
+        result = await session.execute(query.order_by(activity_counts.c.activity_id))
+        return list(result.all())
+
+    organizations = cast(func.sum(rows.c.organizations), Integer)
+    result = await session.execute(
+        select(rows.c.activity_id, organizations.label("organizations"))
+        .group_by(rows.c.activity_id)
+        # Перенос зданий оставляет в ячейках нулевые счётчики
+        .having(organizations > 0)
+        .order_by(rows.c.activity_id)
+    )
+    return list(result.all())
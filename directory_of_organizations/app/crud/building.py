@@ -1,8 +1,55 @@
 import uuid
-from sqlalchemy import select
+from datetime import datetime
+from typing import AsyncIterator
+from fastapi import HTTPException, status
+from sqlalchemy import (
+    ARRAY,
+    UUID,
+    ColumnElement,
+    Float,
+    Insert,
+    Integer,
+    Select,
+    Subquery,
+    Text,
+    any_,
+    cast,
+    column,
+    func,
+    literal,
+    or_,
+    select,
+    true,
+    union_all,
+)
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.core.spatial_index import building_index
+from app.models.association_tables import activity_building_counts, activity_cell_counts
 from app.models.building import Building
+from app.schemas.building import BuildingCreate
 from app.schemas.utils import BoundingBox
+from app.utils import (
+    CELL_KEY_ZOOM,
+    COUNT_CELL_ZOOM,
+    EARTH_RADIUS_KM,
+    FieldSelection,
+    cell_key,
+    json_object,
+    normalize_address,
+    split_antimeridian,
+    unnest_rows,
+)
+
+# Поля ответа BuildingRead в порядке схемы - они же допустимы в fields=
+BUILDING_COLUMNS = {
+    "address": Building.address,
+    "latitude": Building.latitude,
+    "longitude": Building.longitude,
+    "id": Building.id,
+}
 
 
 # Создать здание
@@ -12,35 +59,242 @@ async def create_building(
     building = Building(address=address, latitude=latitude, longitude=longitude)
     session.add(building)
 
-    await session.commit()
+    try:
+        await session.commit()
+    except IntegrityError:
+        await session.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Building with this address already exists",
+        )
     await session.refresh(building)
+    # Своё изменение видно в индексе сразу, не дожидаясь обновления
+    building_index.add(building.id, building.latitude, building.longitude)
     return building
 
 
-# Получить здание по id
-async def get_building(
-    session: AsyncSession, building_id: uuid.UUID
-) -> Building | None:
-    result = await session.execute(select(Building).where(Building.id == building_id))
-    return result.scalar_one_or_none()
+# Прибавить к счётчикам ячеек строки (activity_id, cell_key, organizations):
+# строка учитывается в своей ячейке каждого уровня до COUNT_CELL_ZOOM
+def add_cell_counts(rows: Subquery) -> Insert:
+    levels = (
+        func.generate_series(0, COUNT_CELL_ZOOM)
+        .table_valued(column("zoom", Integer))
+        .render_derived(name="levels")
+    )
+    shift = 2 * (CELL_KEY_ZOOM - levels.c.zoom)
+    cell = rows.c.cell_key.op(">>")(shift).label("cell")
+    query = insert(activity_cell_counts).from_select(
+        ["zoom", "cell", "activity_id", "organizations"],
+        select(
+            levels.c.zoom,
+            cell,
+            rows.c.activity_id,
+            cast(func.sum(rows.c.organizations), Integer),
+        )
+        .join_from(rows, levels, true())
+        .group_by(levels.c.zoom, cell, rows.c.activity_id),
+    )
+    return query.on_conflict_do_update(
+        index_elements=["zoom", "cell", "activity_id"],
+        set_={
+            "organizations": activity_cell_counts.c.organizations
+            + query.excluded.organizations
+        },
+    )
+
 
+# Массовый upsert зданий по нормализованному адресу одним
+# INSERT ... SELECT FROM unnest(...) ON CONFLICT (address_key) DO UPDATE.
+# Возвращает id здания для каждой входной строки в исходном порядке;
+# строки с одинаковым ключом схлопываются, побеждает последняя.
+# Счётчики ячеек переехавших зданий переносятся в том же запросе
+async def upsert_buildings(
+    session: AsyncSession, buildings: list[BuildingCreate]
+) -> list[uuid.UUID]:
+    now = datetime.now()
+    keys = [normalize_address(b.address) for b in buildings]
+    # Одна команда не может обновить строку дважды - дубли убираем заранее
+    rows = {
+        key: {
+            "id": uuid.uuid4(),
+            "address": b.address,
+            "address_key": key,
+            "latitude": b.latitude,
+            "longitude": b.longitude,
+            "cell_key": cell_key(b.latitude, b.longitude),
+            "created_at": now,
+            "modified_at": now,
+        }
+        for key, b in zip(keys, buildings)
+    }
+    table = Building.__table__
+    # Подзапросы одной команды видят данные до её изменений
+    old = (
+        select(table.c.id, table.c.cell_key)
+        .where(table.c.address_key == any_(literal(list(rows), ARRAY(Text))))
+        .cte("old")
+    )
+    query = insert(table).from_select(
+        list(next(iter(rows.values()))), unnest_rows(table, list(rows.values()))
+    )
+    query = query.on_conflict_do_update(
+        index_elements=[table.c.address_key],
+        set_={
+            "address": query.excluded.address,
+            "latitude": query.excluded.latitude,
+            "longitude": query.excluded.longitude,
+            "cell_key": query.excluded.cell_key,
+            "modified_at": query.excluded.modified_at,
+        },
+    ).returning(table.c.id, table.c.address_key, table.c.cell_key)
+    upserted = query.cte("upserted")
 
-# Получить все здания
-async def get_buildings(session: AsyncSession) -> list[Building]:
-    result = await session.execute(select(Building))
-    return list(result.scalars().all())
+    counts = activity_building_counts.c
+    moved = (
+        select(
+            counts.activity_id,
+            counts.organizations,
+            old.c.cell_key,
+            upserted.c.cell_key.label("new_cell_key"),
+        )
+        .join(old, old.c.id == counts.building_id)
+        .join(upserted, upserted.c.id == old.c.id)
+        .where(old.c.cell_key != upserted.c.cell_key)
+        .cte("moved")
+    )
+    deltas = union_all(
+        select(
+            moved.c.activity_id,
+            moved.c.cell_key,
+            (-moved.c.organizations).label("organizations"),
+        ),
+        select(
+            moved.c.activity_id,
+            moved.c.new_cell_key.label("cell_key"),
+            moved.c.organizations,
+        ),
+    ).subquery("deltas")
+    result = await session.execute(
+        select(upserted.c.id, upserted.c.address_key).add_cte(
+            add_cell_counts(deltas).cte("moved_counts")
+        )
+    )
+    ids = {key: building_id for building_id, key in result.all()}
+    await session.commit()
 
+    for key, row in rows.items():
+        building_index.add(ids[key], row["latitude"], row["longitude"])
+    return [ids[key] for key in keys]
 
-# Получить здания по координатам
-async def get_buildings_by_coordinates(
-    session: AsyncSession, box: BoundingBox
-) -> list[Building]:
+
+# JSON здания только из перечисленных полей
+def building_json(fields: list[str]) -> ColumnElement:
+    return json_object(**{name: BUILDING_COLUMNS[name] for name in fields})
+
+
+# Выборка (id, data): в запрос попадают только выбранные колонки
+def buildings_json_query(selection: FieldSelection) -> Select:
+    return select(
+        Building.id, cast(building_json(selection.fields()), Text).label("data")
+    )
+
+
+# Получить JSON здания по id
+async def get_building_json(
+    session: AsyncSession, building_id: uuid.UUID, selection: FieldSelection
+) -> str | None:
+    result = await session.execute(
+        buildings_json_query(selection).where(Building.id == building_id)
+    )
+    row = result.first()
+    return row.data if row else None
+
+
+# Получить JSON зданий по списку id одним запросом по первичному ключу: {id: data}
+async def get_buildings_json_by_ids(
+    session: AsyncSession, building_ids: list[uuid.UUID], selection: FieldSelection
+) -> dict[uuid.UUID, str]:
     result = await session.execute(
-        select(Building).where(
-            (Building.latitude >= box.min_lat)
-            & (Building.latitude <= box.max_lat)
-            & (Building.longitude >= box.min_lon)
-            & (Building.longitude <= box.max_lon)
+        buildings_json_query(selection).where(
+            Building.id == any_(literal(building_ids, ARRAY(UUID)))
+        )
+    )
+    return {row.id: row.data for row in result}
+
+
+# Получить страницу зданий в виде строк (id, data)
+async def get_buildings_json(
+    session: AsyncSession,
+    limit: int,
+    selection: FieldSelection,
+    after: uuid.UUID | None = None,
+) -> list:
+    query = buildings_json_query(selection)
+    if after is not None:
+        query = query.where(Building.id > after)
+    result = await session.execute(query.order_by(Building.id).limit(limit))
+    return list(result.all())
+
+
+# Потоковое чтение JSON всех зданий пачками по `batch_size` через серверный курсор
+async def stream_buildings_json(
+    session: AsyncSession,
+    batch_size: int,
+    selection: FieldSelection,
+    after: uuid.UUID | None = None,
+) -> AsyncIterator[list[str]]:
+    query = buildings_json_query(selection)
+    if after is not None:
+        query = query.where(Building.id > after)
+    query = query.order_by(Building.id).execution_options(yield_per=batch_size)
+
+    result = await session.stream(query)
+    async for partition in result.partitions():
+        yield [row.data for row in partition]
+
+
+# Условие попадания здания в ограничивающий прямоугольник
+def in_bounding_box(box: BoundingBox) -> ColumnElement[bool]:
+    return or_(
+        *(
+            (Building.latitude >= part.min_lat)
+            & (Building.latitude <= part.max_lat)
+            & (Building.longitude >= part.min_lon)
+            & (Building.longitude <= part.max_lon)
+            for part in split_antimeridian(box)
         )
     )
-    return list(result.scalars().all())
\ No newline at end of file
+
+
+# Расстояние по большому кругу (формула гаверсинусов) от точки до здания, км
+def haversine_distance_km(latitude: float, longitude: float) -> ColumnElement[float]:
+    d_lat = func.radians(Building.latitude - latitude)
+    d_lon = func.radians(Building.longitude - longitude)
+    a = func.power(func.sin(d_lat / 2), 2) + func.cos(
+        func.radians(latitude)
+    ) * func.cos(func.radians(Building.latitude)) * func.power(func.sin(d_lon / 2), 2)
+    # least() защищает asin от погрешности округления за пределами [0, 1]
+    return 2 * EARTH_RADIUS_KM * func.asin(
+        func.sqrt(func.least(a, 1.0)), type_=Float
+    )
+
+
+# Получить id зданий внутри прямоугольника.
+# При включённом пространственном индексе кандидаты берутся из памяти воркера
+async def get_buildings_by_coordinates(
+    session: AsyncSession, box: BoundingBox
+) -> list[uuid.UUID]:
+    if settings.service.SPATIAL_INDEX_ENABLED:
+        await building_index.ensure_fresh()
+        return building_index.search_box(box)
+    result = await session.execute(select(Building.id).where(in_bounding_box(box)))
+    return list(result.scalars().all())
+
+
+# Получить id зданий в радиусе от точки с расстоянием до них, км, по возрастанию
+# расстояния. Работает только по пространственному индексу
+async def get_buildings_by_radius(
+    latitude: float, longitude: float, radius_km: float
+) -> list[tuple[uuid.UUID, float]]:
+    await building_index.ensure_fresh()
+    return building_index.search_radius(latitude, longitude, radius_km)
@@ -1,8 +1,62 @@
 import uuid
+from datetime import datetime
+from typing import AsyncIterator
+from app.core.config import settings
+from app.crud import activity as activities_crud
+from app.crud import building as buildings_crud
 from app.models.organization import Organization, OrganizationPhone, Activity
+from app.models.association_tables import activity_closure, organization_activities
+from app.models.building import Building
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import literal_column, select
-from sqlalchemy.orm import aliased, selectinload
+from sqlalchemy import (
+    ARRAY,
+    UUID,
+    ColumnElement,
+    Float,
+    Integer,
+    Select,
+    Table,
+    Text,
+    any_,
+    cast,
+    column,
+    func,
+    insert,
+    literal,
+    select,
+    tuple_,
+)
+from sqlalchemy.orm import joinedload, selectinload
+from app.schemas.organization import OrganizationBulkItemResult, OrganizationCreate
+from app.schemas.utils import BoundingBox
+from app.utils import (
+    CELL_KEY_ZOOM,
+    FieldSelection,
+    get_bounding_box_area,
+    json_agg,
+    json_array,
+    json_object,
+    unnest_rows,
+)
+
+# Граф связей, который сериализует OrganizationRead. Связи моделей сами
+# не загружаются (lazy="raise"), поэтому каждый запрос организаций для
+# ответа API явно подключает ровно этот граф
+ORGANIZATION_READ_OPTIONS = (
+    joinedload(Organization.building),
+    selectinload(Organization.phones),
+    selectinload(Organization.activities),
+)
+
+# Поля ответа OrganizationRead и его связей в порядке схемы - они же
+# допустимы в fields= (поля связей - через точку) и include=
+ORGANIZATION_COLUMNS = {"name": Organization.name, "id": Organization.id}
+PHONE_COLUMNS = {"id": OrganizationPhone.id, "phone": OrganizationPhone.phone}
+ORGANIZATION_RELATIONS = {
+    "building": list(buildings_crud.BUILDING_COLUMNS),
+    "phones": list(PHONE_COLUMNS),
+    "activities": list(activities_crud.ACTIVITY_COLUMNS),
+}
 
 
 # Создать организацию
@@ -26,115 +80,511 @@ async def create_organization(
         org.activities.extend(activities)
 
     session.add(org)
+    if org.activities:
+        await session.flush()
+        await activities_crud.count_new_organizations(session, [org.id])
     await session.commit()
-    await session.refresh(org)
-    return org
+    # Перечитываем с графом ответа: здание у новой организации ещё не загружено
+    result = await session.execute(
+        select(Organization)
+        .options(*ORGANIZATION_READ_OPTIONS)
+        .where(Organization.id == org.id)
+        .execution_options(populate_existing=True)
+    )
+    return result.scalar_one()
 
 
-# Получить организацию по id
-async def get_organization(
-    session: AsyncSession, organization_id: uuid.UUID
-) -> Organization | None:
-    result = await session.execute(
-        select(Organization).where(Organization.id == organization_id)
+# Вставка списка строк одним INSERT ... SELECT FROM unnest(массивы колонок)
+async def insert_rows(session: AsyncSession, table: Table, rows: list[dict]) -> None:
+    if rows:
+        await session.execute(
+            insert(table).from_select(list(rows[0]), unnest_rows(table, rows))
+        )
+
+
+# Массовое создание организаций в одной транзакции.
+# Здания и деятельности всего списка проверяются двумя запросами, строки
+# вставляются многострочными INSERT через Core. ORM-события при этом не
+# срабатывают, поэтому id и временные метки проставляются здесь.
+# Позиции с несуществующим зданием или деятельностью пропускаются с ошибкой.
+async def create_organizations_bulk(
+    session: AsyncSession, organizations: list[OrganizationCreate]
+) -> list[OrganizationBulkItemResult]:
+    building_ids = list({o.building_id for o in organizations})
+    activity_ids = list({a for o in organizations for a in o.activity_ids})
+    known_buildings = set(
+        await session.scalars(
+            select(Building.id).where(
+                Building.id == any_(literal(building_ids, ARRAY(UUID)))
+            )
+        )
     )
-    return result.scalar_one_or_none()
+    known_activities = set()
+    if activity_ids:
+        known_activities = set(
+            await session.scalars(
+                select(Activity.id).where(
+                    Activity.id == any_(literal(activity_ids, ARRAY(UUID)))
+                )
+            )
+        )
 
+    now = datetime.now()
+    org_rows, phone_rows, activity_rows, results = [], [], [], []
+    for index, org_in in enumerate(organizations):
+        if org_in.building_id not in known_buildings:
+            results.append(
+                OrganizationBulkItemResult(index=index, error="Building not found")
+            )
+            continue
+        missing = [a for a in org_in.activity_ids if a not in known_activities]
+        if missing:
+            results.append(
+                OrganizationBulkItemResult(
+                    index=index, error=f"Activity not found: {missing[0]}"
+                )
+            )
+            continue
 
-# Получить все организации
-async def get_organizations(session: AsyncSession) -> list[Organization]:
-    result = await session.execute(
-        select(Organization).options(
-            selectinload(Organization.building),
-            selectinload(Organization.activities),
-            selectinload(Organization.phones),
+        org_id = uuid.uuid4()
+        org_rows.append(
+            {
+                "id": org_id,
+                "name": org_in.name,
+                "building_id": org_in.building_id,
+                "created_at": now,
+                "modified_at": now,
+            }
+        )
+        phone_rows.extend(
+            {
+                "id": uuid.uuid4(),
+                "phone": p.phone,
+                "organization_id": org_id,
+                "created_at": now,
+                "modified_at": now,
+            }
+            for p in org_in.phone_numbers
+        )
+        activity_rows.extend(
+            {"organization_id": org_id, "activity_id": activity_id}
+            for activity_id in dict.fromkeys(org_in.activity_ids)
+        )
+        results.append(OrganizationBulkItemResult(index=index, id=org_id))
+
+    await insert_rows(session, Organization.__table__, org_rows)
+    await insert_rows(session, OrganizationPhone.__table__, phone_rows)
+    await insert_rows(session, organization_activities, activity_rows)
+    if activity_rows:
+        await activities_crud.count_new_organizations(
+            session, list({row["organization_id"] for row in activity_rows})
         )
+    await session.commit()
+    return results
+
+
+# Keyset-пагинация по первичному ключу: страница стоит одинаково на любой глубине
+def paginate_by_id(query: Select, limit: int, after: uuid.UUID | None) -> Select:
+    if after is not None:
+        query = query.where(Organization.id > after)
+    return query.order_by(Organization.id).limit(limit)
+
+
+# --- Быстрый путь чтения ---
+# JSON ответа OrganizationRead собирается в Postgres (json_object/json_array)
+# байт в байт так, как его закодировал бы JSONResponse, и отдаётся текстом
+# как есть: без ORM-объектов, identity map и pydantic-валидации.
+# В запрос попадают только поля и связи, выбранные через fields=/include=:
+# без связи не выполняется ни соединение, ни подзапрос для неё
+
+
+# JSON организации из выбранных полей и связей, `extra` - поля сверх схемы
+def organization_json(
+    selection: FieldSelection, **extra: ColumnElement
+) -> ColumnElement[str]:
+    fields = {name: ORGANIZATION_COLUMNS[name] for name in selection.fields()}
+    if selection.includes("building"):
+        fields["building"] = buildings_crud.building_json(selection.fields("building"))
+    if selection.includes("phones"):
+        phone = json_object(
+            **{name: PHONE_COLUMNS[name] for name in selection.fields("phones")}
+        )
+        fields["phones"] = json_array(
+            select(json_agg(phone)).where(
+                OrganizationPhone.organization_id == Organization.id
+            )
+        )
+    if selection.includes("activities"):
+        activity = activities_crud.activity_json(selection.fields("activities"))
+        fields["activities"] = json_array(
+            select(json_agg(activity))
+            .join(
+                organization_activities,
+                organization_activities.c.activity_id == Activity.id,
+            )
+            .where(organization_activities.c.organization_id == Organization.id)
+        )
+    return cast(json_object(**fields, **extra), Text)
+
+
+# Выборка (id, *columns, data). Здание присоединяется, только если оно
+# нужно в ответе или условию запроса (`join_building`)
+def organizations_json_query(
+    selection: FieldSelection,
+    *columns: ColumnElement,
+    join_building: bool = False,
+    **extra: ColumnElement,
+) -> Select:
+    query = select(
+        Organization.id, *columns, organization_json(selection, **extra).label("data")
     )
-    return list(result.scalars().all())
+    if join_building or selection.includes("building"):
+        query = query.join(Building, Building.id == Organization.building_id)
+    return query
 
 
-# Получить организации по различным критериям
-async def get_organizations_by_building(
-    session: AsyncSession, building_id: uuid.UUID
-) -> list[Organization]:
+# Получить JSON организации по id
+async def get_organization_json(
+    session: AsyncSession, organization_id: uuid.UUID, selection: FieldSelection
+) -> str | None:
     result = await session.execute(
-        select(Organization).where(Organization.building_id == building_id)
+        organizations_json_query(selection).where(Organization.id == organization_id)
     )
-    return list(result.scalars().all())
+    row = result.first()
+    return row.data if row else None
 
 
-# Получить организации по зданиям
-async def get_organizations_by_buildings(
-    session: AsyncSession, buildings: list[uuid.UUID]
-) -> list[Organization]:
+# Получить JSON организаций по списку id одним запросом: {id: data}
+async def get_organizations_json_by_ids(
+    session: AsyncSession,
+    organization_ids: list[uuid.UUID],
+    selection: FieldSelection,
+) -> dict[uuid.UUID, str]:
     result = await session.execute(
-        select(Organization).where(Organization.building_id.in_(buildings))
+        organizations_json_query(selection).where(
+            Organization.id == any_(literal(organization_ids, ARRAY(UUID)))
+        )
     )
-    return list(result.scalars().all())
+    return {row.id: row.data for row in result}
 
 
-# Получить организации по активности
-async def get_organizations_by_activity(
-    session: AsyncSession, activity_id: uuid.UUID
-) -> list[Organization]:
-    result = await session.execute(
-        select(Organization)
-        .join(Organization.activities)
-        .where(Activity.id == activity_id)
+# Получить страницу организаций в виде строк (id, data), с поиском по имени
+async def get_organizations_json(
+    session: AsyncSession,
+    limit: int,
+    selection: FieldSelection,
+    after: uuid.UUID | None = None,
+    name_substring: str | None = None,
+) -> list:
+    query = organizations_json_query(selection)
+    if name_substring:
+        query = query.where(Organization.name.ilike(f"%{name_substring}%"))
+    result = await session.execute(paginate_by_id(query, limit, after))
+    return list(result.all())
+
+
+# Потоковое чтение JSON всех организаций пачками по `batch_size` через серверный курсор
+async def stream_organizations_json(
+    session: AsyncSession,
+    batch_size: int,
+    selection: FieldSelection,
+    name_substring: str | None = None,
+    after: uuid.UUID | None = None,
+) -> AsyncIterator[list[str]]:
+    query = organizations_json_query(selection)
+    if name_substring:
+        query = query.filter(Organization.name.ilike(f"%{name_substring}%"))
+    if after is not None:
+        query = query.where(Organization.id > after)
+    query = query.order_by(Organization.id).execution_options(yield_per=batch_size)
+
+    result = await session.stream(query)
+    async for partition in result.partitions():
+        yield [row.data for row in partition]
+
+
+# Получить страницу организаций здания в виде строк (id, data)
+async def get_organizations_by_building_json(
+    session: AsyncSession,
+    building_id: uuid.UUID,
+    limit: int,
+    selection: FieldSelection,
+    after: uuid.UUID | None = None,
+) -> list:
+    query = organizations_json_query(selection).where(
+        Organization.building_id == building_id
     )
-    return list(result.scalars().all())
+    result = await session.execute(paginate_by_id(query, limit, after))
+    return list(result.all())
 
 
-# Поиск организаций по имени
-async def search_organizations_by_name(
-    session: AsyncSession, name_substring: str
-) -> list[Organization]:
-    result = await session.execute(
-        select(Organization).filter(Organization.name.ilike(f"%{name_substring}%"))
+# Получить организации в радиусе от точки в виде строк (id, distance_km, data),
+# расстояние в км входит и в JSON записи. Сортировка по расстоянию
+async def get_organizations_by_radius_json(
+    session: AsyncSession,
+    latitude: float,
+    longitude: float,
+    radius_km: float,
+    limit: int,
+    selection: FieldSelection,
+    after: tuple[float, uuid.UUID] | None = None,
+) -> list:
+    return await search_organizations_json(
+        session,
+        limit,
+        selection,
+        latitude=latitude,
+        longitude=longitude,
+        radius_km=radius_km,
+        after=after,
     )
-    return list(result.scalars().all())
 
 
-# Получить организации по активности с дочерними элементами
-async def get_organizations_by_activity_with_children(
+# Получить организации в зданиях внутри прямоугольника в виде строк (id, data)
+async def get_organizations_by_rectangle_json(
     session: AsyncSession,
-    root_activity_id: uuid.UUID,
-) -> list[Organization]:
-    # Алиасы для таблицы activity
-    activity_alias = aliased(Activity)
-    activity_cte = (
-        select(
-            Activity.id,
-            Activity.parent_id,
-            Activity.name,
-            literal_column("1").label("level"),
+    box: BoundingBox,
+    limit: int,
+    selection: FieldSelection,
+    after: uuid.UUID | None = None,
+) -> list:
+    building_ids = await buildings_crud.get_buildings_by_coordinates(session, box)
+    if not building_ids:
+        return []
+    query = organizations_json_query(selection).where(
+        Organization.building_id == any_(literal(building_ids, ARRAY(UUID)))
+    )
+    result = await session.execute(paginate_by_id(query, limit, after))
+    return list(result.all())
+
+
+# Получить организации по активности в виде строк (id, data)
+async def get_organizations_by_activity_json(
+    session: AsyncSession,
+    activity_id: uuid.UUID,
+    limit: int,
+    selection: FieldSelection,
+    after: uuid.UUID | None = None,
+) -> list:
+    with_activity = select(organization_activities.c.organization_id).where(
+        organization_activities.c.activity_id == activity_id
+    )
+    query = organizations_json_query(selection).where(
+        Organization.id.in_(with_activity)
+    )
+    result = await session.execute(paginate_by_id(query, limit, after))
+    return list(result.all())
+
+
+# id организаций с деятельностью из поддерева `root_activity_id` (включая
+# сам корень) - одна выборка по таблице замыкания
+def subtree_organization_ids(root_activity_id: uuid.UUID) -> Select:
+    return (
+        select(organization_activities.c.organization_id)
+        .join(
+            activity_closure,
+            activity_closure.c.descendant_id == organization_activities.c.activity_id,
         )
-        .where(Activity.id == root_activity_id)
-        .cte(name="activity_cte", recursive=True)
+        .where(activity_closure.c.ancestor_id == root_activity_id)
+    )
+
+
+# Получить организации по активности с дочерними элементами в виде строк (id, data)
+async def get_organizations_by_activity_with_children_json(
+    session: AsyncSession,
+    root_activity_id: uuid.UUID,
+    limit: int,
+    selection: FieldSelection,
+    after: uuid.UUID | None = None,
+) -> list:
+    query = organizations_json_query(selection).where(
+        Organization.id.in_(subtree_organization_ids(root_activity_id))
     )
+    result = await session.execute(paginate_by_id(query, limit, after))
+    return list(result.all())
 
-    activity_alias = aliased(Activity, name="a")
 
-    # Рекурсивный запрос для получения всех дочерних активностей
-    activity_cte = activity_cte.union_all(
+# Кластеры организаций в прямоугольнике: здания группируются по ячейкам
+# сетки тайлов уровня `zoom`, для ячейки считаются организации, здания
+# и центр (средние координаты зданий с весом по числу организаций).
+# Ячейка уровня - старшие разряды cell_key здания, поэтому группировка
+# идёт по целому числу без пересчёта координат.
+# Строки (cell, organizations, buildings, latitude, longitude) по cell
+async def get_organization_clusters(
+    session: AsyncSession,
+    box: BoundingBox,
+    zoom: int,
+    activity_id: uuid.UUID | None = None,
+) -> list:
+    # Сначала организации по зданиям, затем здания по ячейкам
+    per_building = (
         select(
-            activity_alias.id,
-            activity_alias.parent_id,
-            activity_alias.name,
-            (activity_cte.c.level + 1).label("level"),
-        ).where(
-            (activity_alias.parent_id == activity_cte.c.id) & (activity_cte.c.level < 3)
+            Building.cell_key.op(">>")(
+                literal(2 * (CELL_KEY_ZOOM - zoom), Integer)
+            ).label("cell"),
+            Building.latitude,
+            Building.longitude,
+            func.count().label("organizations"),
         )
+        .join(Organization, Organization.building_id == Building.id)
+        .where(buildings_crud.in_bounding_box(box))
+        .group_by(Building.id)
     )
+    if activity_id is not None:
+        per_building = per_building.where(
+            Organization.id.in_(subtree_organization_ids(activity_id))
+        )
+    per_building = per_building.subquery("per_building")
 
-    # Запрос организаций, которые связаны с активностями из CTE
+    organizations = func.sum(per_building.c.organizations)
+    weight = cast(organizations, Float)
     query = (
-        select(Organization)
-        .join(Organization.activities)
-        .where(Activity.id.in_(select(activity_cte.c.id)))
-        .distinct()
+        select(
+            per_building.c.cell,
+            organizations.label("organizations"),
+            func.count().label("buildings"),
+            (
+                func.sum(per_building.c.latitude * per_building.c.organizations)
+                / weight
+            ).label("latitude"),
+            (
+                func.sum(per_building.c.longitude * per_building.c.organizations)
+                / weight
+            ).label("longitude"),
+        )
+        .group_by(per_building.c.cell)
+        .order_by(per_building.c.cell)
+    )
+    result = await session.execute(query)
+    return list(result.all())
+
+
+# Нечёткий поиск по названию через pg_trgm в виде строк (id, distance, data).
+# Устойчив к опечаткам и регистру, результаты ранжируются по похожести:
+# расстояние `<<->` - это 1 - word_similarity. GiST-индекс по триграммам
+# (gist_trgm_ops) отдаёт строки сразу в порядке расстояния (KNN), и страница
+# читается без сортировки всех похожих названий
+async def search_organizations_by_name_fuzzy_json(
+    session: AsyncSession,
+    name: str,
+    limit: int,
+    selection: FieldSelection,
+    after: tuple[float, uuid.UUID] | None = None,
+) -> list:
+    # Порог действует только в пределах текущей транзакции
+    await session.execute(
+        select(
+            func.set_config(
+                "pg_trgm.word_similarity_threshold",
+                str(settings.service.SEARCH_SIMILARITY_THRESHOLD),
+                True,
+            )
+        )
+    )
+    distance = literal(name).op("<<->", return_type=Float)(Organization.name)
+    # Оператор `<%` (а не сама функция) позволяет использовать индекс
+    query = organizations_json_query(selection, distance.label("distance")).where(
+        literal(name).op("<%")(Organization.name)
     )
+    if after is not None:
+        last_distance, last_id = after
+        query = query.where(
+            (distance > last_distance)
+            | ((distance == last_distance) & (Organization.id > last_id))
+        )
+    query = query.order_by(distance, Organization.id).limit(limit)
+
+    result = await session.execute(query)
+    return list(result.all())
 
+
+# Поиск организаций по сочетанию условий одним запросом в виде строк
+# (id, data), с радиусом - (id, distance_km, data) с сортировкой по расстоянию.
+# Каждое условие - отдельный предикат с собственным индексом: подстрока
+# названия - триграммный, поддерево деятельности - замыкание и связи,
+# здание - building_id. Порядок соединений выбирает планировщик по
+# статистике, поэтому выборку ведёт самое избирательное условие, а не
+# порядок параметров. Здания-кандидаты радиуса и прямоугольника берутся
+# из пространственного индекса и приходят в запрос массивом id (его размер
+# планировщику известен); без индекса - условие по координатам зданий:
+# грубый отбор по прямоугольнику, для радиуса затем формула гаверсинусов
+async def search_organizations_json(
+    session: AsyncSession,
+    limit: int,
+    selection: FieldSelection,
+    name: str | None = None,
+    activity_id: uuid.UUID | None = None,
+    building_id: uuid.UUID | None = None,
+    box: BoundingBox | None = None,
+    latitude: float | None = None,
+    longitude: float | None = None,
+    radius_km: float | None = None,
+    after: uuid.UUID | tuple[float, uuid.UUID] | None = None,
+) -> list:
+    conditions = []
+    distance = nearby_table = None
+    spatial_index = settings.service.SPATIAL_INDEX_ENABLED
+    if radius_km is not None:
+        if spatial_index:
+            nearby = await buildings_crud.get_buildings_by_radius(
+                latitude, longitude, radius_km
+            )
+            if not nearby:
+                return []
+            building_ids, distances = zip(*nearby)
+            nearby_table = (
+                func.unnest(
+                    literal(list(building_ids), ARRAY(UUID)),
+                    literal(list(distances), ARRAY(Float)),
+                )
+                .table_valued(
+                    column("building_id", UUID), column("distance_km", Float)
+                )
+                .render_derived(name="nearby")
+            )
+            distance = nearby_table.c.distance_km
+        else:
+            distance = buildings_crud.haversine_distance_km(latitude, longitude)
+            box = get_bounding_box_area(latitude, longitude, radius_km)
+            conditions.append(distance <= radius_km)
+    if box is not None and nearby_table is None:
+        if spatial_index:
+            building_ids = await buildings_crud.get_buildings_by_coordinates(
+                session, box
+            )
+            if not building_ids:
+                return []
+            conditions.append(
+                Organization.building_id == any_(literal(building_ids, ARRAY(UUID)))
+            )
+        else:
+            conditions.append(buildings_crud.in_bounding_box(box))
+    if building_id is not None:
+        conditions.append(Organization.building_id == building_id)
+    if activity_id is not None:
+        conditions.append(Organization.id.in_(subtree_organization_ids(activity_id)))
+    if name:
+        conditions.append(Organization.name.ilike(f"%{name}%"))
+
+    if distance is None:
+        query = organizations_json_query(
+            selection, join_building=box is not None and not spatial_index
+        ).where(*conditions)
+        result = await session.execute(paginate_by_id(query, limit, after))
+        return list(result.all())
+
+    query = organizations_json_query(
+        selection,
+        distance.label("distance_km"),
+        join_building=nearby_table is None,
+        distance_km=distance,
+    ).where(*conditions)
+    if nearby_table is not None:
+        query = query.join(
+            nearby_table, Organization.building_id == nearby_table.c.building_id
+        )
+    if after is not None:
+        query = query.where(tuple_(distance, Organization.id) > tuple_(*after))
+    query = query.order_by(distance, Organization.id).limit(limit)
     result = await session.execute(query)
-    organizations = list(result.scalars().unique().all())
-    return organizations
\ No newline at end of file
+    return list(result.all())
@@ -1,7 +1,19 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+from math import isfinite
+from typing import Any
+
+from fastapi import FastAPI, Request
+from fastapi.exception_handlers import request_validation_exception_handler
+from fastapi.exceptions import RequestValidationError
 
 from app.api.main import api_router
+from app.api.responses import FastJSONResponse
+from app.api.routes import metrics
 from app.core.config import settings
+from app.core.metrics import MetricsMiddleware
+from app.core.response_cache import listen_invalidations, response_cache
+from app.core.spatial_index import building_index
 
 DEBUG = settings.DEBUG
 
@@ -23,12 +35,59 @@ OPENAPI_URL = f"{API_PREFIX}/openapi.json" if DEBUG else None
 DOCS_URL = f"{API_PREFIX}/docs" if DEBUG else None
 REDOC_URL = f"{API_PREFIX}/redocs" if DEBUG else None
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Загружаем пространственный индекс зданий до приёма запросов
+    if settings.service.SPATIAL_INDEX_ENABLED:
+        await building_index.refresh()
+    # Сброс кэша ответов по записи из других воркеров
+    listener = None
+    if settings.cache.ENABLED:
+        listener = asyncio.create_task(
+            listen_invalidations(settings.NOTIFY_DATABASE_DSN, response_cache)
+        )
+    yield
+    if listener is not None:
+        listener.cancel()
+
+
 app = FastAPI(
     title="Directory of Organizations API",
     description=api_description,
     openapi_url=OPENAPI_URL,
     docs_url=DOCS_URL,
     redoc_url=REDOC_URL,
+    lifespan=lifespan,
+    # Ответы кодируются orjson с тем же результатом, что у json.dumps
+    default_response_class=FastJSONResponse,
 )
 
-app.include_router(api_router, prefix=settings.service.API_PREFIX)
\ No newline at end of file
+
+# json.loads принимает NaN и Infinity, но JSONResponse их не кодирует:
+# такие значения в ошибке валидации отдаются строкой, иначе вместо 422 - 500
+def _json_safe(value: Any) -> Any:
+    if isinstance(value, float) and not isfinite(value):
+        return str(value)
+    if isinstance(value, dict):
+        return {key: _json_safe(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_json_safe(item) for item in value]
+    return value
+
+
+@app.exception_handler(RequestValidationError)
+async def validation_exception_handler(request: Request, exc: RequestValidationError):
+    errors = [
+        {**error, "input": _json_safe(error["input"])} if "input" in error else error
+        for error in exc.errors()
+    ]
+    return await request_validation_exception_handler(
+        request, RequestValidationError(errors, body=exc.body)
+    )
+
+
+app.add_middleware(MetricsMiddleware)
+
+app.include_router(api_router, prefix=settings.service.API_PREFIX)
+app.include_router(metrics.router)
\ No newline at end of file
@@ -1,11 +1,22 @@
-from typing import List, Optional
+from typing import TYPE_CHECKING, List, Optional
 import uuid
-from sqlalchemy import UUID, ForeignKey, String
+from sqlalchemy import (
+    UUID,
+    ForeignKey,
+    String,
+    event,
+    inspect,
+    literal,
+    select,
+    true,
+)
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 
 from .base import BaseModel
-from .association_tables import organization_activities
-from .organization import Organization
+from .association_tables import activity_closure, organization_activities
+
+if TYPE_CHECKING:
+    from .organization import Organization
 
 
 class Activity(BaseModel):
@@ -15,23 +26,83 @@ class Activity(BaseModel):
         UUID,
         default=uuid.uuid4,
         primary_key=True,
-        index=True,
         nullable=False,
     )
 
     name: Mapped[str] = mapped_column(String, nullable=False)
-    parent_id: Mapped[Optional[uuid.UUID]] = mapped_column(UUID, ForeignKey("activity.id"), nullable=True)
+    parent_id: Mapped[Optional[uuid.UUID]] = mapped_column(
+        UUID, ForeignKey("activities.id"), nullable=True, index=True
+    )
 
     parent: Mapped[Optional["Activity"]] = relationship(
-        "Activity", remote_side=[id], back_populates="children", lazy="selectin"
+        "Activity", remote_side=[id], back_populates="children", lazy="raise"
     )
     children: Mapped[List["Activity"]] = relationship(
         "Activity",
         back_populates="parent",
         cascade="all, delete-orphan",
-        lazy="selectin",
+        lazy="raise",
     )
 
     organizations: Mapped[List["Organization"]] = relationship(
-        secondary=organization_activities, back_populates="activities", lazy="selectin"
-    )
\ No newline at end of file
+        secondary=organization_activities, back_populates="activities", lazy="raise"
+    )
+
+
+# Добавление деятельности в таблицу замыкания: пара с самой собой
+# и пары со всеми предками родителя
+@event.listens_for(Activity, "after_insert")
+def closure_after_insert(mapper, connection, target):
+    closure = activity_closure.c
+    own = select(
+        literal(target.id, UUID), literal(target.id, UUID), literal(0)
+    )
+    inherited = select(
+        closure.ancestor_id, literal(target.id, UUID), closure.depth + 1
+    ).where(closure.descendant_id == target.parent_id)
+    connection.execute(
+        activity_closure.insert().from_select(
+            ["ancestor_id", "descendant_id", "depth"], own.union_all(inherited)
+        )
+    )
+
+
+# Перенос поддерева при смене родителя: отвязываем поддерево от старых
+# предков и привязываем ко всем предкам нового родителя
+@event.listens_for(Activity, "after_update")
+def closure_after_update(mapper, connection, target):
+    if not inspect(target).attrs.parent_id.history.has_changes():
+        return
+
+    closure = activity_closure.c
+    subtree_alias = activity_closure.alias("subtree")
+    subtree = select(subtree_alias.c.descendant_id).where(
+        subtree_alias.c.ancestor_id == target.id
+    )
+    connection.execute(
+        activity_closure.delete().where(
+            closure.descendant_id.in_(subtree) & closure.ancestor_id.not_in(subtree)
+        )
+    )
+    if target.parent_id is None:
+        return
+
+    ancestors = activity_closure.alias("ancestors")
+    descendants = activity_closure.alias("descendants")
+    connection.execute(
+        activity_closure.insert().from_select(
+            ["ancestor_id", "descendant_id", "depth"],
+            select(
+                ancestors.c.ancestor_id,
+                descendants.c.descendant_id,
+                ancestors.c.depth + descendants.c.depth + 1,
+            )
+            # Каждый предок нового родителя x каждый узел переносимого поддерева
+            .select_from(ancestors)
+            .join(descendants, true())
+            .where(
+                (ancestors.c.descendant_id == target.parent_id)
+                & (descendants.c.ancestor_id == target.id)
+            ),
+        )
+    )
@@ -0,0 +1,61 @@
+"""activity_closure
+
+Revision ID: 3f1c2a7d9e41
+Revises: add_test_data
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "3f1c2a7d9e41"
+down_revision: Union[str, None] = "add_test_data"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "activity_closure",
+        sa.Column("ancestor_id", sa.UUID(), nullable=False),
+        sa.Column("descendant_id", sa.UUID(), nullable=False),
+        sa.Column("depth", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["ancestor_id"], ["activities.id"], ondelete="CASCADE"
+        ),
+        sa.ForeignKeyConstraint(
+            ["descendant_id"], ["activities.id"], ondelete="CASCADE"
+        ),
+        sa.PrimaryKeyConstraint("ancestor_id", "descendant_id"),
+    )
+    op.create_index(
+        "ix_activity_closure_descendant_id",
+        "activity_closure",
+        ["descendant_id"],
+        unique=False,
+    )
+
+    # Заполняем замыкание по существующей иерархии
+    op.execute(
+        """
+        INSERT INTO activity_closure (ancestor_id, descendant_id, depth)
+        WITH RECURSIVE tree AS (
+            SELECT id AS ancestor_id, id AS descendant_id, 0 AS depth
+            FROM activities
+            UNION ALL
+            SELECT tree.ancestor_id, a.id, tree.depth + 1
+            FROM activities a
+            JOIN tree ON a.parent_id = tree.descendant_id
+        )
+        SELECT ancestor_id, descendant_id, depth FROM tree
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_activity_closure_descendant_id", table_name="activity_closure")
+    op.drop_table("activity_closure")
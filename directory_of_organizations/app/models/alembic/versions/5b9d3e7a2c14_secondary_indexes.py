@@ -0,0 +1,76 @@
+"""secondary_indexes
+
+Revision ID: 5b9d3e7a2c14
+Revises: e1b7c4d92a58
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "5b9d3e7a2c14"
+down_revision: Union[str, None] = "e1b7c4d92a58"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Индексы по id дублируют первичные ключи
+REDUNDANT_ID_INDEXES = [
+    ("ix_activities_id", "activities"),
+    ("ix_buildings_id", "buildings"),
+    ("ix_organizations_id", "organizations"),
+    ("ix_organization_phones_id", "organization_phones"),
+]
+
+
+def upgrade() -> None:
+    for index_name, table_name in REDUNDANT_ID_INDEXES:
+        op.drop_index(op.f(index_name), table_name=table_name)
+
+    # Организации здания, радиус и прямоугольник (соединение с зданиями)
+    op.create_index(
+        op.f("ix_organizations_building_id"),
+        "organizations",
+        ["building_id"],
+        unique=False,
+    )
+    # Организации по деятельности: первичный ключ начинается с organization_id
+    # и поиску по activity_id не помогает. organization_id во втором столбце
+    # даёт index-only scan
+    op.create_index(
+        "ix_organization_activities_activity_id",
+        "organization_activities",
+        ["activity_id", "organization_id"],
+        unique=False,
+    )
+    # Дочерние деятельности и проверка внешнего ключа при удалении родителя
+    op.create_index(
+        op.f("ix_activities_parent_id"), "activities", ["parent_id"], unique=False
+    )
+    # Отбор зданий по ограничивающему прямоугольнику без пространственного индекса
+    op.create_index(
+        "ix_buildings_latitude_longitude",
+        "buildings",
+        ["latitude", "longitude"],
+        unique=False,
+    )
+    # Инкрементальное обновление пространственного индекса воркера
+    op.create_index(
+        "ix_buildings_modified_at", "buildings", ["modified_at"], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_buildings_modified_at", table_name="buildings")
+    op.drop_index("ix_buildings_latitude_longitude", table_name="buildings")
+    op.drop_index(op.f("ix_activities_parent_id"), table_name="activities")
+    op.drop_index(
+        "ix_organization_activities_activity_id",
+        table_name="organization_activities",
+    )
+    op.drop_index(op.f("ix_organizations_building_id"), table_name="organizations")
+
+    for index_name, table_name in REDUNDANT_ID_INDEXES:
+        op.create_index(op.f(index_name), table_name, ["id"], unique=False)
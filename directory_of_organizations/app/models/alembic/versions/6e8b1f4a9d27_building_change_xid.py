@@ -0,0 +1,63 @@
+"""building_change_xid
+
+Revision ID: 6e8b1f4a9d27
+Revises: f2a9c4e7b1d3
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "6e8b1f4a9d27"
+down_revision: Union[str, None] = "f2a9c4e7b1d3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Существующие здания получают id транзакции миграции
+    op.add_column(
+        "buildings",
+        sa.Column(
+            "change_xid",
+            sa.BigInteger(),
+            server_default=sa.text("pg_current_xact_id()::text::bigint"),
+            nullable=False,
+        ),
+    )
+    op.create_index(
+        op.f("ix_buildings_change_xid"), "buildings", ["change_xid"], unique=False
+    )
+    # Пространственный индекс воркера больше не читает здания по modified_at
+    op.drop_index("ix_buildings_modified_at", table_name="buildings")
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION set_change_xid() RETURNS trigger AS $$
+        BEGIN
+            NEW.change_xid := pg_current_xact_id()::text::bigint;
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER buildings_change_xid
+        BEFORE INSERT OR UPDATE ON buildings
+        FOR EACH ROW EXECUTE FUNCTION set_change_xid()
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER buildings_change_xid ON buildings")
+    op.execute("DROP FUNCTION set_change_xid()")
+    op.create_index(
+        "ix_buildings_modified_at", "buildings", ["modified_at"], unique=False
+    )
+    op.drop_index(op.f("ix_buildings_change_xid"), table_name="buildings")
+    op.drop_column("buildings", "change_xid")
@@ -0,0 +1,34 @@
+"""organization_name_trgm
+
+Revision ID: 8a4e6b1f0c2d
+Revises: 3f1c2a7d9e41
+Create Date: 2026-10-18 12:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "8a4e6b1f0c2d"
+down_revision: Union[str, None] = "3f1c2a7d9e41"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Триграммный индекс обслуживает и ILIKE '%...%', и нечёткий поиск (<%)
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.create_index(
+        "ix_organizations_name_trgm",
+        "organizations",
+        ["name"],
+        unique=False,
+        postgresql_using="gin",
+        postgresql_ops={"name": "gin_trgm_ops"},
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_organizations_name_trgm", table_name="organizations")
@@ -0,0 +1,85 @@
+"""building_cell_key
+
+Revision ID: 9c3f5a1d7e62
+Revises: 5b9d3e7a2c14
+Create Date: 2026-10-18 19:00:00.000000
+
+"""
+from math import asinh, pi, radians, tan
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "9c3f5a1d7e62"
+down_revision: Union[str, None] = "5b9d3e7a2c14"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Зданий в одном UPDATE при заполнении ключа
+BATCH_SIZE = 10000
+
+# Копия app.utils.cell_key на момент миграции: миграция не должна
+# меняться вместе с кодом приложения
+CELL_KEY_ZOOM = 24
+MERCATOR_MAX_LAT = 85.05112878
+
+
+def tile_xy(latitude: float, longitude: float, zoom: int) -> tuple[int, int]:
+    n = 1 << zoom
+    latitude = max(-MERCATOR_MAX_LAT, min(MERCATOR_MAX_LAT, latitude))
+    x = int((longitude + 180.0) / 360.0 * n)
+    y = int((1.0 - asinh(tan(radians(latitude))) / pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def _spread_bits(value: int) -> int:
+    value = (value | (value << 16)) & 0x0000FFFF0000FFFF
+    value = (value | (value << 8)) & 0x00FF00FF00FF00FF
+    value = (value | (value << 4)) & 0x0F0F0F0F0F0F0F0F
+    value = (value | (value << 2)) & 0x3333333333333333
+    return (value | (value << 1)) & 0x5555555555555555
+
+
+def cell_key(latitude: float, longitude: float) -> int:
+    x, y = tile_xy(latitude, longitude, CELL_KEY_ZOOM)
+    return _spread_bits(x) | (_spread_bits(y) << 1)
+
+
+def upgrade() -> None:
+    op.add_column("buildings", sa.Column("cell_key", sa.BigInteger(), nullable=True))
+
+    conn = op.get_bind()
+    update = sa.text(
+        "UPDATE buildings SET cell_key = batch.cell_key"
+        " FROM unnest(:ids, :keys) AS batch(id, cell_key)"
+        " WHERE buildings.id = batch.id"
+    ).bindparams(
+        sa.bindparam("ids", type_=postgresql.ARRAY(sa.UUID())),
+        sa.bindparam("keys", type_=postgresql.ARRAY(sa.BigInteger())),
+    )
+    rows = conn.execute(
+        sa.text("SELECT id, latitude, longitude FROM buildings")
+    ).all()
+    for start in range(0, len(rows), BATCH_SIZE):
+        batch = rows[start : start + BATCH_SIZE]
+        conn.execute(
+            update,
+            {
+                "ids": [row.id for row in batch],
+                "keys": [cell_key(row.latitude, row.longitude) for row in batch],
+            },
+        )
+
+    op.alter_column("buildings", "cell_key", nullable=False)
+    op.create_index(
+        op.f("ix_buildings_cell_key"), "buildings", ["cell_key"], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_buildings_cell_key"), table_name="buildings")
+    op.drop_column("buildings", "cell_key")
@@ -0,0 +1,50 @@
+"""activity_cell_counts
+
+Revision ID: a7c3e9f1b5d8
+Revises: 6e8b1f4a9d27
+Create Date: 2026-10-18 23:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "a7c3e9f1b5d8"
+down_revision: Union[str, None] = "6e8b1f4a9d27"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Значения app.utils на момент миграции
+CELL_KEY_ZOOM = 24
+COUNT_CELL_ZOOM = 16
+
+
+def upgrade() -> None:
+    op.create_table(
+        "activity_cell_counts",
+        sa.Column("zoom", sa.SmallInteger(), nullable=False),
+        sa.Column("cell", sa.BigInteger(), nullable=False),
+        sa.Column("activity_id", sa.UUID(), nullable=False),
+        sa.Column("organizations", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("zoom", "cell", "activity_id"),
+    )
+
+    # Заполняем счётчики ячеек из счётчиков по зданиям
+    op.execute(
+        f"""
+        INSERT INTO activity_cell_counts (zoom, cell, activity_id, organizations)
+        SELECT z.zoom, b.cell_key >> (2 * ({CELL_KEY_ZOOM} - z.zoom)),
+               c.activity_id, sum(c.organizations)
+        FROM activity_building_counts c
+        JOIN buildings b ON b.id = c.building_id
+        CROSS JOIN generate_series(0, {COUNT_CELL_ZOOM}) AS z(zoom)
+        GROUP BY 1, 2, 3
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("activity_cell_counts")
@@ -12,7 +12,7 @@ import uuid
 
 # revision identifiers, used by Alembic.
 revision = "add_test_data"
-down_revision = "c09a34aa13e6"
+down_revision = "87b8e34c378b"
 branch_labels = None
 depends_on = None
 
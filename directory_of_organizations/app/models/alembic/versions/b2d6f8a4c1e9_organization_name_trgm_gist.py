@@ -0,0 +1,43 @@
+"""organization_name_trgm_gist
+
+Revision ID: b2d6f8a4c1e9
+Revises: a7c3e9f1b5d8
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b2d6f8a4c1e9"
+down_revision: Union[str, None] = "a7c3e9f1b5d8"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # GiST-индекс обслуживает ILIKE '%...%', `<%` и упорядочивание по
+    # расстоянию `<<->` (KNN) для нечёткого поиска; GIN упорядочивать не умеет
+    op.drop_index("ix_organizations_name_trgm", table_name="organizations")
+    op.create_index(
+        "ix_organizations_name_trgm",
+        "organizations",
+        ["name"],
+        unique=False,
+        postgresql_using="gist",
+        postgresql_ops={"name": "gist_trgm_ops"},
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_organizations_name_trgm", table_name="organizations")
+    op.create_index(
+        "ix_organizations_name_trgm",
+        "organizations",
+        ["name"],
+        unique=False,
+        postgresql_using="gin",
+        postgresql_ops={"name": "gin_trgm_ops"},
+    )
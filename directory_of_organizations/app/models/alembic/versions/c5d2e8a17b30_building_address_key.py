@@ -0,0 +1,86 @@
+"""building_address_key
+
+Revision ID: c5d2e8a17b30
+Revises: 8a4e6b1f0c2d
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+import re
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c5d2e8a17b30"
+down_revision: Union[str, None] = "8a4e6b1f0c2d"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Зданий в одном UPDATE при заполнении ключа
+BATCH_SIZE = 10000
+
+
+# Копия app.utils.normalize_address на момент миграции: миграция не должна
+# меняться вместе с кодом приложения
+def normalize_address(address: str) -> str:
+    return re.sub(r"[\W_]+", " ", address.casefold().replace("ё", "е")).strip()
+
+
+def upgrade() -> None:
+    op.add_column("buildings", sa.Column("address_key", sa.String(), nullable=True))
+
+    conn = op.get_bind()
+    update = sa.text(
+        "UPDATE buildings SET address_key = batch.address_key"
+        " FROM unnest(:ids, :keys) AS batch(id, address_key)"
+        " WHERE buildings.id = batch.id"
+    ).bindparams(
+        sa.bindparam("ids", type_=postgresql.ARRAY(sa.UUID())),
+        sa.bindparam("keys", type_=postgresql.ARRAY(sa.String())),
+    )
+    rows = conn.execute(sa.text("SELECT id, address FROM buildings")).all()
+    for start in range(0, len(rows), BATCH_SIZE):
+        batch = rows[start : start + BATCH_SIZE]
+        conn.execute(
+            update,
+            {
+                "ids": [row.id for row in batch],
+                "keys": [normalize_address(row.address) for row in batch],
+            },
+        )
+
+    # Из дублей остаётся самое старое здание, организации остальных
+    # переносятся на него - одним запросом для всех дублей
+    op.execute(
+        """
+        WITH duplicates AS (
+            SELECT id, kept_id
+            FROM (
+                SELECT id, first_value(id) OVER (
+                    PARTITION BY address_key ORDER BY created_at, id
+                ) AS kept_id
+                FROM buildings
+            ) ranked
+            WHERE id <> kept_id
+        ), moved AS (
+            UPDATE organizations SET building_id = duplicates.kept_id
+            FROM duplicates
+            WHERE organizations.building_id = duplicates.id
+        )
+        DELETE FROM buildings USING duplicates WHERE buildings.id = duplicates.id
+        """
+    )
+
+    op.alter_column("buildings", "address_key", nullable=False)
+    op.create_index(
+        op.f("ix_buildings_address_key"), "buildings", ["address_key"], unique=True
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_buildings_address_key"), table_name="buildings")
+    op.drop_column("buildings", "address_key")
@@ -0,0 +1,62 @@
+"""activity_counts
+
+Revision ID: d4a8b2c6e913
+Revises: 9c3f5a1d7e62
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "d4a8b2c6e913"
+down_revision: Union[str, None] = "9c3f5a1d7e62"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "activity_counts",
+        sa.Column("activity_id", sa.UUID(), nullable=False),
+        sa.Column("organizations", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["activity_id"], ["activities.id"], ondelete="CASCADE"
+        ),
+        sa.PrimaryKeyConstraint("activity_id"),
+    )
+    op.create_table(
+        "activity_building_counts",
+        sa.Column("building_id", sa.UUID(), nullable=False),
+        sa.Column("activity_id", sa.UUID(), nullable=False),
+        sa.Column("organizations", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("building_id", "activity_id"),
+    )
+
+    # Заполняем счётчики по существующим организациям
+    op.execute(
+        """
+        INSERT INTO activity_building_counts (activity_id, building_id, organizations)
+        SELECT c.ancestor_id, o.building_id, count(DISTINCT o.id)
+        FROM activity_closure c
+        JOIN organization_activities oa ON oa.activity_id = c.descendant_id
+        JOIN organizations o ON o.id = oa.organization_id
+        GROUP BY c.ancestor_id, o.building_id
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO activity_counts (activity_id, organizations)
+        SELECT activity_id, sum(organizations)
+        FROM activity_building_counts
+        GROUP BY activity_id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("activity_building_counts")
+    op.drop_table("activity_counts")
@@ -0,0 +1,34 @@
+"""organization_phones_organization_id
+
+Revision ID: e1b7c4d92a58
+Revises: c5d2e8a17b30
+Create Date: 2026-10-18 13:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e1b7c4d92a58"
+down_revision: Union[str, None] = "c5d2e8a17b30"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Телефоны организации агрегируются коррелированным подзапросом по этому полю
+    op.create_index(
+        op.f("ix_organization_phones_organization_id"),
+        "organization_phones",
+        ["organization_id"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        op.f("ix_organization_phones_organization_id"),
+        table_name="organization_phones",
+    )
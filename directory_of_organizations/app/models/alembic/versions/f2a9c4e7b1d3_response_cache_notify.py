@@ -0,0 +1,57 @@
+"""response_cache_notify
+
+Revision ID: f2a9c4e7b1d3
+Revises: d4a8b2c6e913
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "f2a9c4e7b1d3"
+down_revision: Union[str, None] = "d4a8b2c6e913"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Таблица -> тег кэша ответов, который сбрасывает запись в неё
+CACHE_TAGS = {
+    "organizations": "organization",
+    "organization_phones": "organization",
+    "organization_activities": "organization",
+    "buildings": "building",
+    "activities": "activity",
+    "activity_closure": "activity",
+}
+
+
+def upgrade() -> None:
+    # Запись в таблицу уведомляет воркеры, чтобы они сбросили кэш ответов.
+    # Триггер на оператор: NOTIFY с одинаковым тегом в транзакции
+    # доставляется один раз, после коммита
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION response_cache_notify() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('response_cache', TG_ARGV[0]);
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        """
+    )
+    for table, tag in CACHE_TAGS.items():
+        op.execute(
+            f"""
+            CREATE TRIGGER {table}_response_cache
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table}
+            FOR EACH STATEMENT EXECUTE FUNCTION response_cache_notify('{tag}')
+            """
+        )
+
+
+def downgrade() -> None:
+    for table in CACHE_TAGS:
+        op.execute(f"DROP TRIGGER {table}_response_cache ON {table}")
+    op.execute("DROP FUNCTION response_cache_notify()")
@@ -1,4 +1,13 @@
-from sqlalchemy import Column, ForeignKey, Table
+from sqlalchemy import (
+    UUID,
+    BigInteger,
+    Column,
+    ForeignKey,
+    Index,
+    Integer,
+    SmallInteger,
+    Table,
+)
 
 from app.models.base import Base
 
@@ -9,4 +18,67 @@ organization_activities = Table(
     Base.metadata,
     Column("organization_id", ForeignKey("organizations.id"), primary_key=True),
     Column("activity_id", ForeignKey("activities.id"), primary_key=True),
-)
\ No newline at end of file
+    # Обратный порядок первичного ключа: организации по деятельности
+    Index(
+        "ix_organization_activities_activity_id", "activity_id", "organization_id"
+    ),
+)
+
+
+# --- таблица замыкания иерархии Activity: все пары предок-потомок ---
+# Каждая деятельность является предком самой себя с глубиной 0
+activity_closure = Table(
+    "activity_closure",
+    Base.metadata,
+    Column(
+        "ancestor_id",
+        ForeignKey("activities.id", ondelete="CASCADE"),
+        primary_key=True,
+    ),
+    Column(
+        "descendant_id",
+        ForeignKey("activities.id", ondelete="CASCADE"),
+        primary_key=True,
+    ),
+    Column("depth", Integer, nullable=False),
+    Index("ix_activity_closure_descendant_id", "descendant_id"),
+)
+
+
+# --- счётчики организаций по деятельности с учётом потомков ---
+# Организация считается у каждого предка своих деятельностей один раз.
+# Обновляются при создании организаций и пересчитываются при переносе
+# поддерева (app.crud.activity)
+activity_counts = Table(
+    "activity_counts",
+    Base.metadata,
+    Column(
+        "activity_id",
+        ForeignKey("activities.id", ondelete="CASCADE"),
+        primary_key=True,
+    ),
+    Column("organizations", Integer, nullable=False),
+)
+
+# Те же счётчики в разрезе зданий: фасеты здания и прямоугольника на карте.
+# Строк здесь порядка числа организаций, и проверка внешних ключей на каждой
+# обходилась бы дороже самого пересчёта, поэтому ключей нет
+activity_building_counts = Table(
+    "activity_building_counts",
+    Base.metadata,
+    Column("building_id", UUID, primary_key=True),
+    Column("activity_id", UUID, primary_key=True),
+    Column("organizations", Integer, nullable=False),
+)
+
+# Те же счётчики по ячейкам сетки тайлов каждого уровня до COUNT_CELL_ZOOM
+# (app.utils): фасеты прямоугольника суммируются по ячейкам его покрытия,
+# а не по всем зданиям внутри. Нулевые строки остаются после переноса зданий
+activity_cell_counts = Table(
+    "activity_cell_counts",
+    Base.metadata,
+    Column("zoom", SmallInteger, primary_key=True),
+    Column("cell", BigInteger, primary_key=True),
+    Column("activity_id", UUID, primary_key=True),
+    Column("organizations", Integer, nullable=False),
+)
@@ -14,7 +14,6 @@ class BaseModel(Base):
         UUID,
         default=uuid.uuid4,
         primary_key=True,
-        index=True,
         nullable=False,
     )
     created_at: Mapped[datetime] = mapped_column(
@@ -35,4 +34,45 @@ def timestamp_before_insert(mapper, connection, target):
 # Автоматическая установка временных меток перед обновлением
 @event.listens_for(BaseModel, "before_update", propagate=True)
 def timestamp_before_update(mapper, connection, target):
-    target.modified_at = datetime.now()
\ No newline at end of file
+    target.modified_at = datetime.now()
+
+
+# --- уведомления о записи для кэша ответов ---
+# Канал NOTIFY, в который триггеры пишут тег изменённой сущности: кэш ответов
+# каждого воркера слушает его и сбрасывает ответы с этим тегом
+# (app.core.response_cache.listen_invalidations)
+CACHE_CHANNEL = "response_cache"
+
+# Таблица -> тег кэша ответов, который сбрасывает запись в неё
+CACHE_TAGS = {
+    "organizations": "organization",
+    "organization_phones": "organization",
+    "organization_activities": "organization",
+    "buildings": "building",
+    "activities": "activity",
+    "activity_closure": "activity",
+}
+
+
+# Функция и триггеры уведомлений создаются вместе с таблицами (create_all);
+# в базе, которую ведёт Alembic, - миграцией f2a9c4e7b1d3
+@event.listens_for(Base.metadata, "after_create")
+def create_cache_triggers(target, connection, **kw):
+    connection.exec_driver_sql(
+        f"""
+        CREATE OR REPLACE FUNCTION response_cache_notify() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('{CACHE_CHANNEL}', TG_ARGV[0]);
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        """
+    )
+    for table, tag in CACHE_TAGS.items():
+        connection.exec_driver_sql(
+            f"""
+            CREATE TRIGGER {table}_response_cache
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table}
+            FOR EACH STATEMENT EXECUTE FUNCTION response_cache_notify('{tag}')
+            """
+        )
@@ -1,17 +1,80 @@
-from typing import List
-from sqlalchemy import String, Float
-from sqlalchemy.orm import relationship, Mapped, mapped_column
+from typing import TYPE_CHECKING, List
+from sqlalchemy import DDL, BigInteger, Float, Index, String, event, text
+from sqlalchemy.orm import relationship, Mapped, mapped_column, validates
 
+from app.utils import cell_key, normalize_address
 from .base import BaseModel
-from .organization import Organization
+
+if TYPE_CHECKING:
+    from .organization import Organization
 
 class Building(BaseModel):
     __tablename__ = "buildings"
+    __table_args__ = (
+        # Отбор по ограничивающему прямоугольнику без пространственного индекса
+        Index("ix_buildings_latitude_longitude", "latitude", "longitude"),
+    )
 
     address: Mapped[str] = mapped_column(String, nullable=False)
+    # Нормализованный адрес: по нему находятся дубли при импорте
+    address_key: Mapped[str] = mapped_column(
+        String, nullable=False, unique=True, index=True
+    )
     latitude: Mapped[float] = mapped_column(Float, nullable=False)
     longitude: Mapped[float] = mapped_column(Float, nullable=False)
+    # Quadkey тайла карты с зданием (см. app.utils.cell_key): по нему
+    # здания группируются в кластеры любого уровня приближения
+    cell_key: Mapped[int] = mapped_column(BigInteger, nullable=False, index=True)
+    # id транзакции, последней записавшей здание; проставляет триггер БД.
+    # По нему пространственный индекс воркера обновляется инкрементально
+    change_xid: Mapped[int] = mapped_column(
+        BigInteger,
+        server_default=text("pg_current_xact_id()::text::bigint"),
+        nullable=False,
+        index=True,
+    )
 
     organizations: Mapped[List["Organization"]] = relationship(
-        back_populates="building", lazy="selectin"
-    )
\ No newline at end of file
+        back_populates="building", lazy="raise"
+    )
+
+    @validates("address")
+    def validate_address(self, key, address):
+        self.address_key = normalize_address(address)
+        return address
+
+
+# Ячейка карты пересчитывается при вставке и при смене координат
+@event.listens_for(Building, "before_insert")
+@event.listens_for(Building, "before_update")
+def cell_key_before_save(mapper, connection, target):
+    target.cell_key = cell_key(target.latitude, target.longitude)
+
+
+# Триггер change_xid создаётся вместе с таблицей (create_all); в базе,
+# которую ведёт Alembic, - миграцией 6e8b1f4a9d27
+event.listen(
+    Building.__table__,
+    "after_create",
+    DDL(
+        """
+        CREATE OR REPLACE FUNCTION set_change_xid() RETURNS trigger AS $$
+        BEGIN
+            NEW.change_xid := pg_current_xact_id()::text::bigint;
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+        """
+    ),
+)
+event.listen(
+    Building.__table__,
+    "after_create",
+    DDL(
+        """
+        CREATE TRIGGER buildings_change_xid
+        BEFORE INSERT OR UPDATE ON buildings
+        FOR EACH ROW EXECUTE FUNCTION set_change_xid()
+        """
+    ),
+)
@@ -14,16 +14,20 @@ class Organization(BaseModel):
     __tablename__ = "organizations"
 
     name: Mapped[str] = mapped_column(String, nullable=False)
-    building_id: Mapped[int] = mapped_column(ForeignKey("buildings.id"), nullable=False)
+    building_id: Mapped[int] = mapped_column(
+        ForeignKey("buildings.id"), nullable=False, index=True
+    )
 
+    # Связи не загружаются неявно: каждый запрос сам указывает нужный граф
+    # через options(), обращение к незагруженной связи - ошибка
     building: Mapped["Building"] = relationship(
-        back_populates="organizations", lazy="selectin"
+        back_populates="organizations", lazy="raise"
     )
     phones: Mapped[List["OrganizationPhone"]] = relationship(
-        back_populates="organization", cascade="all, delete-orphan", lazy="selectin"
+        back_populates="organization", cascade="all, delete-orphan", lazy="raise"
     )
     activities: Mapped[List["Activity"]] = relationship(
         secondary=organization_activities,
         back_populates="organizations",
-        lazy="selectin",
+        lazy="raise",
     )
\ No newline at end of file
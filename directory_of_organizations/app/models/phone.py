@@ -1,18 +1,23 @@
+from typing import TYPE_CHECKING
+
 from sqlalchemy import ForeignKey, String
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 
 from .base import BaseModel
-from .organization import Organization
+
+if TYPE_CHECKING:
+    from .organization import Organization
 
 
 class OrganizationPhone(BaseModel):
     __tablename__ = "organization_phones"
 
     phone: Mapped[str] = mapped_column(String, nullable=False)
+    # Индекс нужен агрегации телефонов организации в быстром пути чтения
     organization_id: Mapped[int] = mapped_column(
-        ForeignKey("organizations.id"), nullable=False
+        ForeignKey("organizations.id"), nullable=False, index=True
     )
 
     organization: Mapped["Organization"] = relationship(
-        back_populates="phones", lazy="selectin"
+        back_populates="phones", lazy="raise"
     )
\ No newline at end of file
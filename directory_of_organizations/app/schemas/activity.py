@@ -10,7 +10,16 @@ class ActivityCreate(ActivityBase):
     parent_id: uuid.UUID | None = None
 
 
+class ActivityMove(BaseModel):
+    # Новый родитель, None - сделать деятельность корневой
+    parent_id: uuid.UUID | None = None
+
+
 class ActivityRead(ActivityBase):
     id: uuid.UUID
 
-    model_config = {"from_attributes": True}
\ No newline at end of file
+    model_config = {"from_attributes": True}
+
+
+class ActivityTreeNode(ActivityRead):
+    children: list["ActivityTreeNode"] = []
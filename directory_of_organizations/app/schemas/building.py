@@ -4,8 +4,9 @@ from pydantic import BaseModel, Field
 
 class BuildingBase(BaseModel):
     address: str = Field(..., min_length=1, max_length=255)
-    latitude: float
-    longitude: float
+    # Границы отсекают и NaN/бесконечность: с ними сравнение всегда ложно
+    latitude: float = Field(..., ge=-90, le=90)
+    longitude: float = Field(..., ge=-180, le=180)
 
 
 class BuildingCreate(BuildingBase):
@@ -15,4 +16,9 @@ class BuildingCreate(BuildingBase):
 class BuildingRead(BuildingBase):
     id: uuid.UUID
 
-    model_config = {"from_attributes": True}
\ No newline at end of file
+    model_config = {"from_attributes": True}
+
+
+class BuildingBulkResult(BaseModel):
+    # id здания для каждой входной строки в том же порядке
+    ids: list[uuid.UUID]
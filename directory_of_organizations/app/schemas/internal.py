@@ -0,0 +1,24 @@
+from pydantic import BaseModel
+
+
+class CacheStats(BaseModel):
+    entries: int
+    size_bytes: int
+    max_bytes: int
+    hits: int
+    misses: int
+    evictions: int
+    invalidations: int
+
+
+class PoolStats(BaseModel):
+    size: int
+    checked_out: int
+    idle: int
+    overflow: int
+    max_overflow: int
+    # Запросы, ожидающие соединения прямо сейчас
+    waiting: int
+    checkouts: int
+    wait_seconds_total: float
+    wait_seconds_max: float
@@ -0,0 +1,18 @@
+import uuid
+from typing import Generic, TypeVar
+
+from pydantic import BaseModel, Field
+
+T = TypeVar("T")
+
+
+class LookupRequest(BaseModel):
+    ids: list[uuid.UUID] = Field(..., min_length=1)
+
+
+class Lookup(BaseModel, Generic[T]):
+    # Записи в порядке запрошенных id, None - запись с таким id не найдена
+    items: list[T | None]
+    # Ненайденные id без повторов
+    missing: list[uuid.UUID]
+
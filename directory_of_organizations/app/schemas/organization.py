@@ -22,4 +22,43 @@ class OrganizationRead(OrganizationBase):
     phones: list[OrganizationPhoneRead] = []
     activities: list[ActivityRead] = []
 
-    model_config = {"from_attributes": True}
\ No newline at end of file
+    model_config = {"from_attributes": True}
+
+
+class OrganizationDistanceRead(OrganizationRead):
+    # Расстояние от точки поиска до здания организации, км
+    distance_km: float
+
+
+class OrganizationBulkItemResult(BaseModel):
+    # Позиция организации во входном списке
+    index: int
+    id: uuid.UUID | None = None
+    error: str | None = None
+
+
+class OrganizationBulkResult(BaseModel):
+    created: int
+    items: list[OrganizationBulkItemResult]
+
+
+class OrganizationCluster(BaseModel):
+    # Ячейка сетки тайлов карты - quadkey уровня OrganizationClusters.zoom
+    cell: str
+    organizations: int
+    buildings: int
+    # Центр кластера: средние координаты зданий с весом по числу организаций
+    latitude: float
+    longitude: float
+
+
+class OrganizationClusters(BaseModel):
+    # Уровень сетки тайлов, по которому сгруппированы здания
+    zoom: int
+    clusters: list[OrganizationCluster]
+
+
+class ActivityFacet(BaseModel):
+    activity_id: uuid.UUID
+    # Организации с этой деятельностью или любой из дочерних
+    organizations: int
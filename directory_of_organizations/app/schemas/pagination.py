@@ -0,0 +1,10 @@
+from typing import Generic, TypeVar
+from pydantic import BaseModel
+
+T = TypeVar("T")
+
+
+class Page(BaseModel, Generic[T]):
+    items: list[T]
+    # Курсор для запроса следующей страницы, None - если страница последняя
+    next_cursor: str | None = None
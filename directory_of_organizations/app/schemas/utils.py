@@ -1,6 +1,8 @@
 from pydantic import BaseModel
 
 
+# min_lon > max_lon - прямоугольник пересекает антимеридиан
+# (см. app.utils.split_antimeridian)
 class BoundingBox(BaseModel):
     min_lat: float
     max_lat: float
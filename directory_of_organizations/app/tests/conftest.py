@@ -2,18 +2,23 @@ import asyncio
 import os
 from httpx import ASGITransport, AsyncClient
 from sqlalchemy import select, text
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import selectinload
 import pytest
 
 os.environ["CONFIG_PATH"] = "/../../config_test.yaml"
 from app.main import app
-from app.api.deps import get_async_db
+from app.api.deps import get_primary_session_factory, get_replica_session_factories
 from app.models.building import Building 
 from app.models.organization import Organization 
 from app.models.activity import Activity
 from app.models.base import BaseModel
 from app.core.config import settings
+from app.core.activity_tree import activity_tree
+from app.core.response_cache import response_cache
+from app.core.metrics import instrument_engine
+from app.core.spatial_index import building_index
 
 
 # Переопределяем зависимость get_async_db для использования тестовой базы данных
@@ -27,15 +32,23 @@ def override_get_async_db(async_db_engine):
         class_=AsyncSession,
     )
 
-    async def _get_test_session():
-        async with async_session() as session:
-            yield session
-
-    app.dependency_overrides[get_async_db] = _get_test_session
+    app.dependency_overrides[get_primary_session_factory] = lambda: async_session
+    # Пространственный индекс читает основную базу мимо зависимостей
+    session_factory = building_index.session_factory
+    building_index.session_factory = async_session
     yield
+    building_index.session_factory = session_factory
     app.dependency_overrides.clear()
 
 
+# База пересоздаётся на каждый тест - кэши воркера тоже начинаем с нуля
+@pytest.fixture(autouse=True)
+def reset_worker_caches():
+    building_index.clear()
+    activity_tree.invalidate()
+    response_cache.clear()
+
+
 # Создаём и удаляем тестовую базу данных перед/после каждого теста
 @pytest.fixture(scope="function")
 async def async_db_engine():
@@ -43,6 +56,8 @@ async def async_db_engine():
         url=str(settings.MAIN_DATABASE_URI),
         echo=True,
     )
+    # Запросы тестовой базы учитываются в метриках, как у движка приложения
+    instrument_engine(async_engine)
 
     async with async_engine.begin() as conn:
         await conn.run_sync(BaseModel.metadata.create_all)
@@ -53,6 +68,54 @@ async def async_db_engine():
         await conn.run_sync(BaseModel.metadata.drop_all)
 
 
+# Вторая база в роли реплики: GET-запросы API читают из неё.
+# Без прав на CREATE DATABASE тест пропускается
+@pytest.fixture
+async def replica_session_factory(async_db_engine):
+    replica_db = f"{settings.database.DB}_replica"
+    admin_engine = create_async_engine(
+        str(settings.MAIN_DATABASE_URI), isolation_level="AUTOCOMMIT"
+    )
+    try:
+        async with admin_engine.connect() as conn:
+            exists = await conn.scalar(
+                text("SELECT 1 FROM pg_database WHERE datname = :name"),
+                {"name": replica_db},
+            )
+            if not exists:
+                await conn.execute(text(f'CREATE DATABASE "{replica_db}"'))
+    except DBAPIError:
+        pytest.skip("cannot create replica database")
+    finally:
+        await admin_engine.dispose()
+
+    replica_engine = create_async_engine(
+        async_db_engine.url.set(database=replica_db)
+    )
+    async with replica_engine.begin() as conn:
+        await conn.run_sync(BaseModel.metadata.create_all)
+
+    replica_session = async_sessionmaker(
+        expire_on_commit=False, bind=replica_engine, class_=AsyncSession
+    )
+    app.dependency_overrides[get_replica_session_factories] = lambda: [replica_session]
+    yield replica_session
+
+    async with replica_engine.begin() as conn:
+        await conn.run_sync(BaseModel.metadata.drop_all)
+    await replica_engine.dispose()
+
+
+# Расширение pg_trgm для нечёткого поиска; без него тест пропускается
+@pytest.fixture
+async def pg_trgm(async_db_engine):
+    try:
+        async with async_db_engine.begin() as conn:
+            await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    except DBAPIError:
+        pytest.skip("pg_trgm extension is not available")
+
+
 # Создаём сессию для тестовой базы и очищаем таблицы после каждого теста
 @pytest.fixture(scope="function")
 async def async_db(async_db_engine):
@@ -3,6 +3,7 @@ from httpx import AsyncClient
 from sqlalchemy.future import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.activity import Activity
+from app.models.association_tables import activity_closure
 
 
 # Проверяем получение видов деятельностей
@@ -11,7 +12,7 @@ async def test_get_activities_list(
 ):
     response = await async_client.get("/activities/", headers=auth_headers)
     assert response.status_code == 200
-    orgs = response.json()
+    orgs = response.json()["items"]
     assert any(str(async_activity_orm.id) == o["id"] for o in orgs)
 
 
@@ -48,4 +49,112 @@ async def test_create_activity(
     result = await async_db.execute(select(Activity).filter(Activity.id == uuid.UUID(data["id"])))
     org_in_db = result.scalars().first()
     assert org_in_db is not None
-    assert org_in_db.name == payload["name"]
\ No newline at end of file
+    assert org_in_db.name == payload["name"]
+
+
+# Проверяем ограничение глубины вложенности при создании
+async def test_create_activity_depth_limit(
+    async_client: AsyncClient, auth_headers: dict, async_activity_orm: Activity
+):
+    parent_id = str(async_activity_orm.id)
+    for name in ("Level 2", "Level 3"):
+        response = await async_client.post(
+            "/activities/", headers=auth_headers, json={"name": name, "parent_id": parent_id}
+        )
+        assert response.status_code == 201
+        parent_id = response.json()["id"]
+
+    response = await async_client.post(
+        "/activities/", headers=auth_headers, json={"name": "Level 4", "parent_id": parent_id}
+    )
+    assert response.status_code == 400
+
+
+# Проверяем перенос деятельности вместе с поддеревом
+async def test_move_activity(
+    async_client: AsyncClient,
+    auth_headers: dict,
+    async_activity_orm: Activity,
+    async_db: AsyncSession,
+):
+    other_root = Activity(name="Other root")
+    child = Activity(name="Child", parent=other_root)
+    grandchild = Activity(name="Grandchild", parent=child)
+    async_db.add_all([other_root, child, grandchild])
+    await async_db.commit()
+
+    # Поддерево высотой 2 под корнем не превышает 3 уровней
+    response = await async_client.patch(
+        f"/activities/{child.id}",
+        headers=auth_headers,
+        json={"parent_id": str(async_activity_orm.id)},
+    )
+    assert response.status_code == 200
+
+    result = await async_db.execute(
+        select(activity_closure.c.ancestor_id, activity_closure.c.depth).where(
+            activity_closure.c.descendant_id == grandchild.id
+        )
+    )
+    assert dict(result.all()) == {grandchild.id: 0, child.id: 1, async_activity_orm.id: 2}
+
+    # Перенос в собственное поддерево запрещён
+    response = await async_client.patch(
+        f"/activities/{child.id}",
+        headers=auth_headers,
+        json={"parent_id": str(grandchild.id)},
+    )
+    assert response.status_code == 400
+
+
+# Проверяем получение дерева деятельностей и его обновление после создания
+async def test_get_activity_tree(
+    async_client: AsyncClient, auth_headers: dict, async_activity_orm: Activity
+):
+    response = await async_client.get("/activities/tree", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json() == [
+        {"id": str(async_activity_orm.id), "name": "test", "children": []}
+    ]
+
+    response = await async_client.post(
+        "/activities/",
+        headers=auth_headers,
+        json={"name": "Child", "parent_id": str(async_activity_orm.id)},
+    )
+    child_id = response.json()["id"]
+
+    response = await async_client.get("/activities/tree", headers=auth_headers)
+    assert response.status_code == 200
+    [root] = response.json()
+    assert root["children"] == [{"id": child_id, "name": "Child", "children": []}]
+
+
+# Проверяем мульти-запрос деятельностей через ?ids=
+async def test_get_activities_by_ids(
+    async_client: AsyncClient, auth_headers: dict, async_activity_orm: Activity
+):
+    unknown = str(uuid.uuid4())
+    response = await async_client.get(
+        "/activities/",
+        headers=auth_headers,
+        params={"ids": f"{async_activity_orm.id},{unknown}"},
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["items"][0]["name"] == async_activity_orm.name
+    assert data["items"][1] is None
+    assert data["missing"] == [unknown]
+
+
+# Проверяем выбор полей ответа (fields=)
+async def test_get_activities_sparse_fields(
+    async_client: AsyncClient, auth_headers: dict, async_activity_orm: Activity
+):
+    response = await async_client.get(
+        "/activities/",
+        headers=auth_headers,
+        params={"ids": str(async_activity_orm.id), "fields": "name"},
+    )
+    assert response.status_code == 200
+    assert response.json()["items"] == [{"name": async_activity_orm.name}]
@@ -1,7 +1,12 @@
+import asyncio
+import json
 import uuid
+import pytest
 from httpx import AsyncClient
 from sqlalchemy.future import select
 from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.core.response_cache import listen_invalidations, response_cache
 from app.models.building import Building
 
 
@@ -11,7 +16,7 @@ async def test_get_buildings_list(
 ):
     response = await async_client.get("/buildings/", headers=auth_headers)
     assert response.status_code == 200
-    orgs = response.json()
+    orgs = response.json()["items"]
     assert any(str(async_building_orm.id) == o["id"] for o in orgs)
 
 
@@ -48,4 +53,256 @@ async def test_create_building(
     result = await async_db.execute(select(Building).filter(Building.id == uuid.UUID(data["id"])))
     org_in_db = result.scalars().first()
     assert org_in_db is not None
-    assert org_in_db.address == payload["address"]
\ No newline at end of file
+    assert org_in_db.address == payload["address"]
+
+
+# Проверяем, что координаты вне допустимых границ, NaN и бесконечность
+# отклоняются до записи в базу и в пространственный индекс
+@pytest.mark.parametrize(
+    "latitude, longitude",
+    [("91", "0"), ("-90.5", "0"), ("0", "180.5"), ("NaN", "0"), ("0", "Infinity")],
+)
+async def test_create_building_invalid_coordinates(
+    async_client: AsyncClient, auth_headers: dict, latitude: str, longitude: str
+):
+    # json= в httpx не кодирует NaN, поэтому тело собирается вручную
+    body = (
+        f'{{"address":"ул. Пушкина, д. 45","latitude":{latitude},'
+        f'"longitude":{longitude}}}'
+    )
+    response = await async_client.post(
+        "/buildings/",
+        headers={**auth_headers, "Content-Type": "application/json"},
+        content=body,
+    )
+    assert response.status_code == 422
+
+
+# Проверяем потоковую выдачу зданий в формате NDJSON
+async def test_get_buildings_list_ndjson(
+    async_client: AsyncClient, auth_headers: dict, async_building_orm: Building
+):
+    response = await async_client.get(
+        "/buildings/", headers=auth_headers | {"Accept": "application/x-ndjson"}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    buildings = [json.loads(line) for line in response.text.splitlines()]
+    assert [b["id"] for b in buildings] == [str(async_building_orm.id)]
+
+
+# Проверяем кэш ответов: повторный запрос отдаётся из кэша, создание здания сбрасывает его
+async def test_buildings_response_cache(
+    async_client: AsyncClient, auth_headers: dict, async_building_orm: Building
+):
+    first = await async_client.get("/buildings/", headers=auth_headers)
+    second = await async_client.get("/buildings/", headers=auth_headers)
+    assert first.headers["X-Cache"] == "MISS"
+    assert second.headers["X-Cache"] == "HIT"
+    assert second.json() == first.json()
+
+    # Ответ организаций зависит от зданий и тоже должен сброситься
+    await async_client.get("/organizations/", headers=auth_headers)
+
+    payload = {"address": "ул. Ленина, д. 1", "latitude": 55.0, "longitude": 37.0}
+    response = await async_client.post("/buildings/", headers=auth_headers, json=payload)
+    assert response.status_code == 201
+
+    response = await async_client.get("/buildings/", headers=auth_headers)
+    assert response.headers["X-Cache"] == "MISS"
+    assert len(response.json()["items"]) == 2
+    response = await async_client.get("/organizations/", headers=auth_headers)
+    assert response.headers["X-Cache"] == "MISS"
+
+    stats = (await async_client.get("/internal/cache", headers=auth_headers)).json()
+    assert stats["hits"] == 1
+    assert stats["invalidations"] == 2
+
+
+# Проверяем сброс кэша записью из другого воркера: триггер таблицы шлёт
+# уведомление, слушатель сбрасывает ответы с тегом изменённой сущности
+async def test_response_cache_invalidation_across_workers(
+    async_client: AsyncClient, auth_headers: dict, async_db: AsyncSession
+):
+    connected = asyncio.Event()
+    listener = asyncio.create_task(
+        listen_invalidations(settings.NOTIFY_DATABASE_DSN, response_cache, connected)
+    )
+    try:
+        await asyncio.wait_for(connected.wait(), timeout=5)
+        await async_client.get("/buildings/", headers=auth_headers)
+        await async_client.get("/activities/", headers=auth_headers)
+        assert response_cache.stats()["entries"] == 2
+
+        # Запись мимо API этого воркера
+        async_db.add(Building(address="other worker", latitude=1.0, longitude=1.0))
+        await async_db.commit()
+        for _ in range(50):
+            if response_cache.stats()["entries"] == 1:
+                break
+            await asyncio.sleep(0.1)
+        response = await async_client.get("/buildings/", headers=auth_headers)
+        assert response.headers["X-Cache"] == "MISS"
+        assert [b["address"] for b in response.json()["items"]] == ["other worker"]
+        response = await async_client.get("/activities/", headers=auth_headers)
+        assert response.headers["X-Cache"] == "HIT"
+    finally:
+        listener.cancel()
+
+
+# Проверяем, что здание с тем же адресом повторно не создаётся
+async def test_create_building_duplicate_address(
+    async_client: AsyncClient, auth_headers: dict, async_building_orm: Building
+):
+    payload = {"address": " TEST ", "latitude": 54.0, "longitude": 75.0}
+    response = await async_client.post("/buildings/", headers=auth_headers, json=payload)
+    assert response.status_code == 409
+
+
+# Проверяем массовый upsert зданий по нормализованному адресу
+async def test_upsert_buildings_bulk(
+    async_client: AsyncClient,
+    auth_headers: dict,
+    async_db: AsyncSession,
+    async_building_orm: Building,
+):
+    payload = [
+        {"address": "ул. Пушкина, д. 44", "latitude": 54.1, "longitude": 75.1},
+        {"address": "Test", "latitude": 56.0, "longitude": 38.0},
+        {"address": "ул Пушкина д 44", "latitude": 54.2, "longitude": 75.2},
+    ]
+    response = await async_client.post(
+        "/buildings/bulk", headers=auth_headers, json=payload
+    )
+    assert response.status_code == 201
+    ids = [uuid.UUID(i) for i in response.json()["ids"]]
+    assert len(ids) == 3
+    assert ids[0] == ids[2]
+    assert ids[1] == async_building_orm.id
+
+    result = await async_db.execute(
+        select(Building).execution_options(populate_existing=True)
+    )
+    by_id = {b.id: b for b in result.scalars().all()}
+    assert len(by_id) == 2
+    assert by_id[ids[0]].latitude == 54.2
+    assert by_id[ids[1]].address == "Test"
+    assert by_id[ids[1]].latitude == 56.0
+
+
+# Проверяем маршрутизацию на реплику: чтение идёт с реплики, запись - в основную базу,
+# а после записи клиент в течение окна read-your-writes читает с основной базы
+async def test_read_replica_routing(
+    async_client: AsyncClient,
+    auth_headers: dict,
+    async_db: AsyncSession,
+    replica_session_factory,
+    monkeypatch,
+):
+    async with replica_session_factory() as replica:
+        replica.add(Building(address="replica", latitude=1.0, longitude=1.0))
+        await replica.commit()
+
+    response = await async_client.get("/buildings/", headers=auth_headers)
+    assert [b["address"] for b in response.json()["items"]] == ["replica"]
+
+    monkeypatch.setattr(settings.database, "READ_YOUR_WRITES_SECONDS", 5)
+    payload = {"address": "primary", "latitude": 2.0, "longitude": 2.0}
+    response = await async_client.post("/buildings/", headers=auth_headers, json=payload)
+    assert response.status_code == 201
+    assert "db_primary" in response.cookies
+    result = await async_db.execute(select(Building.address))
+    assert result.scalars().all() == ["primary"]
+
+    try:
+        response = await async_client.get("/buildings/", headers=auth_headers)
+        assert [b["address"] for b in response.json()["items"]] == ["primary"]
+    finally:
+        async_client.cookies.clear()
+
+
+# Проверяем кэш ответов при чтении с реплики: в окне read-your-writes кэш
+# не используется, а ответ реплики сразу после записи не кэшируется
+async def test_response_cache_read_your_writes(
+    async_client: AsyncClient,
+    auth_headers: dict,
+    replica_session_factory,
+    monkeypatch,
+):
+    async with replica_session_factory() as replica:
+        replica.add(Building(address="replica", latitude=1.0, longitude=1.0))
+        await replica.commit()
+    monkeypatch.setattr(settings.database, "READ_YOUR_WRITES_SECONDS", 5)
+
+    response = await async_client.get("/buildings/", headers=auth_headers)
+    assert response.headers["X-Cache"] == "MISS"
+    payload = {"address": "primary", "latitude": 2.0, "longitude": 2.0}
+    response = await async_client.post("/buildings/", headers=auth_headers, json=payload)
+    assert response.status_code == 201
+
+    try:
+        for _ in range(2):
+            response = await async_client.get("/buildings/", headers=auth_headers)
+            assert "X-Cache" not in response.headers
+            assert [b["address"] for b in response.json()["items"]] == ["primary"]
+    finally:
+        async_client.cookies.clear()
+
+    for _ in range(2):
+        response = await async_client.get("/buildings/", headers=auth_headers)
+        assert response.headers["X-Cache"] == "MISS"
+        assert [b["address"] for b in response.json()["items"]] == ["replica"]
+
+
+# Проверяем мульти-запрос зданий и ограничение на число id
+async def test_lookup_buildings(
+    async_client: AsyncClient, auth_headers: dict, async_building_orm: Building
+):
+    unknown = str(uuid.uuid4())
+    building_id = str(async_building_orm.id)
+    response = await async_client.post(
+        "/buildings/lookup", headers=auth_headers, json={"ids": [unknown, building_id]}
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["items"][0] is None
+    assert data["items"][1]["id"] == building_id
+    assert data["missing"] == [unknown]
+
+    response = await async_client.get(
+        "/buildings/",
+        headers=auth_headers,
+        params=[("ids", building_id), ("ids", unknown)],
+    )
+    assert response.json()["missing"] == [unknown]
+
+    too_many = [str(uuid.uuid4()) for _ in range(settings.service.LOOKUP_MAX_IDS + 1)]
+    response = await async_client.post(
+        "/buildings/lookup", headers=auth_headers, json={"ids": too_many}
+    )
+    assert response.status_code == 400
+
+
+# Проверяем выбор полей ответа (fields=)
+async def test_get_buildings_sparse_fields(
+    async_client: AsyncClient, auth_headers: dict, async_building_orm: Building
+):
+    params = {"fields": "id,latitude"}
+    response = await async_client.get(
+        f"/buildings/{async_building_orm.id}", headers=auth_headers, params=params
+    )
+    assert response.status_code == 200
+    assert response.json() == {
+        "latitude": async_building_orm.latitude,
+        "id": str(async_building_orm.id),
+    }
+
+    response = await async_client.get(
+        "/buildings/", headers=auth_headers, params=params
+    )
+    assert all(list(item) == ["latitude", "id"] for item in response.json()["items"])
+
+    response = await async_client.get(
+        "/buildings/", headers=auth_headers, params={"fields": "name"}
+    )
+    assert response.status_code == 400
@@ -0,0 +1,85 @@
+from sqlalchemy import inspect, select
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.crud import organization as org_crud
+from app.models.base import Base
+from app.models.organization import Organization
+from app.models.phone import OrganizationPhone
+from app.utils import FieldSelection
+
+
+def loaded_relationships(obj, prefix: str = "", seen: set | None = None) -> set[str]:
+    """
+    Пути всех загруженных связей объекта, например {"building", "phones"}.
+    """
+    seen = set() if seen is None else seen
+    seen.add(id(obj))
+    state = inspect(obj)
+    paths = set()
+    for relationship in state.mapper.relationships:
+        if relationship.key in state.unloaded:
+            continue
+        path = prefix + relationship.key
+        paths.add(path)
+        value = state.attrs[relationship.key].loaded_value
+        children = value if isinstance(value, list) else [value]
+        for child in children:
+            if child is not None and id(child) not in seen:
+                paths |= loaded_relationships(child, path + ".", seen)
+    return paths
+
+
+# Проверяем, что ни одна связь моделей не загружается неявно
+def test_relationships_are_not_loaded_by_default():
+    for mapper in Base.registry.mappers:
+        for relationship in mapper.relationships:
+            name = f"{mapper.class_.__name__}.{relationship.key}"
+            assert relationship.lazy == "raise", name
+
+
+# Проверяем, что выборка организаций загружает ровно граф OrganizationRead
+async def test_organization_read_graph(
+    async_db: AsyncSession, async_organization_orm: Organization
+):
+    async_db.add(
+        OrganizationPhone(phone="2-222-222", organization_id=async_organization_orm.id)
+    )
+    await async_db.commit()
+    async_db.expunge_all()
+
+    result = await async_db.execute(
+        select(Organization).options(*org_crud.ORGANIZATION_READ_OPTIONS)
+    )
+    organizations = result.scalars().all()
+    assert len(organizations) == 1
+    assert loaded_relationships(organizations[0]) == {
+        "building",
+        "phones",
+        "activities",
+    }
+
+
+# Проверяем, что узкий выбор полей сужает сам SQL-запрос
+def test_sparse_selection_query():
+    def compiled(**params) -> str:
+        selection = FieldSelection(
+            list(org_crud.ORGANIZATION_COLUMNS), org_crud.ORGANIZATION_RELATIONS, **params
+        )
+        query = org_crud.organizations_json_query(selection)
+        return str(query.compile(dialect=postgresql.dialect()))
+
+    sql = compiled(requested="id,name")
+    assert "buildings" not in sql
+    assert "organization_phones" not in sql
+    assert "activities" not in sql
+
+    sql = compiled(requested="id,building.latitude,building.longitude")
+    assert "JOIN buildings" in sql
+    assert "buildings.latitude" in sql
+    assert "buildings.address" not in sql
+    assert "organization_phones" not in sql
+
+    sql = compiled(include="phones")
+    assert "organization_phones" in sql
+    assert "buildings" not in sql
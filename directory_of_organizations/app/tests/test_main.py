@@ -1,5 +1,21 @@
+import json
+import logging
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
 from httpx import AsyncClient
 import pytest
+from sqlalchemy import text
+
+from app.api.responses import FastJSONResponse
+from app.core.config import settings
+from app.core.db import engine
+from app.core.metrics import (
+    QueryBudgetExceeded,
+    RequestStats,
+    check_queries,
+    query_budget,
+)
+from app.main import app
 
 
 pytestmark = pytest.mark.asyncio
@@ -19,4 +35,136 @@ async def test_access_with_token(
     auth_headers: dict,
 ):
     response = await async_client.get("/organizations/", headers=auth_headers)
-    assert response.status_code in (200, 404)
\ No newline at end of file
+    assert response.status_code in (200, 404)
+
+
+# Проверяем, что закэшированный ответ не отдаётся без токена
+async def test_cached_response_requires_token(
+    async_client: AsyncClient,
+    auth_headers: dict,
+):
+    response = await async_client.get("/activities/", headers=auth_headers)
+    assert response.status_code == 200
+    response = await async_client.get("/activities/")
+    assert response.status_code == 401
+
+
+# Проверяем кодирование ответа стандартным json: UUID и координаты
+# в том же виде, малые числа с экспонентой, кириллица без экранирования
+async def test_response_encoding_matches_stdlib(
+    async_client: AsyncClient,
+    auth_headers: dict,
+):
+    payload = {"address": "ул. Пушкина, д. 44", "latitude": 54.2233051, "longitude": 1e-05}
+    response = await async_client.post("/buildings/", headers=auth_headers, json=payload)
+    assert response.status_code == 201
+    assert response.headers["content-type"] == "application/json"
+    assert response.text == json.dumps(
+        response.json(), ensure_ascii=False, separators=(",", ":")
+    )
+
+
+# Проверяем, что FastJSONResponse кодирует так же, как JSONResponse: малые
+# числа, которые orjson пишет иначе, ключи-числа и большие целые, с которыми
+# orjson не справляется, и UUID, похожие на экспоненту
+@pytest.mark.parametrize(
+    "content",
+    [
+        [1e-05, -9.876543210000001e-05, 1e-09, -1.2345e-07, 1e-10, 0.0001],
+        [54.2233051, -0.1275, 55.0, -0.0, 1e16, 1.7976931348623157e308],
+        {"id": "3fa85f6e-5717-4562-b3fe-2c963f66afa6", "next_cursor": None},
+        {"name": "ООО «Ромашка» 1e-5\n\x1f", "phones": ["2-222-222"]},
+        {1: "int key", "big": 2**70},
+    ],
+)
+async def test_fast_json_response_matches_stdlib(content):
+    assert FastJSONResponse(content).body == JSONResponse(content).body
+
+
+# Проверяем статистику пула соединений приложения
+async def test_pool_stats(
+    async_client: AsyncClient,
+    auth_headers: dict,
+):
+    async with engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+        response = await async_client.get("/internal/pool", headers=auth_headers)
+    # Соединения пула привязаны к циклу событий теста
+    await engine.dispose()
+
+    assert response.status_code == 200
+    pools = response.json()
+    assert set(pools) == {"primary"} | {
+        f"replica{i}" for i in range(len(settings.database.REPLICAS))
+    }
+    stats = pools["primary"]
+    assert stats["size"] == settings.database.POOL_SIZE
+    assert stats["max_overflow"] == settings.database.MAX_OVERFLOW
+    assert stats["checked_out"] == 1
+    assert stats["checkouts"] == 1
+    assert stats["waiting"] == 0
+
+
+# Проверяем метрики Prometheus: доступны без токена, запрос учтён
+# по шаблону маршрута вместе с числом запросов к БД
+async def test_metrics(
+    async_client: AsyncClient,
+    auth_headers: dict,
+):
+    response = await async_client.get("/buildings/", headers=auth_headers)
+    assert response.status_code == 200
+
+    response = await async_client.get("http://localhost/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    route = settings.service.API_PREFIX.rstrip("/") + "/buildings/"
+    labels = f'method="GET",route="{route}"'
+    assert f'http_request_duration_seconds_count{{{labels},status="200"}}' in response.text
+    assert f"http_response_size_bytes_count{{{labels}}}" in response.text
+    queries = next(
+        float(line.rsplit(" ", 1)[1])
+        for line in response.text.splitlines()
+        if line.startswith(f"http_request_db_queries_sum{{{labels}}}")
+    )
+    assert queries >= 1
+
+
+# Проверяем, что каждый маршрут API объявляет бюджет запросов к БД:
+# с QUERY_BUDGET_STRICT превышение роняет любой тест, который его вызывает
+async def test_routes_declare_query_budget():
+    for route in app.routes:
+        if isinstance(route, APIRoute) and route.path.startswith(
+            settings.service.API_PREFIX
+        ):
+            assert hasattr(route.endpoint, "query_budget"), route.path
+
+
+# Проверяем заголовок X-Query-Count (в режиме DEBUG)
+async def test_query_count_header(
+    async_client: AsyncClient,
+    auth_headers: dict,
+):
+    response = await async_client.get("/buildings/", headers=auth_headers)
+    assert response.headers["x-query-count"] == "1"
+
+    # Повторный запрос отдаётся из кэша ответов без обращения к БД
+    response = await async_client.get("/buildings/", headers=auth_headers)
+    assert response.headers["x-cache"] == "HIT"
+    assert response.headers["x-query-count"] == "0"
+
+
+# Проверяем превышение бюджета и запись повторяющихся запросов в лог
+async def test_check_queries(caplog: pytest.LogCaptureFixture):
+    @query_budget(2)
+    async def endpoint():
+        pass
+
+    scope = {"route": APIRoute("/x", endpoint)}
+    stats = RequestStats(queries=2)
+    check_queries("GET", "/x", scope, stats)
+
+    stats = RequestStats(queries=settings.service.QUERY_REPEAT_WARNING)
+    stats.statements["SELECT 1"] = settings.service.QUERY_REPEAT_WARNING
+    with caplog.at_level(logging.WARNING), pytest.raises(QueryBudgetExceeded):
+        check_queries("GET", "/x", scope, stats)
+    assert "possible N+1" in caplog.text
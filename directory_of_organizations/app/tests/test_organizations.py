@@ -1,8 +1,19 @@
+import json
 import uuid
 from httpx import AsyncClient
+import pytest
+from sqlalchemy import update
 from sqlalchemy.future import select
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from app.models.activity import Activity
+from app.models.building import Building
 from app.models.organization import Organization
+from app.models.phone import OrganizationPhone
+from app.schemas.organization import OrganizationRead
+from app.core.config import settings
+from app.crud import organization as org_crud
+from app.utils import get_bounding_box_area
 
 
 # Проверяем получение организаций
@@ -11,7 +22,7 @@ async def test_get_organizations_list(
 ):
     response = await async_client.get("/organizations/", headers=auth_headers)
     assert response.status_code == 200
-    orgs = response.json()
+    orgs = response.json()["items"]
     assert any(str(async_organization_orm.id) == o["id"] for o in orgs)
 
 
@@ -24,7 +35,7 @@ async def test_get_organizations_by_activity(
         headers=auth_headers,
     )
     assert response.status_code == 200
-    orgs = response.json()
+    orgs = response.json()["items"]
     assert any(str(async_organization_orm.id) == o["id"] for o in orgs)
 
 
@@ -41,7 +52,7 @@ async def test_get_organizations_by_building(
         headers=auth_headers,
     )
     assert response.status_code == 200
-    orgs = response.json()
+    orgs = response.json()["items"]
     response_ids = {uuid.UUID(o["id"]) for o in orgs}
 
     result = await async_db.execute(select(Organization).filter(Organization.building_id == async_building_orm.id))
@@ -50,6 +61,7 @@ async def test_get_organizations_by_building(
 
     assert db_ids.issubset(response_ids)
 
+
 # Проверяем поиск организаций в радиусе 1 км от здания тестовой организации
 async def test_get_organizations_by_radius(
     async_client: AsyncClient, auth_headers: dict, async_organization_orm: Organization
@@ -64,8 +76,69 @@ async def test_get_organizations_by_radius(
         headers=auth_headers,
     )
     assert response.status_code == 200
-    orgs = response.json()
+    orgs = response.json()["items"]
     assert any(str(async_organization_orm.id) == o["id"] for o in orgs)
+    assert all(0 <= o["distance_km"] <= radius_km for o in orgs)
+
+
+# Проверяем, что в выдачу по радиусу не попадают углы ограничивающего прямоугольника
+async def test_get_organizations_by_radius_excludes_box_corners(
+    async_client: AsyncClient,
+    auth_headers: dict,
+    async_organization_orm: Organization,
+    async_db: AsyncSession,
+):
+    latitude = async_organization_orm.building.latitude
+    longitude = async_organization_orm.building.longitude
+    radius_km = 1.0
+    box = get_bounding_box_area(latitude, longitude, radius_km)
+
+    # Здание внутри прямоугольника, но дальше радиуса (~1.13 км)
+    corner = Building(
+        address="corner",
+        latitude=latitude + 0.8 * (box.max_lat - latitude),
+        longitude=longitude + 0.8 * (box.max_lon - longitude),
+    )
+    nearby = Building(address="nearby", latitude=latitude + 0.001, longitude=longitude)
+    async_db.add_all([corner, nearby])
+    await async_db.flush()
+    far_org = Organization(name="Corner", building_id=corner.id)
+    near_org = Organization(name="Nearby", building_id=nearby.id)
+    async_db.add_all([far_org, near_org])
+    await async_db.commit()
+
+    response = await async_client.get(
+        "/organizations/by-radius/",
+        headers=auth_headers,
+        params={"latitude": latitude, "longitude": longitude, "radius_km": radius_km},
+    )
+    assert response.status_code == 200
+    orgs = response.json()["items"]
+    ids = [o["id"] for o in orgs]
+    assert str(far_org.id) not in ids
+    # Ближайшие - первыми
+    assert ids[0] == str(async_organization_orm.id)
+    assert ids[-1] == str(near_org.id)
+    assert orgs[-1]["distance_km"] == pytest.approx(0.111, abs=0.001)
+
+    # Курсор по (расстояние, id) продолжает выдачу с того же места
+    response = await async_client.get(
+        "/organizations/by-radius/",
+        headers=auth_headers,
+        params={"latitude": latitude, "longitude": longitude, "radius_km": radius_km, "limit": 1},
+    )
+    next_page = await async_client.get(
+        "/organizations/by-radius/",
+        headers=auth_headers,
+        params={
+            "latitude": latitude,
+            "longitude": longitude,
+            "radius_km": radius_km,
+            "limit": 1,
+            "after": response.json()["next_cursor"],
+        },
+    )
+    assert [o["id"] for o in next_page.json()["items"]] == ids[1:2]
 
 
 # Проверяем поиск организаций по части имени
@@ -78,7 +151,7 @@ async def test_search_organizations_by_name(
         f"/organizations/?name={partial_name}", headers=auth_headers
     )
     assert response.status_code == 200
-    orgs = response.json()
+    orgs = response.json()["items"]
     assert any(str(async_organization_orm.id) == o["id"] for o in orgs)
 
 
@@ -104,6 +177,7 @@ async def test_create_organization(
 ):
     payload = {
         "name": "New Organization",
+        "phone_numbers": [{"phone": "2-222-222"}, {"phone": "8-923-666-13-13"}],
         "activity_ids": [str(async_activity_orm.id)],
         "building_id": str(async_building_orm.id),
     }
@@ -117,4 +191,520 @@ async def test_create_organization(
     result = await async_db.execute(select(Organization).filter(Organization.id == uuid.UUID(data["id"])))
     org_in_db = result.scalars().first()
     assert org_in_db is not None
-    assert org_in_db.name == payload["name"]
\ No newline at end of file
+    assert org_in_db.name == payload["name"]
+
+
+# Проверяем постраничную выдачу организаций по курсору
+async def test_get_organizations_list_pagination(
+    async_client: AsyncClient,
+    auth_headers: dict,
+    async_organization_orm: Organization,
+    async_db: AsyncSession,
+):
+    for i in range(4):
+        async_db.add(
+            Organization(name=f"Org {i}", building_id=async_organization_orm.building_id)
+        )
+    await async_db.commit()
+
+    seen, after = [], None
+    while True:
+        params = {"limit": 2} | ({"after": after} if after else {})
+        response = await async_client.get(
+            "/organizations/", headers=auth_headers, params=params
+        )
+        assert response.status_code == 200
+        page = response.json()
+        assert len(page["items"]) <= 2
+        seen.extend(o["id"] for o in page["items"])
+        after = page["next_cursor"]
+        if after is None:
+            break
+
+    assert len(seen) == 5
+    assert seen == sorted(seen)
+
+
+# Проверяем, что повреждённый курсор отклоняется
+async def test_get_organizations_list_invalid_cursor(
+    async_client: AsyncClient, auth_headers: dict
+):
+    response = await async_client.get(
+        "/organizations/", headers=auth_headers, params={"after": "garbage"}
+    )
+    assert response.status_code == 400
+
+
+# Проверяем потоковую выдачу организаций в формате NDJSON
+async def test_get_organizations_list_ndjson(
+    async_client: AsyncClient, auth_headers: dict, async_organization_orm: Organization
+):
+    response = await async_client.get(
+        "/organizations/",
+        headers=auth_headers | {"Accept": "application/x-ndjson"},
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    orgs = [json.loads(line) for line in response.text.splitlines()]
+    assert any(str(async_organization_orm.id) == o["id"] for o in orgs)
+    assert all(o["building"]["id"] for o in orgs)
+
+
+# Проверяем поиск организаций в прямоугольной области
+async def test_get_organizations_by_rectangle(
+    async_client: AsyncClient, auth_headers: dict, async_organization_orm: Organization
+):
+    latitude = async_organization_orm.building.latitude
+    longitude = async_organization_orm.building.longitude
+    params = {
+        "min_lat": latitude - 0.01,
+        "max_lat": latitude + 0.01,
+        "min_lon": longitude - 0.01,
+        "max_lon": longitude + 0.01,
+    }
+    response = await async_client.get(
+        "/organizations/by-rectangle/", headers=auth_headers, params=params
+    )
+    assert response.status_code == 200
+    assert [o["id"] for o in response.json()["items"]] == [str(async_organization_orm.id)]
+
+    params["min_lat"] = latitude + 0.005
+    response = await async_client.get(
+        "/organizations/by-rectangle/", headers=auth_headers, params=params
+    )
+    assert response.status_code == 404
+
+
+# Проверяем кластеры на карте: укрупнение ячеек с уменьшением приближения,
+# центр с весом по организациям и фильтр по поддереву деятельности
+async def test_get_organization_clusters(
+    async_client: AsyncClient,
+    auth_headers: dict,
+    async_organization_orm: Organization,
+    async_db: AsyncSession,
+):
+    building = async_organization_orm.building
+    far = Building(address="far", latitude=55.70, longitude=37.70)
+    async_db.add(far)
+    await async_db.flush()
+    async_db.add_all(
+        [Organization(name=f"Far {i}", building_id=far.id) for i in range(2)]
+    )
+    await async_db.commit()
+    params = {"min_lat": 55.0, "max_lat": 56.5, "min_lon": 37.0, "max_lon": 38.5}
+
+    response = await async_client.get(
+        "/organizations/clusters", headers=auth_headers, params={**params, "zoom": 4}
+    )
+    assert response.status_code == 200
+    body = response.json()
+    assert body["zoom"] == 6
+    [cluster] = body["clusters"]
+    assert len(cluster["cell"]) == 6
+    assert (cluster["organizations"], cluster["buildings"]) == (3, 2)
+    assert cluster["latitude"] == pytest.approx((building.latitude + 2 * 55.70) / 3)
+
+    response = await async_client.get(
+        "/organizations/clusters", headers=auth_headers, params={**params, "zoom": 10}
+    )
+    clusters = response.json()["clusters"]
+    assert sorted(c["organizations"] for c in clusters) == [1, 2]
+    assert all(c["cell"].startswith(cluster["cell"]) for c in clusters)
+
+    response = await async_client.get(
+        "/organizations/clusters",
+        headers=auth_headers,
+        params={
+            **params,
+            "zoom": 10,
+            "activity_id": str(async_organization_orm.activities[0].id),
+        },
+    )
+    [cluster] = response.json()["clusters"]
+    assert cluster["organizations"] == 1
+    assert cluster["latitude"] == pytest.approx(building.latitude)
+
+    response = await async_client.get(
+        "/organizations/clusters", headers=auth_headers, params={**params, "zoom": 18}
+    )
+    assert response.status_code == 400
+
+
+# Проверяем фасеты: организация учитывается у всех предков своих деятельностей
+# по одному разу, счётчики пересчитываются при переносе поддерева
+async def test_get_activity_facets(
+    async_client: AsyncClient,
+    auth_headers: dict,
+    async_building_orm: Building,
+    async_db: AsyncSession,
+):
+    far = Building(address="far", latitude=55.70, longitude=37.70)
+    async_db.add(far)
+    await async_db.commit()
+
+    async def post(url: str, payload: dict) -> str:
+        response = await async_client.post(url, headers=auth_headers, json=payload)
+        assert response.status_code == 201
+        return response.json()["id"]
+
+    root = await post("/activities/", {"name": "Root"})
+    child = await post("/activities/", {"name": "Child", "parent_id": root})
+    other = await post("/activities/", {"name": "Other"})
+    building = str(async_building_orm.id)
+    await post(
+        "/organizations/",
+        {"name": "Both", "building_id": building, "activity_ids": [root, child]},
+    )
+    await post(
+        "/organizations/",
+        {"name": "Child", "building_id": str(far.id), "activity_ids": [child]},
+    )
+    response = await async_client.post(
+        "/organizations/bulk",
+        headers=auth_headers,
+        json=[{"name": "Other", "building_id": building, "activity_ids": [other]}],
+    )
+    assert response.json()["created"] == 1
+
+    async def facets(**params) -> dict:
+        response = await async_client.get(
+            "/organizations/activity-facets", headers=auth_headers, params=params
+        )
+        assert response.status_code == 200
+        return {f["activity_id"]: f["organizations"] for f in response.json()}
+
+    assert await facets() == {root: 2, child: 2, other: 1}
+    assert await facets(building_id=building) == {root: 1, child: 1, other: 1}
+    box = {"min_lat": 55.69, "max_lat": 55.71, "min_lon": 37.69, "max_lon": 37.71}
+    assert await facets(**box) == {root: 1, child: 1}
+    assert await facets(**{**box, "min_lat": 10.0, "max_lat": 10.1}) == {}
+    # Область города: счётчики в основном из ячеек сетки целиком
+    city = {"min_lat": 55.0, "max_lat": 56.5, "min_lon": 37.0, "max_lon": 38.5}
+    assert await facets(**city) == {root: 2, child: 2, other: 1}
+
+    # Переезд здания переносит его счётчики между ячейками
+    response = await async_client.post(
+        "/buildings/bulk",
+        headers=auth_headers,
+        json=[{"address": "far", "latitude": 10.05, "longitude": 10.05}],
+    )
+    assert response.status_code == 201
+    assert await facets(**box) == {}
+    assert await facets(**city) == {root: 1, child: 1, other: 1}
+    moved = {"min_lat": 10.0, "max_lat": 10.1, "min_lon": 10.0, "max_lon": 10.1}
+    assert await facets(**moved) == {root: 1, child: 1}
+
+    response = await async_client.patch(
+        f"/activities/{child}", headers=auth_headers, json={"parent_id": other}
+    )
+    assert response.status_code == 200
+    assert await facets() == {root: 1, child: 2, other: 3}
+
+    for params in (
+        {"min_lat": 55.0},
+        {**box, "building_id": building},
+        {**box, "min_lat": 56.0},
+    ):
+        response = await async_client.get(
+            "/organizations/activity-facets", headers=auth_headers, params=params
+        )
+        assert response.status_code == 400
+
+
+# Проверяем комбинированный поиск: условия пересекаются в одном запросе,
+# с пространственным индексом воркера и без него
+@pytest.mark.parametrize("spatial_index", [True, False])
+async def test_search_organizations(
+    async_client: AsyncClient,
+    auth_headers: dict,
+    async_organization_orm: Organization,
+    async_db: AsyncSession,
+    monkeypatch,
+    spatial_index: bool,
+):
+    monkeypatch.setattr(settings.service, "SPATIAL_INDEX_ENABLED", spatial_index)
+    building = async_organization_orm.building
+    root = async_organization_orm.activities[0]
+    child = Activity(name="Аптеки", parent_id=root.id)
+    far = Building(address="far", latitude=55.70, longitude=37.70)
+    async_db.add_all([child, far])
+    await async_db.flush()
+    near_pharmacy = Organization(name="Аптека у дома", building_id=building.id)
+    near_pharmacy.activities.append(child)
+    far_pharmacy = Organization(name="Аптека на окраине", building_id=far.id)
+    far_pharmacy.activities.append(child)
+    other = Organization(name="Аптекарский склад", building_id=building.id)
+    async_db.add_all([near_pharmacy, far_pharmacy, other])
+    await async_db.commit()
+
+    async def search(**params) -> list[dict]:
+        response = await async_client.get(
+            "/organizations/search", headers=auth_headers, params=params
+        )
+        assert response.status_code == 200
+        return response.json()["items"]
+
+    point = {
+        "latitude": building.latitude,
+        "longitude": building.longitude,
+        "radius_km": 2.0,
+    }
+    items = await search(name="аптека", activity_id=str(root.id), **point)
+    assert [o["id"] for o in items] == [str(near_pharmacy.id)]
+    assert items[0]["distance_km"] == pytest.approx(0.0, abs=0.001)
+
+    items = await search(name="аптек", activity_id=str(root.id))
+    assert {o["id"] for o in items} == {str(near_pharmacy.id), str(far_pharmacy.id)}
+    items = await search(name="аптек", building_id=str(building.id))
+    assert {o["id"] for o in items} == {str(near_pharmacy.id), str(other.id)}
+    box = {"min_lat": 55.69, "max_lat": 55.71, "min_lon": 37.69, "max_lon": 37.71}
+    items = await search(activity_id=str(child.id), **box)
+    assert [o["id"] for o in items] == [str(far_pharmacy.id)]
+    assert await search(name="аптека", building_id=str(far.id), **point) == []
+
+    # Курсор по id продолжает выдачу без радиуса
+    response = await async_client.get(
+        "/organizations/search",
+        headers=auth_headers,
+        params={"name": "аптек", "limit": 2},
+    )
+    page = response.json()
+    next_page = await search(name="аптек", after=page["next_cursor"])
+    ids = [o["id"] for o in page["items"] + next_page]
+    assert ids == sorted(
+        str(o.id) for o in (near_pharmacy, far_pharmacy, other)
+    )
+
+    for params in (
+        {},
+        {"latitude": 55.0, "radius_km": 1.0},
+        {"min_lat": 55.0, "name": "аптека"},
+        {**box, **point},
+        {**box, "min_lat": 56.0},
+    ):
+        response = await async_client.get(
+            "/organizations/search", headers=auth_headers, params=params
+        )
+        assert response.status_code == 400
+
+
+# Проверяем получение организаций по виду деятельности вместе с дочерними
+async def test_get_organizations_by_activity_with_children(
+    async_client: AsyncClient,
+    auth_headers: dict,
+    async_organization_orm: Organization,
+    async_db: AsyncSession,
+):
+    root = async_organization_orm.activities[0]
+    child = Activity(name="Child", parent_id=root.id)
+    grandchild = Activity(name="Grandchild", parent=child)
+    other = Activity(name="Other")
+    async_db.add_all([child, grandchild, other])
+    await async_db.flush()
+    deep_org = Organization(name="Deep", building_id=async_organization_orm.building_id)
+    deep_org.activities.append(grandchild)
+    other_org = Organization(name="Other", building_id=async_organization_orm.building_id)
+    other_org.activities.append(other)
+    async_db.add_all([deep_org, other_org])
+    await async_db.commit()
+
+    response = await async_client.get(
+        f"/organizations/by-activity/{root.id}",
+        headers=auth_headers,
+        params={"with_children": True},
+    )
+    assert response.status_code == 200
+    ids = {o["id"] for o in response.json()["items"]}
+    assert ids == {str(async_organization_orm.id), str(deep_org.id)}
+
+
+# Проверяем нечёткий поиск: опечатка и другой регистр, сортировка по похожести
+@pytest.mark.usefixtures("pg_trgm")
+async def test_search_organizations_by_name_fuzzy(
+    async_client: AsyncClient,
+    auth_headers: dict,
+    async_organization_orm: Organization,
+    async_db: AsyncSession,
+):
+    async_db.add(
+        Organization(name="Автосалон Лада", building_id=async_organization_orm.building_id)
+    )
+    await async_db.commit()
+
+    response = await async_client.get(
+        "/organizations/",
+        headers=auth_headers,
+        params={"name": "ПОЛУФАБРИКОТЫ", "fuzzy": True},
+    )
+    assert response.status_code == 200
+    orgs = response.json()["items"]
+    assert [o["id"] for o in orgs] == [str(async_organization_orm.id)]
+
+
+# Проверяем массовое создание: ошибки возвращаются по позициям, остальные создаются
+async def test_create_organizations_bulk(
+    async_client: AsyncClient,
+    auth_headers: dict,
+    async_db: AsyncSession,
+    async_building_orm: Building,
+    async_activity_orm: Activity,
+):
+    payload = [
+        {
+            "name": "Рога и Копыта",
+            "building_id": str(async_building_orm.id),
+            "phone_numbers": [{"phone": "8-923-666-13-13"}, {"phone": "2-222-222"}],
+            "activity_ids": [str(async_activity_orm.id)],
+        },
+        {"name": "Без здания", "building_id": str(uuid.uuid4())},
+        {
+            "name": "Без деятельности",
+            "building_id": str(async_building_orm.id),
+            "activity_ids": [str(uuid.uuid4())],
+        },
+        {"name": "Просто организация", "building_id": str(async_building_orm.id)},
+    ]
+    response = await async_client.post(
+        "/organizations/bulk", headers=auth_headers, json=payload
+    )
+    assert response.status_code == 201
+    data = response.json()
+    assert data["created"] == 2
+    assert [item["index"] for item in data["items"]] == [0, 1, 2, 3]
+    assert data["items"][1]["error"] == "Building not found"
+    assert data["items"][2]["error"].startswith("Activity not found")
+
+    result = await async_db.execute(
+        select(Organization)
+        .options(selectinload(Organization.phones), selectinload(Organization.activities))
+        .where(Organization.id == uuid.UUID(data["items"][0]["id"]))
+    )
+    org = result.scalar_one()
+    assert sorted(p.phone for p in org.phones) == ["2-222-222", "8-923-666-13-13"]
+    assert [a.id for a in org.activities] == [async_activity_orm.id]
+
+
+# Проверяем, что быстрый путь чтения отдаёт байт в байт то же, что
+# JSONResponse для сериализации ORM-объекта: целые float8 и экспонента
+async def test_read_organization_matches_schema(
+    async_client: AsyncClient,
+    auth_headers: dict,
+    async_db: AsyncSession,
+    async_organization_orm: Organization,
+):
+    async_db.add(
+        OrganizationPhone(phone="2-222-222", organization_id=async_organization_orm.id)
+    )
+    await async_db.execute(
+        update(Building)
+        .where(Building.id == async_organization_orm.building_id)
+        .values(latitude=55.0, longitude=1e-05)
+    )
+    await async_db.commit()
+    async_db.expunge_all()
+    result = await async_db.execute(
+        select(Organization)
+        .options(*org_crud.ORGANIZATION_READ_OPTIONS)
+        .where(Organization.id == async_organization_orm.id)
+    )
+    organization = result.scalar_one()
+    expected = OrganizationRead.model_validate(organization).model_dump(mode="json")
+
+    def encode(content) -> bytes:
+        return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode()
+
+    response = await async_client.get(
+        f"/organizations/{async_organization_orm.id}", headers=auth_headers
+    )
+    assert response.status_code == 200
+    assert response.content == encode(expected)
+
+    response = await async_client.get("/organizations/", headers=auth_headers)
+    assert response.content == encode({"items": [expected], "next_cursor": None})
+
+    response = await async_client.get(
+        f"/buildings/{async_organization_orm.building_id}", headers=auth_headers
+    )
+    assert response.content == encode(expected["building"])
+
+
+# Проверяем мульти-запрос организаций: порядок id и отметки ненайденных
+async def test_get_organizations_by_ids(
+    async_client: AsyncClient, auth_headers: dict, async_organization_orm: Organization
+):
+    unknown = uuid.uuid4()
+    org_id = str(async_organization_orm.id)
+    response = await async_client.get(
+        "/organizations/",
+        headers=auth_headers,
+        params={"ids": f"{unknown},{org_id}"},
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["items"][0] is None
+    assert data["items"][1]["id"] == org_id
+    assert data["missing"] == [str(unknown)]
+
+    response = await async_client.post(
+        "/organizations/lookup",
+        headers=auth_headers,
+        json={"ids": [org_id, str(unknown), org_id]},
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert [item and item["id"] for item in data["items"]] == [org_id, None, org_id]
+    assert data["missing"] == [str(unknown)]
+
+    response = await async_client.get(
+        "/organizations/", headers=auth_headers, params={"ids": "not-a-uuid"}
+    )
+    assert response.status_code == 400
+
+
+# Проверяем выбор полей (fields=) и связей (include=) ответа
+async def test_get_organization_sparse_fields(
+    async_client: AsyncClient, auth_headers: dict, async_organization_orm: Organization
+):
+    url = f"/organizations/{async_organization_orm.id}"
+    response = await async_client.get(
+        url, headers=auth_headers, params={"fields": "id,name"}
+    )
+    assert response.status_code == 200
+    assert response.json() == {
+        "name": async_organization_orm.name,
+        "id": str(async_organization_orm.id),
+    }
+
+    # Поле связи подключает её без include=
+    response = await async_client.get(
+        url,
+        headers=auth_headers,
+        params={"fields": "id,building.latitude,building.longitude"},
+    )
+    assert response.json() == {
+        "id": str(async_organization_orm.id),
+        "building": {
+            "latitude": async_organization_orm.building.latitude,
+            "longitude": async_organization_orm.building.longitude,
+        },
+    }
+
+    response = await async_client.get(
+        url, headers=auth_headers, params={"include": "activities"}
+    )
+    assert list(response.json()) == ["name", "id", "activities"]
+    assert response.json()["activities"][0]["id"] == str(
+        async_organization_orm.activities[0].id
+    )
+
+    response = await async_client.get(
+        "/organizations/",
+        headers=auth_headers,
+        params={"fields": "id", "include": "phones"},
+    )
+    assert response.status_code == 200
+    assert all(list(item) == ["id", "phones"] for item in response.json()["items"])
+
+    for params in ({"fields": "address"}, {"include": "owner"}, {"fields": "phones.x"}):
+        response = await async_client.get(url, headers=auth_headers, params=params)
+        assert response.status_code == 400
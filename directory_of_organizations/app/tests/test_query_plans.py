@@ -0,0 +1,346 @@
+import random
+import re
+import uuid
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.spatial_index import building_index
+from app.crud import activity as activity_crud
+from app.crud import building as building_crud
+from app.crud import organization as org_crud
+from app.crud.organization import insert_rows
+from app.models.activity import Activity
+from app.models.association_tables import activity_closure, organization_activities
+from app.models.building import Building
+from app.models.organization import Organization
+from app.models.phone import OrganizationPhone
+from app.schemas.utils import BoundingBox
+from app.utils import FieldSelection, cell_key
+
+# Таблицы, которые растут вместе со справочником: полный просмотр любой
+# из них - регрессия. Дерево деятельностей мало и читается целиком
+LARGE_TABLES = {
+    "organizations",
+    "organization_phones",
+    "organization_activities",
+    "buildings",
+    "activity_closure",
+    "activity_building_counts",
+    "activity_cell_counts",
+}
+
+ORGANIZATIONS = FieldSelection(
+    list(org_crud.ORGANIZATION_COLUMNS), org_crud.ORGANIZATION_RELATIONS
+)
+BUILDINGS = FieldSelection(list(building_crud.BUILDING_COLUMNS), {})
+ACTIVITIES = FieldSelection(list(activity_crud.ACTIVITY_COLUMNS), {})
+CENTER = (55.75, 37.62)
+
+
+async def seed(session: AsyncSession) -> SimpleNamespace:
+    """
+    Справочник на несколько тысяч организаций: здания вокруг центра,
+    дерево деятельностей из двух уровней с замыканием, телефоны и связи.
+    """
+    rng = random.Random(0)
+    now = datetime.now()
+
+    def row(**values) -> dict:
+        return {"id": uuid.uuid4(), "created_at": now, "modified_at": now, **values}
+
+    buildings = []
+    for i in range(500):
+        latitude = CENTER[0] + rng.uniform(-0.2, 0.2)
+        longitude = CENTER[1] + rng.uniform(-0.2, 0.2)
+        buildings.append(
+            row(
+                address=f"г. Москва, ул. Тестовая, д. {i}",
+                address_key=f"г москва ул тестовая д {i}",
+                latitude=latitude,
+                longitude=longitude,
+                cell_key=cell_key(latitude, longitude),
+            )
+        )
+    activities, closure = [], []
+    for i in range(5):
+        root = row(name=f"Корень {i}", parent_id=None)
+        activities.append(root)
+        closure.append({"ancestor_id": root["id"], "descendant_id": root["id"], "depth": 0})
+        for j in range(4):
+            child = row(name=f"Деятельность {i}.{j}", parent_id=root["id"])
+            activities.append(child)
+            closure.extend(
+                [
+                    {"ancestor_id": child["id"], "descendant_id": child["id"], "depth": 0},
+                    {"ancestor_id": root["id"], "descendant_id": child["id"], "depth": 1},
+                ]
+            )
+    organizations, phones, links = [], [], []
+    for i in range(5000):
+        organization = row(
+            name=f"Организация {i}", building_id=rng.choice(buildings)["id"]
+        )
+        organizations.append(organization)
+        phones.extend(
+            row(phone=f"8-900-{i:07d}-{k}", organization_id=organization["id"])
+            for k in range(rng.randrange(3))
+        )
+        links.extend(
+            {"organization_id": organization["id"], "activity_id": activity["id"]}
+            for activity in rng.sample(activities, 2)
+        )
+
+    await insert_rows(session, Building.__table__, buildings)
+    await insert_rows(session, Activity.__table__, activities)
+    await insert_rows(session, activity_closure, closure)
+    await insert_rows(session, Organization.__table__, organizations)
+    await insert_rows(session, OrganizationPhone.__table__, phones)
+    await insert_rows(session, organization_activities, links)
+    await activity_crud.refresh_activity_counts(session)
+    await session.commit()
+    for table in LARGE_TABLES:
+        await session.execute(text(f"ANALYZE {table}"))
+    await session.commit()
+
+    return SimpleNamespace(
+        organization_ids=[o["id"] for o in organizations[:20]],
+        building_id=buildings[0]["id"],
+        root_activity_id=activities[0]["id"],
+        activity_id=activities[1]["id"],
+    )
+
+
+def box() -> BoundingBox:
+    return BoundingBox(
+        min_lat=CENTER[0] - 0.01,
+        max_lat=CENTER[0] + 0.01,
+        min_lon=CENTER[1] - 0.01,
+        max_lon=CENTER[1] + 0.01,
+    )
+
+
+async def drain(stream) -> list:
+    """
+    Дочитывает потоковую выдачу CRUD до конца.
+    """
+    return [batch async for batch in stream]
+
+
+# Запросы CRUD, планы которых проверяются: (сессия, данные набора) -> корутина
+QUERIES = {
+    "organization_read": lambda s, d: org_crud.get_organization_json(
+        s, d.organization_ids[0], ORGANIZATIONS
+    ),
+    "organizations_by_ids": lambda s, d: org_crud.get_organizations_json_by_ids(
+        s, d.organization_ids, ORGANIZATIONS
+    ),
+    "organizations_list": lambda s, d: org_crud.get_organizations_json(
+        s, 50, ORGANIZATIONS, after=d.organization_ids[0]
+    ),
+    "organizations_by_name_substring": lambda s, d: org_crud.get_organizations_json(
+        s, 50, ORGANIZATIONS, name_substring="Организация 4321"
+    ),
+    "organizations_stream": lambda s, d: drain(
+        org_crud.stream_organizations_json(
+            s, 1000, ORGANIZATIONS, after=d.organization_ids[0]
+        )
+    ),
+    "organizations_stream_by_name_substring": lambda s, d: drain(
+        org_crud.stream_organizations_json(
+            s, 1000, ORGANIZATIONS, name_substring="Организация 4321"
+        )
+    ),
+    "organizations_fuzzy_search": lambda s, d: (
+        org_crud.search_organizations_by_name_fuzzy_json(
+            s, "Организацея 4321", 50, ORGANIZATIONS
+        )
+    ),
+    "organizations_by_building": lambda s, d: org_crud.get_organizations_by_building_json(
+        s, d.building_id, 50, ORGANIZATIONS
+    ),
+    "organizations_by_activity": lambda s, d: org_crud.get_organizations_by_activity_json(
+        s, d.activity_id, 50, ORGANIZATIONS
+    ),
+    "organizations_by_activity_tree": lambda s, d: (
+        org_crud.get_organizations_by_activity_with_children_json(
+            s, d.root_activity_id, 50, ORGANIZATIONS
+        )
+    ),
+    "organizations_by_radius": lambda s, d: org_crud.get_organizations_by_radius_json(
+        s, *CENTER, 1.0, 50, ORGANIZATIONS
+    ),
+    "organizations_by_rectangle": lambda s, d: (
+        org_crud.get_organizations_by_rectangle_json(s, box(), 50, ORGANIZATIONS)
+    ),
+    "search_by_name_activity_radius": lambda s, d: org_crud.search_organizations_json(
+        s,
+        50,
+        ORGANIZATIONS,
+        name="Организация 1",
+        activity_id=d.root_activity_id,
+        latitude=CENTER[0],
+        longitude=CENTER[1],
+        radius_km=1.0,
+    ),
+    "search_by_activity_rectangle": lambda s, d: org_crud.search_organizations_json(
+        s, 50, ORGANIZATIONS, activity_id=d.activity_id, box=box()
+    ),
+    "search_by_name_building": lambda s, d: org_crud.search_organizations_json(
+        s, 50, ORGANIZATIONS, name="Организация", building_id=d.building_id
+    ),
+    "organization_clusters": lambda s, d: org_crud.get_organization_clusters(
+        s, box(), 14
+    ),
+    "organization_clusters_by_activity": lambda s, d: (
+        org_crud.get_organization_clusters(s, box(), 14, activity_id=d.root_activity_id)
+    ),
+    "activity_facets_by_building": lambda s, d: activity_crud.get_activity_facets(
+        s, [d.building_id]
+    ),
+    # Область шире box(): в покрытии и целые ячейки, и полоса у границы
+    "activity_facets_by_rectangle": lambda s, d: activity_crud.get_activity_facets(
+        s,
+        box=BoundingBox(
+            min_lat=CENTER[0] - 0.1,
+            max_lat=CENTER[0] + 0.1,
+            min_lon=CENTER[1] - 0.1,
+            max_lon=CENTER[1] + 0.1,
+        ),
+    ),
+    "building_read": lambda s, d: building_crud.get_building_json(
+        s, d.building_id, BUILDINGS
+    ),
+    "buildings_list": lambda s, d: building_crud.get_buildings_json(s, 50, BUILDINGS),
+    "buildings_stream": lambda s, d: drain(
+        building_crud.stream_buildings_json(s, 100, BUILDINGS)
+    ),
+    "activity_read": lambda s, d: activity_crud.get_activity_json(
+        s, d.activity_id, ACTIVITIES
+    ),
+    "activity_depth": lambda s, d: activity_crud.get_activity_depth(s, d.activity_id),
+    "activity_subtree_height": lambda s, d: activity_crud.get_subtree_height(
+        s, d.root_activity_id
+    ),
+}
+
+# Поиск подстроки в названии идёт по триграммному индексу (pg_trgm):
+# без расширения эти запросы не проверяются
+TRIGRAM_QUERIES = {
+    "organizations_by_name_substring",
+    "organizations_stream_by_name_substring",
+    "organizations_fuzzy_search",
+}
+# Индекс миграции b2d6f8a4c1e9: тестовая база создаётся без миграций
+TRIGRAM_INDEX_SQL = """
+CREATE INDEX ix_organizations_name_trgm ON organizations
+USING gist (name gist_trgm_ops)
+"""
+
+
+# Первый столбец каждого индекса крупных таблиц
+LEADING_COLUMNS_SQL = """
+SELECT index.relname, attribute.attname
+FROM pg_index
+JOIN pg_class index ON index.oid = pg_index.indexrelid
+JOIN pg_class tbl ON tbl.oid = pg_index.indrelid
+JOIN pg_attribute attribute
+    ON attribute.attrelid = pg_index.indrelid
+    AND attribute.attnum = pg_index.indkey[0]
+WHERE tbl.relname = ANY($1)
+"""
+
+
+def full_scans(plan: dict, leading_columns: dict[str, str]) -> list[str]:
+    """
+    Узлы плана, читающие крупную таблицу или её индекс целиком: Seq Scan,
+    обход индекса ради порядка строк с фильтром по всей таблице и условие
+    не по первому столбцу индекса (просмотр всего индекса).
+    """
+    found = []
+    node = plan["Node Type"]
+    if plan.get("Relation Name") in LARGE_TABLES and (
+        node == "Seq Scan"
+        or ("Filter" in plan and not {"Index Cond", "Recheck Cond"} & plan.keys())
+    ):
+        found.append(f"{node} on {plan['Relation Name']}")
+    condition = plan.get("Index Cond")
+    leading = leading_columns.get(plan.get("Index Name"))
+    if condition and leading and not re.search(rf"\b{leading}\b", condition):
+        found.append(f"{node} using {plan['Index Name']}: {condition}")
+    for child in plan.get("Plans", []):
+        found.extend(full_scans(child, leading_columns))
+    return found
+
+
+async def check_query_plan(session: AsyncSession, name: str) -> None:
+    """
+    Выполняет запрос QUERIES[name] на наборе seed и проверяет планы
+    всех его SQL-команд на полные просмотры крупных таблиц.
+    """
+    data = await seed(session)
+    # Первая загрузка индекса зданий - законный полный просмотр,
+    # проверяется инкрементальное обновление
+    await building_index.refresh()
+
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    sync_engine = session.bind.sync_engine
+    event.listen(sync_engine, "before_cursor_execute", capture)
+    try:
+        await QUERIES[name](session, data)
+    finally:
+        event.remove(sync_engine, "before_cursor_execute", capture)
+    assert statements
+
+    connection = await session.connection()
+    await connection.execute(text("SET LOCAL enable_seqscan = off"))
+    driver = (await connection.get_raw_connection()).driver_connection
+    leading_columns = dict(await driver.fetch(LEADING_COLUMNS_SQL, list(LARGE_TABLES)))
+    for statement, parameters in statements:
+        # Кодек json соединения SQLAlchemy уже разбирает ответ EXPLAIN
+        explain = await driver.fetchval(
+            f"EXPLAIN (FORMAT JSON) {statement}", *(parameters or ())
+        )
+        plan = explain[0]["Plan"]
+        assert not full_scans(plan, leading_columns), statement
+
+
+# Проверяем, что запросы CRUD не читают крупные таблицы целиком.
+# На наборе в тысячи строк планировщик вправе предпочесть seq scan индексу,
+# поэтому он выключен: полный просмотр в плане остаётся, только если
+# подходящего индекса нет. Радиус и прямоугольник - с пространственным
+# индексом воркера и без него (отбор зданий в БД), так же и поиск с областью
+@pytest.mark.parametrize(
+    "name, spatial_index",
+    [(name, True) for name in QUERIES if name not in TRIGRAM_QUERIES]
+    + [
+        (name, False)
+        for name in (
+            "organizations_by_radius",
+            "organizations_by_rectangle",
+            "search_by_name_activity_radius",
+            "search_by_activity_rectangle",
+        )
+    ],
+)
+async def test_query_plans_use_indexes(
+    async_db: AsyncSession, monkeypatch, name: str, spatial_index: bool
+):
+    monkeypatch.setattr(settings.service, "SPATIAL_INDEX_ENABLED", spatial_index)
+    await check_query_plan(async_db, name)
+
+
+# Проверяем поиск подстроки в названии: идёт по триграммному индексу
+@pytest.mark.usefixtures("pg_trgm")
+@pytest.mark.parametrize("name", sorted(TRIGRAM_QUERIES))
+async def test_trigram_query_plans_use_indexes(async_db: AsyncSession, name: str):
+    await async_db.execute(text(TRIGRAM_INDEX_SQL))
+    await check_query_plan(async_db, name)
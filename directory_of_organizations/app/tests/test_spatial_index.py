@@ -0,0 +1,253 @@
+import asyncio
+import math
+import random
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import insert, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.spatial_index import BuildingGridIndex, building_index, haversine_km
+from app.models.building import Building
+from app.schemas.utils import BoundingBox
+from app.utils import (
+    CELL_KEY_ZOOM,
+    COUNT_CELL_ZOOM,
+    EARTH_RADIUS_KM,
+    cell_key,
+    cover_box,
+    get_bounding_box_area,
+    quadkey,
+    tile_xy,
+)
+
+
+@pytest.fixture
+def index() -> BuildingGridIndex:
+    return BuildingGridIndex(cell_deg=0.01, refresh_seconds=0)
+
+
+# Проверяем поиск зданий в прямоугольнике, в т.ч. на границах ячеек
+def test_search_box(index: BuildingGridIndex):
+    inside, edge, outside = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    index.add(inside, 55.755, 37.615)
+    index.add(edge, 55.76, 37.62)
+    index.add(outside, 55.80, 37.615)
+
+    box = BoundingBox(min_lat=55.75, max_lat=55.76, min_lon=37.61, max_lon=37.62)
+    assert set(index.search_box(box)) == {inside, edge}
+
+
+# Проверяем, что поиск в радиусе точный и отсортирован по расстоянию
+def test_search_radius(index: BuildingGridIndex):
+    near, nearest, corner = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    index.add(near, 55.7555, 37.6184)
+    index.add(nearest, 55.7513, 37.6184)
+    # Угол ограничивающего прямоугольника для радиуса 1 км
+    index.add(corner, 55.7512 + 0.0085, 37.6184 + 0.0151)
+
+    found = index.search_radius(55.7512, 37.6184, 1.0)
+    assert [bid for bid, _ in found] == [nearest, near]
+    assert found[1][1] == pytest.approx(haversine_km(55.7512, 37.6184, 55.7555, 37.6184))
+
+
+# Проверяем ограничивающий прямоугольник круга: точки круга на любом азимуте
+# внутри него, крайняя долгота достигается, у полюса и антимеридиана тоже
+@pytest.mark.parametrize(
+    "latitude, longitude, radius_km",
+    [
+        (55.75, 37.62, 1.0),
+        (70.0, 0.0, 1500.0),
+        (-60.0, 179.5, 200.0),
+        (89.0, 10.0, 500.0),
+        (0.0, -180.0, 50.0),
+    ],
+)
+def test_bounding_box(latitude: float, longitude: float, radius_km: float):
+    box = get_bounding_box_area(latitude, longitude, radius_km)
+    index = BuildingGridIndex(cell_deg=1.0, refresh_seconds=0)
+    # Чуть меньше радиуса: точки на самой границе решает округление
+    distance = radius_km / EARTH_RADIUS_KM * (1 - 1e-9)
+    farthest_lon = 0.0
+    for bearing in range(0, 360, 2):
+        # Точка на расстоянии distance по азимуту bearing
+        lat1, theta = math.radians(latitude), math.radians(bearing)
+        lat2 = math.asin(
+            math.sin(lat1) * math.cos(distance)
+            + math.cos(lat1) * math.sin(distance) * math.cos(theta)
+        )
+        lon_delta = math.atan2(
+            math.sin(theta) * math.sin(distance) * math.cos(lat1),
+            math.cos(distance) - math.sin(lat1) * math.sin(lat2),
+        )
+        farthest_lon = max(farthest_lon, abs(math.degrees(lon_delta)))
+        lon2 = (longitude + math.degrees(lon_delta) + 540.0) % 360.0 - 180.0
+        index.add(uuid.uuid4(), math.degrees(lat2), lon2)
+    assert len(index.search_box(box)) == len(index)
+
+    if box.min_lon == -180.0 and box.max_lon == 180.0:
+        assert max(abs(box.min_lat), abs(box.max_lat)) == 90.0
+    else:
+        width = (box.max_lon - box.min_lon) % 360.0
+        assert width / 2 == pytest.approx(farthest_lon, abs=0.01)
+        assert (box.min_lon > box.max_lon) == (abs(longitude) + farthest_lon > 180.0)
+
+
+# Проверяем поиск в радиусе через антимеридиан и радиус больше Земли
+def test_search_radius_antimeridian(index: BuildingGridIndex):
+    east, west = uuid.uuid4(), uuid.uuid4()
+    index.add(east, -17.0, 179.99)
+    index.add(west, -17.0, -179.99)
+
+    assert [bid for bid, _ in index.search_radius(-17.0, 179.995, 5.0)] == [east, west]
+    assert len(index.search_radius(60.0, 0.0, 100_000.0)) == 2
+
+
+# Проверяем перенос здания в другие координаты
+def test_move_building(index: BuildingGridIndex):
+    building_id = uuid.uuid4()
+    index.add(building_id, 10.0, 10.0)
+    index.add(building_id, 20.0, 20.0)
+
+    assert len(index) == 1
+    assert index.search_radius(10.0, 10.0, 5.0) == []
+    assert [bid for bid, _ in index.search_radius(20.0, 20.0, 5.0)] == [building_id]
+
+
+# Проверяем, что здание с нечисловыми координатами пропускается и убирает
+# прежнюю позицию, не ломая поиск по остальным
+def test_add_skips_non_finite(index: BuildingGridIndex):
+    good, bad = uuid.uuid4(), uuid.uuid4()
+    index.add(good, 10.0, 10.0)
+    index.add(bad, 10.0, 10.0)
+    index.add(bad, math.nan, 10.0)
+    index.add(uuid.uuid4(), 10.0, math.inf)
+
+    assert len(index) == 1
+    assert [bid for bid, _ in index.search_radius(10.0, 10.0, 5.0)] == [good]
+    assert index.search_box(BoundingBox(min_lat=9.0, max_lat=11.0, min_lon=9.0, max_lon=11.0)) == [good]
+
+
+# Проверяем, что строка с NaN в базе не мешает обновлению индекса
+async def test_refresh_skips_non_finite(async_db: AsyncSession):
+    async_db.add(Building(address="good", latitude=10.0, longitude=10.0))
+    # Вставка в обход ORM: так же попадают строки из импорта и ручных правок
+    await async_db.execute(
+        insert(Building).values(
+            address="bad",
+            address_key="bad",
+            latitude=math.nan,
+            longitude=10.0,
+            cell_key=0,
+        )
+    )
+    await async_db.commit()
+
+    await building_index.refresh()
+    assert len(building_index) == 1
+    assert len(building_index.search_radius(10.0, 10.0, 1.0)) == 1
+
+
+# Проверяем инкрементальное обновление: здание из транзакции, начатой до
+# обновления и закоммиченной после него, попадает в индекс, даже если его
+# modified_at давно в прошлом
+async def test_refresh_picks_up_late_commits(async_db: AsyncSession):
+    async_db.add(Building(address="first", latitude=10.0, longitude=10.0))
+    await async_db.commit()
+    async with building_index.session_factory() as writer:
+        late = Building(address="late", latitude=20.0, longitude=20.0)
+        writer.add(late)
+        await writer.flush()
+        # Время ставит приложение: оно могло отстать от часов других воркеров
+        await writer.execute(
+            update(Building)
+            .where(Building.id == late.id)
+            .values(modified_at=datetime.now() - timedelta(hours=1))
+        )
+
+        await building_index.refresh()
+        assert len(building_index) == 1
+        await writer.commit()
+
+    await building_index.refresh()
+    assert [bid for bid, _ in building_index.search_radius(20.0, 20.0, 1.0)] == [late.id]
+
+
+# Проверяем, что одновременные запросы к устаревшему индексу обновляют его один раз
+async def test_ensure_fresh_refreshes_once(async_db: AsyncSession, monkeypatch):
+    await building_index.refresh()
+    monkeypatch.setattr(building_index, "refresh_seconds", 60)
+    monkeypatch.setattr(building_index, "_refreshed_at", 0.0)
+    refreshes = 0
+    refresh = building_index._refresh
+
+    async def counting_refresh():
+        nonlocal refreshes
+        refreshes += 1
+        await refresh()
+
+    monkeypatch.setattr(building_index, "_refresh", counting_refresh)
+    await asyncio.gather(*(building_index.ensure_fresh() for _ in range(5)))
+    assert refreshes == 1
+
+
+# Проверяем ключ ячейки карты: quadkey тайла и вложенность уровней
+def test_cell_key():
+    # Пример из описания схемы тайлов Bing Maps: тайл (3, 5) уровня 3 - "213"
+    latitude, longitude = -50.0, -20.0
+    assert tile_xy(latitude, longitude, 3) == (3, 5)
+    key = cell_key(latitude, longitude)
+    assert quadkey(key >> 2 * (CELL_KEY_ZOOM - 3), 3) == "213"
+
+    full = quadkey(key, CELL_KEY_ZOOM)
+    for zoom in (0, 1, 10, 20):
+        assert quadkey(key >> 2 * (CELL_KEY_ZOOM - zoom), zoom) == full[:zoom]
+    # Широты за пределами проекции прижимаются к краю карты
+    assert tile_xy(89.9, 0.0, 2) == (2, 0)
+    assert tile_xy(-89.9, 180.0, 2) == (3, 3)
+    # Нечисловые координаты не прижимаются к краю, а отклоняются
+    for latitude, longitude in ((math.nan, 0.0), (0.0, math.inf), (-math.inf, 0.0)):
+        with pytest.raises(ValueError):
+            cell_key(latitude, longitude)
+
+
+# Проверяем покрытие прямоугольника ячейками: каждая точка внутри учтена
+# ровно один раз - целой ячейкой или диапазоном у границы, точки снаружи
+# в ячейки не попадают
+@pytest.mark.parametrize(
+    "box",
+    [
+        BoundingBox(min_lat=55.69, max_lat=55.71, min_lon=37.69, max_lon=37.71),
+        BoundingBox(min_lat=55.5, max_lat=56.0, min_lon=37.3, max_lon=37.9),
+        BoundingBox(min_lat=-10.0, max_lat=60.0, min_lon=170.0, max_lon=180.0),
+        BoundingBox(min_lat=-90.0, max_lat=90.0, min_lon=-180.0, max_lon=180.0),
+    ],
+)
+def test_cover_box(box: BoundingBox):
+    inside, ranges = cover_box(box, COUNT_CELL_ZOOM, 64)
+    assert len(ranges) <= 64
+    assert all(zoom <= COUNT_CELL_ZOOM for zoom, _ in inside)
+
+    rng = random.Random(0)
+    height, width = box.max_lat - box.min_lat, box.max_lon - box.min_lon
+    points = [(box.min_lat, box.min_lon), (box.max_lat, box.max_lon)]
+    for _ in range(2000):
+        points.append(
+            (
+                min(90.0, max(-90.0, rng.uniform(-0.1, 1.1) * height + box.min_lat)),
+                min(180.0, max(-180.0, rng.uniform(-0.1, 1.1) * width + box.min_lon)),
+            )
+        )
+    for latitude, longitude in points:
+        key = cell_key(latitude, longitude)
+        in_cells = sum(
+            key >> 2 * (CELL_KEY_ZOOM - zoom) == cell for zoom, cell in inside
+        )
+        in_ranges = any(low <= key < high for low, high in ranges)
+        in_box = (
+            box.min_lat <= latitude <= box.max_lat
+            and box.min_lon <= longitude <= box.max_lon
+        )
+        assert in_cells + (in_ranges and in_box) == in_box
+        assert not (in_cells and in_ranges)
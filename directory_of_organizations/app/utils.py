@@ -1,7 +1,57 @@
-from math import cos, radians
+import base64
+import json
+import re
+import uuid
+from math import (
+    asin,
+    asinh,
+    atan,
+    cos,
+    degrees,
+    isfinite,
+    pi,
+    radians,
+    sin,
+    sinh,
+    tan,
+)
+from typing import Mapping, Sequence
+
+from sqlalchemy import (
+    ARRAY,
+    JSON,
+    ColumnElement,
+    Float,
+    Select,
+    Table,
+    Text,
+    case,
+    cast,
+    func,
+    literal,
+    literal_column,
+    select,
+    type_coerce,
+)
 
 from app.schemas.utils import BoundingBox
 
+# Средний радиус Земли
+EARTH_RADIUS_KM = 6371.0
+# Половина большого круга: круг большего радиуса покрывает всю сферу
+MAX_RADIUS_KM = pi * EARTH_RADIUS_KM
+# Уровень сетки тайлов карты, ячейка которого хранится у здания (cell_key).
+# Ячейка любого более крупного уровня - старшие разряды ключа
+CELL_KEY_ZOOM = 24
+# Предел широты в проекции Web Mercator
+MERCATOR_MAX_LAT = 85.05112878
+# Самый мелкий уровень ячеек, по которым хранятся счётчики организаций
+# (app.models.association_tables.activity_cell_counts), ~600 м у экватора
+COUNT_CELL_ZOOM = 16
+# Запас в градусах при сравнении границ тайла с прямоугольником: границы,
+# пересчитанные из номера тайла, расходятся с tile_xy на ошибку округления
+TILE_EPSILON = 1e-9
+
 
 def get_bounding_box_area(
     latitude: float,
@@ -10,18 +60,359 @@ def get_bounding_box_area(
 ) -> BoundingBox:
     """
     Высчитывает координаты ограничивающего прямоугольника для круга с заданным радиусом.
-    Возвращает BoundingBox.
+    Возвращает BoundingBox. Круг, содержащий полюс, занимает все долготы;
+    прямоугольник, пересекающий антимеридиан, получает min_lon > max_lon.
     """
     if radius_km <= 0:
         raise ValueError("Radius must be > 0")
 
-    lat_delta = radius_km / 111
-    lon_delta = radius_km / (111 * cos(radians(latitude)))
+    # Угловой радиус круга
+    distance = min(radius_km, MAX_RADIUS_KM) / EARTH_RADIUS_KM
+    lat_delta = degrees(distance)
+    min_lat, max_lat = latitude - lat_delta, latitude + lat_delta
+    if min_lat <= -90.0 or max_lat >= 90.0:
+        return BoundingBox(
+            min_lon=-180.0,
+            min_lat=max(min_lat, -90.0),
+            max_lon=180.0,
+            max_lat=min(max_lat, 90.0),
+        )
+
+    # Крайние долготы круга - точки касания меридианов, а не его
+    # пересечения с параллелью центра. Без полюса sin(distance) < cos(lat)
+    lon_delta = degrees(asin(sin(distance) / cos(radians(latitude))))
+    min_lon, max_lon = longitude - lon_delta, longitude + lon_delta
+    if min_lon < -180.0:
+        min_lon += 360.0
+    if max_lon > 180.0:
+        max_lon -= 360.0
 
     box = BoundingBox(
-        min_lon=longitude - lon_delta,
-        min_lat=latitude - lat_delta,
-        max_lon=longitude + lon_delta,
-        max_lat=latitude + lat_delta,
+        min_lon=min_lon,
+        min_lat=min_lat,
+        max_lon=max_lon,
+        max_lat=max_lat,
+    )
+    return box
+
+
+def split_antimeridian(box: BoundingBox) -> list[BoundingBox]:
+    """
+    Прямоугольник, пересекающий антимеридиан (min_lon > max_lon), - двумя
+    прямоугольниками по обе стороны от него, остальные - как есть.
+    """
+    if box.min_lon <= box.max_lon:
+        return [box]
+    return [
+        box.model_copy(update={"max_lon": 180.0}),
+        box.model_copy(update={"min_lon": -180.0}),
+    ]
+
+
+def tile_xy(latitude: float, longitude: float, zoom: int) -> tuple[int, int]:
+    """
+    Номер тайла Web Mercator (x, y) уровня `zoom`, в котором лежит точка.
+    Широта за пределом проекции прижимается к краю карты; NaN и
+    бесконечность - ValueError: у такой точки нет тайла.
+    """
+    if not (isfinite(latitude) and isfinite(longitude)):
+        raise ValueError(f"Non-finite coordinates: ({latitude}, {longitude})")
+    n = 1 << zoom
+    latitude = max(-MERCATOR_MAX_LAT, min(MERCATOR_MAX_LAT, latitude))
+    x = int((longitude + 180.0) / 360.0 * n)
+    y = int((1.0 - asinh(tan(radians(latitude))) / pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tile_bounds(zoom: int, x: int, y: int) -> BoundingBox:
+    """
+    Границы тайла (x, y) уровня `zoom`. Крайние ряды тайлов продлены до
+    полюсов: tile_xy относит к ним точки за пределом широты проекции.
+    """
+    n = 1 << zoom
+
+    def latitude(row: int) -> float:
+        return degrees(atan(sinh(pi * (1.0 - 2.0 * row / n))))
+
+    return BoundingBox(
+        min_lat=-90.0 if y == n - 1 else latitude(y + 1),
+        max_lat=90.0 if y == 0 else latitude(y),
+        min_lon=x / n * 360.0 - 180.0,
+        max_lon=(x + 1) / n * 360.0 - 180.0,
+    )
+
+
+def _spread_bits(value: int) -> int:
+    # Разряды 32-битного числа через один: abcd -> 0a0b0c0d
+    value = (value | (value << 16)) & 0x0000FFFF0000FFFF
+    value = (value | (value << 8)) & 0x00FF00FF00FF00FF
+    value = (value | (value << 4)) & 0x0F0F0F0F0F0F0F0F
+    value = (value | (value << 2)) & 0x3333333333333333
+    return (value | (value << 1)) & 0x5555555555555555
+
+
+def cell_key(latitude: float, longitude: float) -> int:
+    """
+    Quadkey тайла уровня CELL_KEY_ZOOM с точкой, упакованный в целое:
+    разряды x и y чередуются, по два бита на уровень. Ячейка уровня z -
+    `cell_key >> 2 * (CELL_KEY_ZOOM - z)`.
+    """
+    x, y = tile_xy(latitude, longitude, CELL_KEY_ZOOM)
+    return _spread_bits(x) | (_spread_bits(y) << 1)
+
+
+def cell_key_range(zoom: int, cell: int) -> tuple[int, int]:
+    """
+    Диапазон [lo, hi) cell_key зданий в ячейке `cell` уровня `zoom`.
+    """
+    shift = 2 * (CELL_KEY_ZOOM - zoom)
+    return cell << shift, (cell + 1) << shift
+
+
+def _tile_relation(box: BoundingBox, tile: BoundingBox) -> int:
+    # 1 - тайл целиком в прямоугольнике, 0 - пересекает его границу,
+    # -1 - не пересекается с ним
+    if (
+        tile.max_lat < box.min_lat - TILE_EPSILON
+        or tile.min_lat > box.max_lat + TILE_EPSILON
+        or tile.max_lon < box.min_lon - TILE_EPSILON
+        or tile.min_lon > box.max_lon + TILE_EPSILON
+    ):
+        return -1
+
+    def within(low: float, high: float, tile_low: float, tile_high: float) -> bool:
+        # Граница мира совпадает точно, остальные - с запасом
+        return (tile_low == low or tile_low - TILE_EPSILON >= low) and (
+            tile_high == high or tile_high + TILE_EPSILON <= high
+        )
+
+    inside = within(box.min_lat, box.max_lat, tile.min_lat, tile.max_lat) and within(
+        box.min_lon, box.max_lon, tile.min_lon, tile.max_lon
+    )
+    return 1 if inside else 0
+
+
+def cover_box(
+    box: BoundingBox, max_zoom: int, max_ranges: int
+) -> tuple[list[tuple[int, int]], list[tuple[int, int]]]:
+    """
+    Покрытие прямоугольника ячейками сетки тайлов. Возвращает ячейки
+    (zoom, cell) не мельче `max_zoom`, целиком лежащие в прямоугольнике,
+    и диапазоны [lo, hi) cell_key зданий, которые надо проверить по
+    координатам: ячейки на границе прямоугольника и целые ячейки мельче
+    `max_zoom`. Граница дробится, пока диапазонов не больше `max_ranges`.
+    """
+    relation = _tile_relation(box, tile_bounds(0, 0, 0))
+    if relation == 1:
+        return [(0, 0)], []
+    inside: list[tuple[int, int]] = []
+    ranges: list[tuple[int, int]] = []
+    zoom, boundary = 0, [(0, 0)]
+    while boundary and zoom < CELL_KEY_ZOOM:
+        split_inside, split_boundary = [], []
+        for x, y in boundary:
+            for child in (
+                (2 * x, 2 * y),
+                (2 * x + 1, 2 * y),
+                (2 * x, 2 * y + 1),
+                (2 * x + 1, 2 * y + 1),
+            ):
+                relation = _tile_relation(box, tile_bounds(zoom + 1, *child))
+                if relation == 1:
+                    split_inside.append(child)
+                elif relation == 0:
+                    split_boundary.append(child)
+        deep = zoom + 1 > max_zoom
+        added = len(split_boundary) + (len(split_inside) if deep else 0)
+        if len(ranges) + added > max_ranges:
+            break
+        zoom, boundary = zoom + 1, split_boundary
+        cells = [_spread_bits(x) | (_spread_bits(y) << 1) for x, y in split_inside]
+        if deep:
+            ranges.extend(cell_key_range(zoom, cell) for cell in cells)
+        else:
+            inside.extend((zoom, cell) for cell in cells)
+    for x, y in boundary:
+        ranges.append(cell_key_range(zoom, _spread_bits(x) | (_spread_bits(y) << 1)))
+
+    # Соседние диапазоны склеиваются
+    merged: list[tuple[int, int]] = []
+    for lo, hi in sorted(ranges):
+        if merged and merged[-1][1] == lo:
+            merged[-1] = (merged[-1][0], hi)
+        else:
+            merged.append((lo, hi))
+    return inside, merged
+
+
+def quadkey(cell: int, zoom: int) -> str:
+    """
+    Строковый quadkey ячейки уровня `zoom` (по цифре 0-3 на уровень).
+    """
+    return "".join(str((cell >> 2 * (zoom - 1 - i)) & 3) for i in range(zoom))
+
+
+def encode_cursor(*key) -> str:
+    """
+    Кодирует ключ сортировки последней записи страницы в непрозрачный курсор.
+    """
+    payload = json.dumps([str(v) if isinstance(v, uuid.UUID) else v for v in key])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, types: tuple[type, ...]) -> tuple:
+    """
+    Декодирует курсор обратно в ключ сортировки, приводя значения к `types`.
+    Бросает ValueError, если курсор повреждён.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(values, list) or len(values) != len(types):
+        raise ValueError("Invalid cursor")
+    try:
+        return tuple(t(v) for t, v in zip(types, values))
+    except (ValueError, TypeError, AttributeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def normalize_address(address: str) -> str:
+    """
+    Ключ адреса для поиска дублей: регистр, "ё", знаки препинания
+    и лишние пробелы не учитываются.
+    """
+    return re.sub(r"[\W_]+", " ", address.casefold().replace("ё", "е")).strip()
+
+
+def unnest_rows(table: Table, rows: list[dict]) -> Select:
+    """
+    SELECT строк из unnest(массив на каждую колонку) для INSERT ... SELECT.
+    Текст запроса и число параметров не зависят от числа строк, поэтому запрос
+    не перекомпилируется и не упирается в предел параметров Postgres.
+    """
+    names = list(rows[0])
+    columns = (
+        func.unnest(
+            *(
+                literal([row[name] for row in rows], ARRAY(table.c[name].type))
+                for name in names
+            )
+        )
+        .table_valued(*names)
+        .render_derived(name="rows")
+    )
+    return select(*columns.c)
+
+
+def json_value(value: ColumnElement) -> ColumnElement[str]:
+    """
+    Текст JSON-значения в том виде, в каком его пишет json.dumps ответов API.
+    Postgres пишет float8 без дробной части как целое (37), json.dumps - 37.0;
+    остальные числа и экранирование строк у них совпадают.
+    """
+    if isinstance(value.type, JSON):
+        text = cast(value, Text)
+    elif isinstance(value.type, Float):
+        text = cast(value, Text)
+        text = case((text.op("~")("^-?[0-9]+$"), text.concat(".0")), else_=text)
+    else:
+        text = cast(func.to_json(value), Text)
+    return func.coalesce(text, literal_column("'null'"))
+
+
+def json_object(**fields: ColumnElement) -> ColumnElement:
+    """
+    JSON-объект с ключами в порядке аргументов. Собирается текстом в формате
+    json.dumps(separators=(",", ":")): json_build_object ставит пробелы
+    вокруг ":" и после ",".
+    """
+    if not fields:
+        return type_coerce(literal_column("'{}'"), JSON)
+    parts = []
+    for key, value in fields.items():
+        prefix = "," if parts else "{"
+        parts.extend((literal_column(f"'{prefix}\"{key}\":'"), json_value(value)))
+    return type_coerce(func.concat(*parts, literal_column("'}'")), JSON)
+
+
+def json_agg(element: ColumnElement) -> ColumnElement[str]:
+    """
+    Агрегат элементов JSON через запятую - выборка для json_array.
+    """
+    return func.string_agg(cast(element, Text), literal_column("','"))
+
+
+def json_array(query: Select) -> ColumnElement:
+    """
+    Массив JSON из коррелированного подзапроса с json_agg, [] если строк нет.
+    """
+    return type_coerce(
+        func.concat(
+            literal_column("'['"),
+            query.scalar_subquery(),
+            literal_column("']'"),
+        ),
+        JSON,
     )
-    return box
\ No newline at end of file
+
+
+def split_names(value: str | None) -> list[str]:
+    """
+    Имена из параметра вида `a,b,c`; пустые элементы и пробелы отбрасываются.
+    """
+    return [name.strip() for name in (value or "").split(",") if name.strip()]
+
+
+class FieldSelection:
+    """
+    Поля ответа, выбранные параметрами `fields=` и `include=`.
+
+    `fields` - поля записи и поля связей через точку (`building.latitude`),
+    `include` - подключаемые связи. Без обоих параметров ответ полный.
+    Если переданы только поля связей, поля самой записи выбираются все;
+    связь без перечисленных полей отдаётся целиком. Упоминание поля связи
+    в `fields` подключает её без `include`.
+    Бросает ValueError для неизвестных полей и связей.
+    """
+
+    def __init__(
+        self,
+        fields: Sequence[str],
+        relations: Mapping[str, Sequence[str]],
+        requested: str | None = None,
+        include: str | None = None,
+    ):
+        self._fields = fields
+        self._relations = relations
+        self._requested = set(split_names(requested))
+        self._include = set(split_names(include))
+        for name in self._requested:
+            relation, _, field = name.partition(".")
+            allowed = relations.get(relation, ()) if field else fields
+            if (field or name) not in allowed:
+                raise ValueError(f"Unknown field: {name}")
+            if field:
+                self._include.add(relation)
+        for relation in self._include:
+            if relation not in relations:
+                raise ValueError(f"Unknown relation: {relation}")
+        self.full = requested is None and include is None
+
+    def fields(self, relation: str | None = None) -> list[str]:
+        """
+        Выбранные поля записи или связи `relation` в порядке схемы ответа.
+        """
+        if relation is None:
+            allowed, prefix = self._fields, ""
+        else:
+            allowed, prefix = self._relations[relation], f"{relation}."
+        picked = [name for name in allowed if prefix + name in self._requested]
+        return picked or list(allowed)
+
+    def includes(self, relation: str) -> bool:
+        """
+        Нужна ли связь в ответе (и, значит, в запросе).
+        """
+        return self.full or relation in self._include
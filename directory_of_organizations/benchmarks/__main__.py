@@ -0,0 +1,10 @@
+"""
+Нагрузочный прогон эндпоинтов API, см. benchmarks/load.py.
+
+    python -m benchmarks --help
+"""
+import asyncio
+
+from benchmarks.load import main, parse_args
+
+asyncio.run(main(parse_args()))
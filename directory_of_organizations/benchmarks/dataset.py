@@ -0,0 +1,323 @@
+"""
+Генератор синтетического набора данных для нагрузочных тестов и подбора
+индексов: города с кластерами зданий вокруг районов, дерево деятельностей
+из трёх уровней, неравномерное распределение организаций по зданиям
+и деятельностям, 0-4 телефона у организации.
+
+Данные детерминированы `--seed`: тот же seed и те же размеры дают те же
+id, адреса, координаты и связи. Загрузка идёт через COPY (бинарный протокол
+asyncpg) пачками по `--batch-size` организаций, память не зависит от объёма.
+
+    python -m benchmarks.dataset --organizations 2000000 --seed 1 --truncate
+
+`--truncate` очищает таблицы справочника перед загрузкой, без него набор
+добавляется к существующим данным (адреса зданий должны быть уникальны,
+поэтому повторная загрузка с тем же seed без очистки упадёт).
+"""
+import argparse
+import asyncio
+import bisect
+import itertools
+import random
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from math import cos, radians
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession, create_async_engine
+
+from app.core.config import settings
+from app.crud import activity as activity_crud
+from app.utils import cell_key, normalize_address
+
+# Город: центр, радиус застройки (км) и вес - доля организаций
+CITIES = [
+    ("Москва", 55.7558, 37.6173, 25.0, 40),
+    ("Санкт-Петербург", 59.9343, 30.3351, 18.0, 20),
+    ("Новосибирск", 55.0084, 82.9357, 12.0, 8),
+    ("Екатеринбург", 56.8389, 60.6057, 12.0, 8),
+    ("Казань", 55.7961, 49.1064, 10.0, 7),
+    ("Нижний Новгород", 56.3269, 44.0059, 10.0, 6),
+    ("Самара", 53.1959, 50.1002, 9.0, 6),
+    ("Владивосток", 43.1155, 131.8855, 7.0, 5),
+]
+STREETS = [
+    "Ленина", "Пушкина", "Гагарина", "Мира", "Советская", "Садовая", "Лесная",
+    "Школьная", "Набережная", "Молодёжная", "Заводская", "Центральная",
+    "Победы", "Кирова", "Чехова", "Горького", "Строителей", "Полевая",
+]
+STREET_TYPES = ["ул.", "пр.", "пер.", "б-р", "ш."]
+# Корни дерева деятельностей и слова для дочерних уровней
+ACTIVITY_ROOTS = [
+    "Еда", "Автомобили", "Медицина", "Образование", "Строительство",
+    "Торговля", "Услуги", "Развлечения", "Спорт", "Финансы",
+]
+ACTIVITY_WORDS = [
+    "Оптовая", "Розничная", "Производство", "Ремонт", "Доставка", "Прокат",
+    "Консультации", "Сервис", "Запчасти", "Аксессуары", "Импорт", "Экспорт",
+]
+ORG_FORMS = ["ООО", "ИП", "АО", "ПАО", "НКО"]
+ORG_WORDS = [
+    "Аптека", "Кафе", "Автосервис", "Пекарня", "Склад", "Магазин", "Клиника",
+    "Рога и Копыта", "Меридиан", "Север", "Вектор", "Гранит", "Радуга",
+    "Профи", "Лидер", "Альфа", "Технология", "Стройдвор", "Уют", "Экспресс",
+]
+# Распределение числа телефонов (0-4) и деятельностей (1-3) у организации
+PHONE_WEIGHTS = [5, 55, 25, 10, 5]
+ACTIVITY_COUNT_WEIGHTS = [60, 30, 10]
+
+
+def make_uuid(rng: random.Random) -> uuid.UUID:
+    return uuid.UUID(int=rng.getrandbits(128), version=4)
+
+
+def cumulative(weights: list[float]) -> list[float]:
+    return list(itertools.accumulate(weights))
+
+
+def pick(rng: random.Random, cum_weights: list[float]) -> int:
+    """
+    Индекс по накопленным весам: быстрее rng.choices на миллионах вызовов.
+    """
+    return bisect.bisect(cum_weights, rng.random() * cum_weights[-1])
+
+
+@dataclass
+class Dictionary:
+    """
+    Здания и деятельности набора с весами выбора для организаций.
+    """
+
+    building_ids: list[uuid.UUID]
+    building_weights: list[float]
+    activity_ids: list[uuid.UUID]
+    activity_weights: list[float]
+
+
+def generate_buildings(rng: random.Random, count: int, now: datetime) -> tuple[list, list]:
+    """
+    Здания по городам пропорционально весу. В городе застройка сгущается
+    вокруг районных центров (нормальное распределение), вес здания -
+    парето: немногие здания (бизнес-центры) вмещают много организаций.
+    """
+    rows, weights = [], []
+    city_weights = cumulative([c[4] for c in CITIES])
+    districts = {
+        name: [
+            (
+                lat + rng.gauss(0, radius_km / 3) / 111,
+                lon + rng.gauss(0, radius_km / 3) / (111 * cos(radians(lat))),
+            )
+            for _ in range(12)
+        ]
+        for name, lat, lon, radius_km, _ in CITIES
+    }
+    for number in range(count):
+        name, lat, lon, radius_km, _ = CITIES[pick(rng, city_weights)]
+        d_lat, d_lon = rng.choice(districts[name])
+        spread_km = radius_km / 10
+        street = f"{rng.choice(STREET_TYPES)} {rng.choice(STREETS)}"
+        # Номер здания в адресе сквозной - адреса уникальны
+        address = f"г. {name}, {street}, д. {number + 1}"
+        latitude = d_lat + rng.gauss(0, spread_km) / 111
+        longitude = d_lon + rng.gauss(0, spread_km) / (111 * cos(radians(d_lat)))
+        rows.append(
+            (
+                make_uuid(rng),
+                address,
+                normalize_address(address),
+                latitude,
+                longitude,
+                cell_key(latitude, longitude),
+                now,
+                now,
+            )
+        )
+        weights.append(rng.paretovariate(1.2))
+    return rows, weights
+
+
+def generate_activities(
+    rng: random.Random, now: datetime
+) -> tuple[list, list, list[float]]:
+    """
+    Дерево из трёх уровней с замыканием. Популярность деятельности -
+    закон Ципфа по случайной перестановке: частых деятельностей мало.
+    """
+    rows, closure = [], []
+
+    def add(name: str, ancestors: list[uuid.UUID]) -> uuid.UUID:
+        activity_id = make_uuid(rng)
+        rows.append(
+            (activity_id, name, ancestors[-1] if ancestors else None, now, now)
+        )
+        path = [*ancestors, activity_id]
+        closure.extend(
+            (ancestor, activity_id, len(path) - 1 - i) for i, ancestor in enumerate(path)
+        )
+        return activity_id
+
+    for root_name in ACTIVITY_ROOTS:
+        root = add(root_name, [])
+        for middle_word in rng.sample(ACTIVITY_WORDS, 4):
+            middle_name = f"{root_name}: {middle_word.lower()}"
+            middle = add(middle_name, [root])
+            for leaf_word in rng.sample(ACTIVITY_WORDS, 3):
+                add(f"{middle_name}, {leaf_word.lower()}", [root, middle])
+
+    ranks = list(range(1, len(rows) + 1))
+    rng.shuffle(ranks)
+    weights = [1 / rank**1.1 for rank in ranks]
+    return rows, closure, weights
+
+
+def generate_organizations(
+    rng: random.Random, dictionary: Dictionary, count: int, now: datetime
+) -> tuple[list, list, list]:
+    """
+    Пачка организаций с телефонами и связями с деятельностями.
+    """
+    building_cum = cumulative(dictionary.building_weights)
+    activity_cum = cumulative(dictionary.activity_weights)
+    phone_cum = cumulative(PHONE_WEIGHTS)
+    activity_count_cum = cumulative(ACTIVITY_COUNT_WEIGHTS)
+    orgs, phones, links = [], [], []
+    for _ in range(count):
+        org_id = make_uuid(rng)
+        name = f"{rng.choice(ORG_FORMS)} «{rng.choice(ORG_WORDS)} {rng.choice(ORG_WORDS)}»"
+        building_id = dictionary.building_ids[pick(rng, building_cum)]
+        orgs.append((org_id, name, building_id, now, now))
+        for _ in range(pick(rng, phone_cum)):
+            phone = f"8-9{rng.randrange(100):02d}-{rng.randrange(10**7):07d}"
+            phones.append((make_uuid(rng), phone, org_id, now, now))
+        activity_ids = {
+            dictionary.activity_ids[pick(rng, activity_cum)]
+            for _ in range(pick(rng, activity_count_cum) + 1)
+        }
+        links.extend((org_id, activity_id) for activity_id in activity_ids)
+    return orgs, phones, links
+
+
+async def copy_rows(
+    conn: AsyncConnection, table: str, columns: list[str], rows: list
+) -> None:
+    raw = await conn.get_raw_connection()
+    await raw.driver_connection.copy_records_to_table(
+        table, records=rows, columns=columns
+    )
+
+
+BUILDING_COLUMNS = [
+    "id",
+    "address",
+    "address_key",
+    "latitude",
+    "longitude",
+    "cell_key",
+    "created_at",
+    "modified_at",
+]
+ACTIVITY_COLUMNS = ["id", "name", "parent_id", "created_at", "modified_at"]
+CLOSURE_COLUMNS = ["ancestor_id", "descendant_id", "depth"]
+ORGANIZATION_COLUMNS = ["id", "name", "building_id", "created_at", "modified_at"]
+PHONE_COLUMNS = ["id", "phone", "organization_id", "created_at", "modified_at"]
+LINK_COLUMNS = ["organization_id", "activity_id"]
+
+TABLES = [
+    "activity_building_counts",
+    "activity_cell_counts",
+    "activity_counts",
+    "organization_activities",
+    "organization_phones",
+    "organizations",
+    "activity_closure",
+    "activities",
+    "buildings",
+]
+
+
+async def main(args: argparse.Namespace) -> None:
+    rng = random.Random(args.seed)
+    now = datetime.now()
+    buildings_count = args.buildings or max(args.organizations // 8, 1)
+    engine = create_async_engine(str(settings.MAIN_DATABASE_URI))
+    started = time.perf_counter()
+    try:
+        async with engine.begin() as conn:
+            if args.truncate:
+                await conn.execute(text(f"TRUNCATE {', '.join(TABLES)}"))
+
+            building_rows, building_weights = generate_buildings(
+                rng, buildings_count, now
+            )
+            await copy_rows(conn, "buildings", BUILDING_COLUMNS, building_rows)
+            activity_rows, closure_rows, activity_weights = generate_activities(rng, now)
+            await copy_rows(conn, "activities", ACTIVITY_COLUMNS, activity_rows)
+            await copy_rows(conn, "activity_closure", CLOSURE_COLUMNS, closure_rows)
+            print(
+                f"buildings {len(building_rows)}, activities {len(activity_rows)}"
+                f" ({time.perf_counter() - started:.1f}s)"
+            )
+
+            dictionary = Dictionary(
+                building_ids=[row[0] for row in building_rows],
+                building_weights=building_weights,
+                activity_ids=[row[0] for row in activity_rows],
+                activity_weights=activity_weights,
+            )
+            del building_rows
+            loaded = phones_total = links_total = 0
+            for batch_number, start in enumerate(
+                range(0, args.organizations, args.batch_size)
+            ):
+                # У каждой пачки свой генератор: состав пачки не зависит
+                # от размера соседних и от порядка их генерации
+                batch_rng = random.Random(f"{args.seed}:{batch_number}")
+                count = min(args.batch_size, args.organizations - start)
+                orgs, phones, links = generate_organizations(
+                    batch_rng, dictionary, count, now
+                )
+                await copy_rows(conn, "organizations", ORGANIZATION_COLUMNS, orgs)
+                await copy_rows(conn, "organization_phones", PHONE_COLUMNS, phones)
+                await copy_rows(conn, "organization_activities", LINK_COLUMNS, links)
+                loaded += len(orgs)
+                phones_total += len(phones)
+                links_total += len(links)
+                elapsed = time.perf_counter() - started
+                print(
+                    f"organizations {loaded}/{args.organizations}"
+                    f" ({loaded / elapsed:,.0f}/s)"
+                )
+            # COPY минует CRUD, счётчики по деятельностям пересчитываются целиком
+            await activity_crud.refresh_activity_counts(AsyncSession(bind=conn))
+            print(f"activity counts ({time.perf_counter() - started:.1f}s)")
+            # Статистика планировщика по свежим данным
+            await conn.execute(text(f"ANALYZE {', '.join(TABLES)}"))
+    finally:
+        await engine.dispose()
+    print(
+        f"done: {loaded} organizations, {phones_total} phones, {links_total} links"
+        f" in {time.perf_counter() - started:.1f}s"
+    )
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--organizations", type=int, default=1_000_000)
+    parser.add_argument(
+        "--buildings", type=int, help="по умолчанию - одно здание на 8 организаций"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=100_000)
+    parser.add_argument(
+        "--truncate", action="store_true", help="очистить таблицы перед загрузкой"
+    )
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,96 @@
+"""
+Кодирование ответа со списком организаций: стандартный JSONResponse
+против FastJSONResponse (класс ответа приложения по умолчанию).
+
+Замеряется то, что FastAPI делает после вызова эндпоинта: валидация по
+response_model, dump_python(mode="json") и рендер класса ответа, а
+отдельно - только рендер. Тела ответов сверяются побайтно.
+
+    python -m benchmarks.json_encoding --repeat 20
+"""
+import argparse
+import statistics
+import time
+import uuid
+
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from app.api.responses import FastJSONResponse
+from app.schemas.organization import OrganizationRead
+from app.schemas.pagination import Page
+
+SIZES = (1, 100, 10_000)
+
+RESPONSE_CLASSES = {"json": JSONResponse, "fast": FastJSONResponse}
+
+adapter = TypeAdapter(Page[OrganizationRead])
+
+
+def make_page(size: int) -> dict:
+    building = {
+        "id": uuid.uuid4(),
+        "address": "ул. Пушкина, д. 44",
+        "latitude": 55.751244,
+        "longitude": 37.618423,
+    }
+    activities = [
+        {"id": uuid.uuid4(), "name": name} for name in ("Еда", "Молочная продукция")
+    ]
+    return {
+        "items": [
+            {
+                "id": uuid.uuid4(),
+                "name": f"ООО Рога и Копыта {i}",
+                "building": building,
+                "phones": [
+                    {"id": uuid.uuid4(), "phone": "2-222-222"},
+                    {"id": uuid.uuid4(), "phone": "8-923-666-13-13"},
+                ],
+                "activities": activities,
+            }
+            for i in range(size)
+        ],
+        "next_cursor": None,
+    }
+
+
+def median_us(func, repeat: int) -> float:
+    func()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1e6)
+    return statistics.median(timings)
+
+
+def main(repeat: int) -> None:
+    for size in SIZES:
+        page = make_page(size)
+        content = adapter.dump_python(adapter.validate_python(page), mode="json")
+        bodies = {name: cls(content).body for name, cls in RESPONSE_CLASSES.items()}
+        assert len(set(bodies.values())) == 1, "response bodies differ"
+        for name, response_class in RESPONSE_CLASSES.items():
+
+            def full() -> bytes:
+                value = adapter.validate_python(page)
+                return response_class(adapter.dump_python(value, mode="json")).body
+
+            def render() -> bytes:
+                return response_class(content).body
+
+            total = median_us(full, repeat)
+            rendered = median_us(render, repeat)
+            print(
+                f"{size:6} orgs  {name:5} total {total:11.1f} us "
+                f"({total / size:7.2f} us/org)  render {rendered:11.1f} us "
+                f"({rendered / size:7.2f} us/org)"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    main(args.repeat)
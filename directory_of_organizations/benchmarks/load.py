@@ -0,0 +1,511 @@
+"""
+Нагрузочный прогон всех эндпоинтов API: каждый сценарий отправляет
+`--requests` запросов в `--concurrency` параллельных потоков asyncio
+и замеряет задержку (p50/p95/p99), пропускную способность, долю
+попаданий в кэш ответов и число запросов к БД на HTTP-запрос
+(заголовок X-Query-Count, есть только при DEBUG).
+
+Набор данных вставляется в базу из конфигурации сервиса с меткой прогона
+и удаляется после замера (`--keep` - оставить). С `--existing` сценарии
+идут по уже загруженным данным, например из `python -m benchmarks.dataset`;
+удаляются только записи, созданные сценариями. Без `--url` запросы идут
+в приложение в этом же процессе через ASGI, с `--url` - в запущенный сервер,
+который смотрит в ту же базу.
+
+Сценарии повторяют одни и те же параметры, поэтому кэш ответов приложения
+в процессе выключен: замеряется путь до базы. `--cache` включает его, и
+тогда доля попаданий показывает, сколько запросов он снимает. Кэш сервера
+по `--url` задаётся его конфигурацией.
+
+Результаты пишутся в JSON; `--compare` печатает разницу с прошлым прогоном:
+
+    python -m benchmarks --organizations 20000 --output before.json
+    python -m benchmarks --organizations 20000 --output after.json --compare before.json
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import subprocess
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Callable
+
+import httpx
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from app.core.config import settings
+from app.crud import activity as activity_crud
+from app.crud import organization as org_crud
+from app.models.activity import Activity
+from app.models.association_tables import activity_closure, organization_activities
+from app.models.building import Building
+from app.models.organization import Organization
+from app.models.phone import OrganizationPhone
+from app.utils import cell_key, normalize_address
+
+# Центр города и разброс координат зданий, градусы
+CENTER = (55.751244, 37.618423)
+SPREAD_DEG = 0.15
+
+NAME_WORDS = ["Аптека", "Кафе", "Автосервис", "Пекарня", "Склад", "Магазин", "Клиника"]
+
+
+@dataclass
+class Dataset:
+    """
+    id вставленных записей - из них сценарии берут параметры запросов.
+    """
+
+    marker: str
+    building_ids: list[uuid.UUID] = field(default_factory=list)
+    activity_ids: list[uuid.UUID] = field(default_factory=list)
+    root_activity_ids: list[uuid.UUID] = field(default_factory=list)
+    organization_ids: list[uuid.UUID] = field(default_factory=list)
+
+
+async def seed(session: AsyncSession, organizations: int, rng: random.Random) -> Dataset:
+    """
+    Здания вокруг центра города (по зданию на 10 организаций), дерево
+    деятельностей из трёх уровней, у организации 1-3 телефона и 1-2 деятельности.
+    """
+    data = Dataset(marker=f"bench-{uuid.uuid4().hex[:8]}")
+    now = datetime.now()
+    stamp = {"created_at": now, "modified_at": now}
+
+    buildings = []
+    for i in range(max(organizations // 10, 1)):
+        address = f"{data.marker} ул. Тестовая, {i}"
+        latitude = CENTER[0] + rng.uniform(-SPREAD_DEG, SPREAD_DEG)
+        longitude = CENTER[1] + rng.uniform(-SPREAD_DEG, SPREAD_DEG)
+        buildings.append(
+            {
+                "id": uuid.uuid4(),
+                "address": address,
+                "address_key": normalize_address(address),
+                "latitude": latitude,
+                "longitude": longitude,
+                "cell_key": cell_key(latitude, longitude),
+                **stamp,
+            }
+        )
+    data.building_ids = [b["id"] for b in buildings]
+
+    # Три уровня по три потомка; замыкание заполняется здесь же,
+    # т.к. Core-вставка не вызывает ORM-событий модели Activity
+    activities, closure = [], []
+
+    def add_activity(name: str, ancestors: list[uuid.UUID], level: int) -> None:
+        activity_id = uuid.uuid4()
+        activities.append(
+            {
+                "id": activity_id,
+                "name": name,
+                "parent_id": ancestors[-1] if ancestors else None,
+                **stamp,
+            }
+        )
+        path = [*ancestors, activity_id]
+        closure.extend(
+            {"ancestor_id": a, "descendant_id": activity_id, "depth": len(path) - 1 - i}
+            for i, a in enumerate(path)
+        )
+        if level < 3:
+            for child in range(3):
+                add_activity(f"{name}.{child}", path, level + 1)
+
+    for root in range(3):
+        add_activity(f"{data.marker} {root}", [], 1)
+    data.activity_ids = [a["id"] for a in activities]
+    data.root_activity_ids = [a["id"] for a in activities if a["parent_id"] is None]
+
+    orgs, phones, links = [], [], []
+    for i in range(organizations):
+        org_id = uuid.uuid4()
+        orgs.append(
+            {
+                "id": org_id,
+                "name": f"{rng.choice(NAME_WORDS)} {data.marker} {i}",
+                "building_id": rng.choice(data.building_ids),
+                **stamp,
+            }
+        )
+        phones.extend(
+            {
+                "id": uuid.uuid4(),
+                "phone": f"8-900-{rng.randrange(10**7):07d}",
+                "organization_id": org_id,
+                **stamp,
+            }
+            for _ in range(rng.randint(1, 3))
+        )
+        links.extend(
+            {"organization_id": org_id, "activity_id": a}
+            for a in rng.sample(data.activity_ids, rng.randint(1, 2))
+        )
+    data.organization_ids = [o["id"] for o in orgs]
+
+    for table, rows in (
+        (Building.__table__, buildings),
+        (Activity.__table__, activities),
+        (activity_closure, closure),
+        (Organization.__table__, orgs),
+        (OrganizationPhone.__table__, phones),
+        (organization_activities, links),
+    ):
+        # Пачками: массивы unnest целиком уходят одним параметром
+        for start in range(0, len(rows), 10_000):
+            await org_crud.insert_rows(session, table, rows[start : start + 10_000])
+    await activity_crud.refresh_activity_counts(session)
+    await session.commit()
+    return data
+
+
+async def sample_existing(session: AsyncSession, sample: int) -> Dataset:
+    """
+    Параметры сценариев из уже загруженных данных (см. benchmarks.dataset):
+    случайная выборка организаций и зданий, все деятельности.
+    """
+    data = Dataset(marker=f"bench-{uuid.uuid4().hex[:8]}")
+    data.organization_ids = list(
+        await session.scalars(
+            select(Organization.id).order_by(func.random()).limit(sample)
+        )
+    )
+    data.building_ids = list(
+        await session.scalars(select(Building.id).order_by(func.random()).limit(sample))
+    )
+    activities = (await session.execute(select(Activity.id, Activity.parent_id))).all()
+    data.activity_ids = [a.id for a in activities]
+    data.root_activity_ids = [a.id for a in activities if a.parent_id is None]
+    if not (data.organization_ids and data.building_ids and data.root_activity_ids):
+        raise SystemExit("database is empty, run python -m benchmarks.dataset first")
+    return data
+
+
+async def cleanup(session: AsyncSession, data: Dataset) -> None:
+    """
+    Удаляет записи прогона, в том числе созданные сценариями записи.
+    """
+    buildings = select(Building.id).where(Building.address.startswith(data.marker))
+    organizations = select(Organization.id).where(
+        Organization.building_id.in_(buildings) | Organization.name.contains(data.marker)
+    )
+    activities = select(Activity.id).where(Activity.name.startswith(data.marker))
+    await session.execute(
+        delete(organization_activities).where(
+            organization_activities.c.organization_id.in_(organizations)
+            | organization_activities.c.activity_id.in_(activities)
+        )
+    )
+    await session.execute(
+        delete(OrganizationPhone).where(
+            OrganizationPhone.organization_id.in_(organizations)
+        )
+    )
+    await session.execute(delete(Organization).where(Organization.id.in_(organizations)))
+    await session.execute(delete(Building).where(Building.id.in_(buildings)))
+    # Замыкание удаляется каскадом
+    await session.execute(delete(Activity).where(Activity.id.in_(activities)))
+    await activity_crud.refresh_activity_counts(session)
+    await session.commit()
+
+
+# Сценарий: (метод, путь, параметры, тело) для очередного запроса
+Request = tuple[str, str, dict | None, object]
+
+
+def scenarios(data: Dataset, rng: random.Random) -> dict[str, Callable[[], Request]]:
+    def org_id() -> str:
+        return str(rng.choice(data.organization_ids))
+
+    def point() -> dict:
+        return {
+            "latitude": CENTER[0] + rng.uniform(-SPREAD_DEG, SPREAD_DEG),
+            "longitude": CENTER[1] + rng.uniform(-SPREAD_DEG, SPREAD_DEG),
+        }
+
+    def rectangle() -> dict:
+        p = point()
+        return {
+            "min_lat": p["latitude"] - 0.01,
+            "max_lat": p["latitude"] + 0.01,
+            "min_lon": p["longitude"] - 0.01,
+            "max_lon": p["longitude"] + 0.01,
+        }
+
+    def new_organization() -> dict:
+        return {
+            "name": f"{rng.choice(NAME_WORDS)} {data.marker} new",
+            "building_id": str(rng.choice(data.building_ids)),
+            "phone_numbers": [{"phone": "8-900-000-00-00"}],
+            "activity_ids": [str(rng.choice(data.activity_ids))],
+        }
+
+    def new_buildings() -> list[dict]:
+        return [
+            {"address": f"{data.marker} bulk {uuid.uuid4().hex}", **point()}
+            for _ in range(10)
+        ]
+
+    return {
+        "organizations_list": lambda: ("GET", "/organizations/", {"limit": 50}, None),
+        "organizations_read": lambda: ("GET", f"/organizations/{org_id()}", None, None),
+        "organizations_read_pin": lambda: (
+            "GET",
+            f"/organizations/{org_id()}",
+            {"fields": "id,name,building.latitude,building.longitude"},
+            None,
+        ),
+        "organizations_ids": lambda: (
+            "GET",
+            "/organizations/",
+            {"ids": ",".join(org_id() for _ in range(20))},
+            None,
+        ),
+        "organizations_lookup": lambda: (
+            "POST",
+            "/organizations/lookup",
+            None,
+            {"ids": [org_id() for _ in range(20)]},
+        ),
+        "organizations_name": lambda: (
+            "GET",
+            "/organizations/",
+            {"name": rng.choice(NAME_WORDS).lower()},
+            None,
+        ),
+        "organizations_fuzzy": lambda: (
+            "GET",
+            "/organizations/",
+            {"name": rng.choice(NAME_WORDS)[:-1], "fuzzy": "true"},
+            None,
+        ),
+        "organizations_by_building": lambda: (
+            "GET",
+            f"/organizations/by-building/{rng.choice(data.building_ids)}",
+            None,
+            None,
+        ),
+        "organizations_by_activity": lambda: (
+            "GET",
+            f"/organizations/by-activity/{rng.choice(data.root_activity_ids)}",
+            {"with_children": "true"},
+            None,
+        ),
+        "organizations_by_radius": lambda: (
+            "GET",
+            "/organizations/by-radius/",
+            {**point(), "radius_km": 1},
+            None,
+        ),
+        "organizations_by_rectangle": lambda: (
+            "GET",
+            "/organizations/by-rectangle/",
+            rectangle(),
+            None,
+        ),
+        "organizations_create": lambda: (
+            "POST",
+            "/organizations/",
+            None,
+            new_organization(),
+        ),
+        "buildings_list": lambda: ("GET", "/buildings/", {"limit": 50}, None),
+        "buildings_read": lambda: (
+            "GET",
+            f"/buildings/{rng.choice(data.building_ids)}",
+            None,
+            None,
+        ),
+        "buildings_bulk": lambda: ("POST", "/buildings/bulk", None, new_buildings()),
+        "activities_list": lambda: ("GET", "/activities/", None, None),
+        "activities_read": lambda: (
+            "GET",
+            f"/activities/{rng.choice(data.activity_ids)}",
+            None,
+            None,
+        ),
+        "activities_tree": lambda: ("GET", "/activities/tree", None, None),
+    }
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    index = min(int(len(sorted_values) * q), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    make_request: Callable[[], Request],
+    requests: int,
+    concurrency: int,
+) -> dict:
+    latencies, queries = [], []
+    statuses: Counter[int] = Counter()
+    cache_hits = 0
+    remaining = iter(range(requests))
+
+    async def worker() -> None:
+        nonlocal cache_hits
+        for _ in remaining:
+            method, path, params, body = make_request()
+            started = time.perf_counter()
+            response = await client.request(method, path, params=params, json=body)
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] += 1
+            if response.headers.get("x-cache") == "HIT":
+                cache_hits += 1
+            if "x-query-count" in response.headers:
+                queries.append(int(response.headers["x-query-count"]))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        # 404 - штатный ответ на пустую выборку, ошибками считаются только 5xx
+        "errors": sum(n for code, n in statuses.items() if code >= 500),
+        "statuses": {str(code): n for code, n in sorted(statuses.items())},
+        "cache_hits": cache_hits,
+        "rps": round(requests / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2),
+        "queries_per_request": round(statistics.fmean(queries), 2) if queries else None,
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results: dict, baseline: dict | None) -> None:
+    header = (
+        f"{'scenario':28} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} "
+        f"{'q/req':>6} {'hit%':>5} {'err':>5}"
+    )
+    print(header + ("   p95 vs baseline" if baseline else ""))
+    for name, r in results.items():
+        line = (
+            f"{name:28} {r['rps']:8.1f} {r['p50_ms']:8.2f} {r['p95_ms']:8.2f} "
+            f"{r['p99_ms']:8.2f} {r['queries_per_request'] or 0:6.1f} "
+            f"{r['cache_hits'] * 100 // r['requests']:5} {r['errors']:5}"
+        )
+        old = (baseline or {}).get(name)
+        if old and old["p95_ms"]:
+            line += f"   {(r['p95_ms'] / old['p95_ms'] - 1) * 100:+6.1f}%"
+        print(line)
+
+
+async def main(args: argparse.Namespace) -> None:
+    rng = random.Random(args.seed)
+    engine = create_async_engine(str(settings.MAIN_DATABASE_URI))
+    try:
+        async with AsyncSession(engine, expire_on_commit=False) as session:
+            if args.existing:
+                data = await sample_existing(session, sample=10_000)
+            else:
+                print(f"seeding {args.organizations} organizations...")
+                data = await seed(session, args.organizations, rng)
+        try:
+            if args.url:
+                transport, base_url = None, args.url.rstrip("/") + settings.service.API_PREFIX
+            else:
+                from app.main import app
+
+                settings.cache.ENABLED = args.cache
+                # Ошибки приложения считаются ответами 500, а не прерывают прогон
+                transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+                base_url = "http://bench" + settings.service.API_PREFIX
+            selected = scenarios(data, rng)
+            if args.scenario:
+                selected = {name: selected[name] for name in args.scenario}
+            results = {}
+            async with httpx.AsyncClient(
+                transport=transport,
+                base_url=base_url.rstrip("/"),
+                headers={"X-API-Token": settings.security.API_TOKEN},
+                timeout=60,
+            ) as client:
+                for name, make_request in selected.items():
+                    results[name] = await run_scenario(
+                        client, make_request, args.requests, args.concurrency
+                    )
+        finally:
+            if not args.keep:
+                async with AsyncSession(engine) as session:
+                    await cleanup(session, data)
+    finally:
+        await engine.dispose()
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "params": {
+            "organizations": "existing" if args.existing else args.organizations,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "seed": args.seed,
+            "target": args.url or "asgi",
+            "cache": "server" if args.url else args.cache,
+        },
+        "results": results,
+    }
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+    print_results(results, baseline)
+    with open(args.output, "w") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"results written to {args.output}")
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--organizations", type=int, default=10_000)
+    parser.add_argument("--requests", type=int, default=500, help="запросов на сценарий")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--url", help="адрес запущенного сервера, иначе ASGI в процессе")
+    parser.add_argument(
+        "--scenario", action="append", help="только указанные сценарии (можно несколько)"
+    )
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--keep", action="store_true", help="не удалять данные прогона")
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="не выключать кэш ответов приложения в процессе (без --url)",
+    )
+    parser.add_argument(
+        "--existing",
+        action="store_true",
+        help="не вставлять набор, а гонять сценарии по данным в базе "
+        "(python -m benchmarks.dataset)",
+    )
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,177 @@
+"""
+Стоимость чтения списка организаций на стороне приложения: ORM-объекты
+с сериализацией через OrganizationRead против быстрого пути, где JSON
+собирается в Postgres, - полного и узкого (`fields=` метки на карте).
+
+Данные вставляются в таблицы базы из конфигурации сервиса внутри
+транзакции, которая откатывается после замера.
+
+    python -m benchmarks.read_path --rows 20000 --page-size 500
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from datetime import datetime
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from app.api.deps import Pagination
+from app.core.config import settings
+from app.crud import organization as org_crud
+from app.models.activity import Activity
+from app.models.association_tables import organization_activities
+from app.models.building import Building
+from app.models.organization import Organization
+from app.models.phone import OrganizationPhone
+from app.schemas.organization import OrganizationRead
+from app.schemas.pagination import Page
+from app.utils import FieldSelection, cell_key, encode_cursor
+
+FULL = FieldSelection(
+    list(org_crud.ORGANIZATION_COLUMNS), org_crud.ORGANIZATION_RELATIONS
+)
+# Метка на карте: id, название и координаты здания
+PIN = FieldSelection(
+    list(org_crud.ORGANIZATION_COLUMNS),
+    org_crud.ORGANIZATION_RELATIONS,
+    requested="id,name,building.latitude,building.longitude",
+)
+
+
+async def seed(session: AsyncSession, rows: int) -> None:
+    now = datetime.now()
+    stamp = {"created_at": now, "modified_at": now}
+    building_id = uuid.uuid4()
+    activity_ids = [uuid.uuid4(), uuid.uuid4()]
+    org_ids = [uuid.uuid4() for _ in range(rows)]
+    await org_crud.insert_rows(
+        session,
+        Building.__table__,
+        [
+            {
+                "id": building_id,
+                "address": f"bench {building_id}",
+                "address_key": f"bench {building_id}",
+                "latitude": 55.751244,
+                "longitude": 37.618423,
+                "cell_key": cell_key(55.751244, 37.618423),
+                **stamp,
+            }
+        ],
+    )
+    await org_crud.insert_rows(
+        session,
+        Activity.__table__,
+        [{"id": a, "name": f"bench {i}", "parent_id": None, **stamp} for i, a in enumerate(activity_ids)],
+    )
+    await org_crud.insert_rows(
+        session,
+        Organization.__table__,
+        [
+            {"id": o, "name": f"Организация {i}", "building_id": building_id, **stamp}
+            for i, o in enumerate(org_ids)
+        ],
+    )
+    await org_crud.insert_rows(
+        session,
+        OrganizationPhone.__table__,
+        [
+            {"id": uuid.uuid4(), "phone": phone, "organization_id": o, **stamp}
+            for o in org_ids
+            for phone in ("2-222-222", "8-923-666-13-13")
+        ],
+    )
+    await org_crud.insert_rows(
+        session,
+        organization_activities,
+        [{"organization_id": o, "activity_id": a} for o in org_ids for a in activity_ids],
+    )
+    for table in ("organizations", "organization_phones", "organization_activities"):
+        await session.execute(text(f"ANALYZE {table}"))
+
+
+# Прежний путь: ORM-объекты, валидация from_attributes и jsonable_encoder
+async def read_orm(session: AsyncSession, pagination: Pagination) -> tuple[bytes, str | None]:
+    query = select(Organization).options(*org_crud.ORGANIZATION_READ_OPTIONS)
+    result = await session.execute(
+        org_crud.paginate_by_id(query, pagination.fetch_limit, pagination.after_id())
+    )
+    orgs = list(result.scalars().all())
+    next_cursor = None
+    if len(orgs) > pagination.limit:
+        orgs = orgs[: pagination.limit]
+        next_cursor = encode_cursor(orgs[-1].id)
+    page = Page(items=orgs, next_cursor=next_cursor)
+    body = json.dumps(
+        jsonable_encoder(Page[OrganizationRead].model_validate(page, from_attributes=True))
+    ).encode()
+    session.expunge_all()
+    return body, page.next_cursor
+
+
+# Быстрый путь: готовый JSON из Postgres склеивается в страницу
+async def read_json(
+    session: AsyncSession, pagination: Pagination, selection: FieldSelection = FULL
+) -> tuple[bytes, str | None]:
+    rows = await org_crud.get_organizations_json(
+        session,
+        limit=pagination.fetch_limit,
+        selection=selection,
+        after=pagination.after_id(),
+    )
+    response = pagination.json_page(rows)
+    return response.body, json.loads(response.body)["next_cursor"]
+
+
+async def read_json_pin(
+    session: AsyncSession, pagination: Pagination
+) -> tuple[bytes, str | None]:
+    return await read_json(session, pagination, PIN)
+
+
+async def measure(session: AsyncSession, read, page_size: int) -> tuple[float, float]:
+    cursor = None
+    cpu_started, wall_started = time.process_time(), time.perf_counter()
+    while True:
+        _, cursor = await read(session, Pagination(limit=page_size, after=cursor))
+        if cursor is None:
+            break
+    return time.process_time() - cpu_started, time.perf_counter() - wall_started
+
+
+async def main(rows: int, page_size: int) -> None:
+    engine = create_async_engine(str(settings.MAIN_DATABASE_URI))
+    try:
+        async with AsyncSession(engine, expire_on_commit=False) as session:
+            async with session.begin():
+                print(f"seeding {rows} organizations...")
+                await seed(session, rows)
+                # Прогрев: кэш планов и компиляции запросов
+                await measure(session, read_orm, page_size)
+                await measure(session, read_json, page_size)
+                await measure(session, read_json_pin, page_size)
+                for name, read in (
+                    ("orm", read_orm),
+                    ("core_json", read_json),
+                    ("pin_json", read_json_pin),
+                ):
+                    cpu, wall = await measure(session, read, page_size)
+                    print(
+                        f"{name:10} cpu {cpu / rows * 1e6:8.1f} us/org  "
+                        f"wall {wall / rows * 1e6:8.1f} us/org"
+                    )
+                await session.rollback()
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--page-size", type=int, default=settings.service.PAGE_SIZE_MAX)
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.page_size))
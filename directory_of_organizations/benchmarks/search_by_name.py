@@ -0,0 +1,119 @@
+"""
+Сравнение поиска по названию: ILIKE '%...%' без индекса против
+триграммного поиска по GIN-индексу (pg_trgm).
+
+Данные генерируются во временную таблицу `bench_organizations` в базе из
+конфигурации сервиса и удаляются после замера.
+
+    python -m benchmarks.search_by_name --rows 1000000 --repeat 20
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, create_async_engine
+
+from app.core.config import settings
+
+QUERIES = {
+    # Текущий запрос: последовательное сканирование всей таблицы
+    "ilike_seq_scan": (
+        "SELECT id, name FROM bench_organizations WHERE name ILIKE :pattern",
+        False,
+    ),
+    # Тот же ILIKE, но по триграммному индексу
+    "ilike_trgm": (
+        "SELECT id, name FROM bench_organizations WHERE name ILIKE :pattern",
+        True,
+    ),
+    # Нечёткий поиск с ранжированием и лимитом
+    "fuzzy_trgm": (
+        "SELECT id, name, word_similarity(:query, name) AS score "
+        "FROM bench_organizations WHERE :query <% name "
+        "ORDER BY score DESC, id LIMIT :limit",
+        True,
+    ),
+}
+
+WORDS = [
+    "Аптека", "Магазин", "Автосервис", "Кафе", "Пекарня", "Салон", "Клиника",
+    "Мясная", "Молочная", "Лавка", "Запчасти", "Цветы", "Ремонт", "Ателье",
+    "Здоровье", "Семья", "Север", "Центр", "Плюс", "Мастер", "Лада", "Птица",
+]
+
+
+async def seed(conn: AsyncConnection, rows: int) -> None:
+    await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    await conn.execute(text("DROP TABLE IF EXISTS bench_organizations"))
+    await conn.execute(
+        text("CREATE TABLE bench_organizations (id uuid PRIMARY KEY, name varchar NOT NULL)")
+    )
+    # Названия из трёх случайных слов и номера
+    await conn.execute(
+        text(
+            "INSERT INTO bench_organizations (id, name) "
+            "SELECT gen_random_uuid(), "
+            "  (CAST(:words AS text[]))[1 + floor(random() * cardinality(CAST(:words AS text[])))::int] || ' ' || "
+            "  (CAST(:words AS text[]))[1 + floor(random() * cardinality(CAST(:words AS text[])))::int] || ' ' || "
+            "  (CAST(:words AS text[]))[1 + floor(random() * cardinality(CAST(:words AS text[])))::int] || ' ' || g "
+            "FROM generate_series(1, :rows) AS g"
+        ),
+        {"words": WORDS, "rows": rows},
+    )
+    await conn.execute(
+        text(
+            "CREATE INDEX ix_bench_organizations_name_trgm "
+            "ON bench_organizations USING gin (name gin_trgm_ops)"
+        )
+    )
+    await conn.execute(text("ANALYZE bench_organizations"))
+
+
+async def measure(
+    conn: AsyncConnection, sql: str, use_index: bool, params: dict, repeat: int
+) -> list[float]:
+    # Без индекса планировщику остаётся только последовательное сканирование
+    setting = "on" if use_index else "off"
+    await conn.execute(text(f"SET LOCAL enable_bitmapscan = {setting}"))
+    await conn.execute(text(f"SET LOCAL enable_indexscan = {setting}"))
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = await conn.execute(text(sql), params)
+        result.all()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+async def main(rows: int, repeat: int, query: str, typo: str) -> None:
+    engine = create_async_engine(str(settings.MAIN_DATABASE_URI))
+    params = {"pattern": f"%{query}%", "query": typo, "limit": 20}
+    try:
+        async with engine.connect() as conn:
+            async with conn.begin():
+                print(f"seeding {rows} rows...")
+                await seed(conn, rows)
+            async with conn.begin():
+                for name, (sql, use_index) in QUERIES.items():
+                    timings = await measure(conn, sql, use_index, params, repeat)
+                    print(
+                        f"{name:16} median {statistics.median(timings):9.2f} ms  "
+                        f"max {max(timings):9.2f} ms"
+                    )
+    finally:
+        async with engine.begin() as conn:
+            await conn.execute(text("DROP TABLE IF EXISTS bench_organizations"))
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--query", default="аптек", help="подстрока для ILIKE")
+    parser.add_argument("--typo", default="апетка", help="запрос с опечаткой для нечёткого поиска")
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.repeat, args.query, args.typo))
@@ -1,5 +1,28 @@
+import os
+import shutil
+
+from prometheus_client import multiprocess
+
 # Gunicorn config variables
 loglevel = "info"
 workers = 3
 bind = "0.0.0.0:8000"
-errorlog = "-"
\ No newline at end of file
+errorlog = "-"
+
+# Каталог, в который воркеры пишут значения метрик prometheus_client;
+# /metrics суммирует их по всем воркерам. Переменная должна быть задана
+# до импорта приложения, поэтому выставляется здесь, в мастере
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/prometheus_multiproc")
+
+
+def on_starting(server):
+    # Значения от прошлого запуска не должны попасть в новые метрики
+    path = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+
+
+def child_exit(server, worker):
+    # Файлы умершего воркера остаются: его счётчики и гистограммы
+    # по-прежнему входят в сумму, убираются только live-значения gauge
+    multiprocess.mark_process_dead(worker.pid)